@@ -15,15 +15,15 @@
 # limitations under the License.
 #
 
-import logging
-
-from vts.runners.host import asserts
 from vts.runners.host import base_test
-from vts.runners.host import const
 from vts.runners.host import test_runner
+from vts.testcases.performance.utils import latency_runner
+from vts.testcases.performance.utils import quiesce_session
+from vts.testcases.performance.utils import result_store
+from vts.testcases.performance.utils import result_transport
+from vts.testcases.performance.utils import threshold_profile
 from vts.utils.python.controllers import android_device
 from vts.utils.python.cpu import cpu_frequency_scaling
-from vts.utils.python.performance import benchmark_parser
 
 
 class BinderPerformanceTest(base_test.BaseTestClass):
@@ -32,6 +32,11 @@ class BinderPerformanceTest(base_test.BaseTestClass):
     Attributes:
         dut: the target DUT (device under test) instance.
         _cpu_freq: CpuFrequencyScalingController instance of self.dut.
+        _quiesce: QuiesceSession which keeps the framework stopped, possibly
+                  across several modules.
+        _transport: FileResultTransport which moves the benchmark output
+                    through a device file, or None to read it from stdout.
+        _runner: LatencyRunner which runs the benchmark.
     """
 
     THRESHOLD = {
@@ -73,22 +78,36 @@ class BinderPerformanceTest(base_test.BaseTestClass):
 
     def setUpClass(self):
         self.dut = self.registerController(android_device)[0]
+        self.web = result_store.WrapWebFeature(self, self.dut)
         self.dut.shell.InvokeTerminal("one")
-        self.dut.shell.one.Execute("stop")
-        self.dut.shell.one.Execute("setprop sys.boot_completed 0")
-        self._cpu_freq = cpu_frequency_scaling.CpuFrequencyScalingController(self.dut)
+        self._quiesce = quiesce_session.CreateSession(self, self.dut)
+        self._quiesce.Join()
+        self._cpu_freq = cpu_frequency_scaling.CpuFrequencyScalingController(
+            self.dut)
         self._cpu_freq.DisableCpuScaling()
+        self._transport = None
+        if self.getUserParam("file_result_transport", default_value=False):
+            self._transport = result_transport.FileResultTransport(self.dut)
+        self._runner = latency_runner.LatencyRunner(
+            self, self.dut, self._cpu_freq, self._transport, "binder",
+            "Binder", self.BenchmarkCommand,
+            threshold_profile.LoadThresholds(
+                self, self.dut, "binder_latency", self.THRESHOLD),
+            self.LoadCommand)
 
     def setUp(self):
-        self._cpu_freq.SkipIfThermalThrottling(retry_delay_secs=30)
+        if not self._runner.pacing:
+            self._cpu_freq.SkipIfThermalThrottling(retry_delay_secs=30)
 
     def tearDown(self):
-        self._cpu_freq.SkipIfThermalThrottling()
+        if not self._runner.pacing:
+            self._cpu_freq.SkipIfThermalThrottling()
 
     def tearDownClass(self):
         self._cpu_freq.EnableCpuScaling()
-        self.dut.shell.one.Execute("start")
-        self.dut.waitForBootCompletion()
+        if self._transport:
+            self._transport.Close()
+        self._quiesce.Leave(bool(self.results.failed or self.results.error))
 
     def testRunBenchmark32Bit(self):
         """A testcase which runs the 32-bit benchmark."""
@@ -99,49 +118,53 @@ class BinderPerformanceTest(base_test.BaseTestClass):
         self.RunBenchmark(64)
 
     def RunBenchmark(self, bits):
-        """Runs the native binary and parses its result.
+        """Runs the native binary, stores its result and checks thresholds.
+
+        See LatencyRunner.Run for the modes.
 
         Args:
             bits: integer (32 or 64), the number of bits in a word chosen
                   at the compile time (e.g., 32- vs. 64-bit library).
         """
-        # Runs the benchmark.
-        logging.info("Start to run the benchmark (%s bit mode)", bits)
+        labels, stats, noise_score = self._runner.Run(bits)
+        self._runner.CheckThresholds(bits, labels, stats, noise_score)
+
+    def BenchmarkCommand(self, bits, repetitions, extra_args):
+        """Returns the binary and the command line of one benchmark run.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            repetitions: integer, the Google Benchmark repetitions to run.
+            extra_args: string, extra command line arguments of the binary.
+
+        Returns:
+            a tuple of the binary path and the shell command line.
+        """
         binary = "/data/local/tmp/%s/libbinder_benchmark%s" % (bits, bits)
+        command = ("LD_LIBRARY_PATH=/data/local/tmp/%s/hw:"
+                   "/data/local/tmp/%s:$LD_LIBRARY_PATH "
+                   "%s --benchmark_format=json --benchmark_repetitions=%s %s" %
+                   (bits, bits, binary, repetitions, extra_args))
+        return binary, command
+
+    def LoadCommand(self, bits, workers, extra_args):
+        """Returns the binary and the command line of the background load.
 
-        results = self.dut.shell.one.Execute([
-            "chmod 755 %s" % binary, "LD_LIBRARY_PATH=/data/local/tmp/%s/hw:"
-            "/data/local/tmp/%s:$LD_LIBRARY_PATH "
-            "%s --benchmark_format=json" % (bits, bits, binary)
-        ])
-
-        # Parses the result.
-        asserts.assertEqual(len(results[const.STDOUT]), 2)
-        logging.info("stderr: %s", results[const.STDERR][1])
-        logging.info("stdout: %s", results[const.STDOUT][1])
-        asserts.assertFalse(
-            any(results[const.EXIT_CODE]),
-            "BinderPerformanceTest failed.")
-        parser = benchmark_parser.GoogleBenchmarkJsonParser(
-            results[const.STDOUT][1])
-        label_result = parser.getArguments()
-        value_result = parser.getRealTime()
-
-        # To upload to the web DB.
-        self.web.AddProfilingDataLabeledVector(
-            "binder_vector_roundtrip_latency_benchmark_%sbits" % bits,
-            label_result,
-            value_result,
-            x_axis_label="Message Size (Bytes)",
-            y_axis_label="Roundtrip Binder RPC Latency (nanoseconds)")
-
-        # Assertions to check the performance requirements
-        for label, value in zip(label_result, value_result):
-            if label in self.THRESHOLD[bits]:
-                asserts.assertLess(
-                    value, self.THRESHOLD[bits][label],
-                    "%s ns for %s is longer than the threshold %s ns" % (
-                        value, label, self.THRESHOLD[bits][label]))
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            workers: positive integer, the number of throughput workers.
+            extra_args: string, extra command line arguments of the binary.
+
+        Returns:
+            a tuple of the binary path and the shell command line.
+        """
+        binary = "/data/local/tmp/%s/binderThroughputTest%s" % (bits, bits)
+        command = ("LD_LIBRARY_PATH=/data/local/tmp/%s/hw:"
+                   "/data/local/tmp/%s:$LD_LIBRARY_PATH %s -w %s %s" % (
+                       bits, bits, binary, workers, extra_args))
+        return binary, command
 
 
 if __name__ == "__main__":
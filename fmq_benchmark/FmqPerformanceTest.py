@@ -21,6 +21,15 @@ from vts.runners.host import asserts
 from vts.runners.host import base_test
 from vts.runners.host import const
 from vts.runners.host import test_runner
+from vts.testcases.performance.utils import fmq_service
+from vts.testcases.performance.utils import noise_probe
+from vts.testcases.performance.utils import output_parser
+from vts.testcases.performance.utils import repetition
+from vts.testcases.performance.utils import result_store
+from vts.testcases.performance.utils import result_transport
+from vts.testcases.performance.utils import steady_state
+from vts.testcases.performance.utils import thermal_pacer
+from vts.testcases.performance.utils import threshold_profile
 from vts.utils.python.controllers import android_device
 from vts.utils.python.cpu import cpu_frequency_scaling
 
@@ -31,6 +40,32 @@ class FmqPerformanceTest(base_test.BaseTestClass):
     Attributes:
         dut: the target DUT (device under test) instance.
         _cpu_freq: CpuFrequencyScalingController instance of self.dut.
+        _thresholds: ThresholdTable of the latency limits, built from
+                     THRESHOLD and the threshold profiles of the device.
+        _services: FmqServicePool of the benchmark services, which keeps
+                   the service of each bitness running across the client
+                   runs of that bitness.
+        _repetition_mode: bool, whether to repeat the benchmark until the
+                          confidence interval of each label is clearly
+                          below or above its threshold.
+        _repetition_max_runs: integer, the maximum number of client runs in
+                              repetition mode.
+        _steady_state_mode: bool, whether to drop the warm-up client runs
+                            of each label before computing its statistics.
+        _steady_state_intervals: integer, the number of client runs in
+                                 steady-state mode.
+        _steady_state_max_cv: float, the maximum coefficient of variation
+                              of the steady-state runs.
+        _pacer: ThermalPacer which waits for the device to cool down before
+                each client run in thermal pacing mode, or None.
+        _thermal_readings: list of ThermalReading, one per client run since
+                           the start of the current test case.
+        _noise: NoiseProbe which probes the background noise around each
+                client run in noise probe mode, or None.
+        _noise_scores: list of integers, the noise score of each client run
+                       since the start of the current test case.
+        _transport: FileResultTransport which moves the client output
+                    through a device file, or None to read it from stdout.
     """
     # Latency threshold for the benchmark,  unit: nanoseconds.
     THRESHOLD = {
@@ -49,19 +84,51 @@ class FmqPerformanceTest(base_test.BaseTestClass):
     }
 
     def setUpClass(self):
+        self._repetition_mode = self.getUserParam(
+            "repetition_mode", default_value=False)
+        self._repetition_max_runs = int(self.getUserParam(
+            "repetition_max_runs", default_value=10))
+        self._steady_state_mode = self.getUserParam(
+            "steady_state_mode", default_value=False)
+        self._steady_state_intervals = int(self.getUserParam(
+            "steady_state_intervals", default_value=10))
+        self._steady_state_max_cv = float(self.getUserParam(
+            "steady_state_max_cv", default_value=0.1))
         self.dut = self.registerController(android_device)[0]
+        self.web = result_store.WrapWebFeature(self, self.dut)
         self.dut.shell.InvokeTerminal("one")
-        self._cpu_freq = cpu_frequency_scaling.CpuFrequencyScalingController(self.dut)
+        self._cpu_freq = cpu_frequency_scaling.CpuFrequencyScalingController(
+            self.dut)
         self._cpu_freq.DisableCpuScaling()
+        self._pacer = thermal_pacer.CreatePacer(self, self.dut, self._cpu_freq)
+        self._thermal_readings = []
+        self._noise = noise_probe.CreateProbe(self, self.dut)
+        self._noise_scores = []
+        self._transport = None
+        if self.getUserParam("file_result_transport", default_value=False):
+            self._transport = result_transport.FileResultTransport(self.dut)
+        self._thresholds = threshold_profile.LoadThresholds(
+            self, self.dut, "fmq_latency", self.THRESHOLD)
+        self._services = fmq_service.FmqServicePool(self.dut.shell.one)
 
     def tearDownClass(self):
+        try:
+            self._services.Stop()
+        except fmq_service.ServiceError as e:
+            logging.error(e)
         self._cpu_freq.EnableCpuScaling()
+        if self._transport:
+            self._transport.Close()
 
     def setUp(self):
-        self._cpu_freq.SkipIfThermalThrottling(retry_delay_secs=30)
+        self._thermal_readings = []
+        self._noise_scores = []
+        if not self._pacer:
+            self._cpu_freq.SkipIfThermalThrottling(retry_delay_secs=30)
 
     def tearDown(self):
-        self._cpu_freq.SkipIfThermalThrottling()
+        if not self._pacer:
+            self._cpu_freq.SkipIfThermalThrottling()
 
     def testRunBenchmark32Bit(self):
         """A testcase which runs the 32-bit benchmark."""
@@ -72,89 +139,214 @@ class FmqPerformanceTest(base_test.BaseTestClass):
         self.RunBenchmark(64)
 
     def RunBenchmark(self, bits):
-        """Runs the native binary and parses its result.
+        """Runs the native binary, stores its result and checks thresholds.
+
+        In repetition mode the client runs until every message size has a
+        clear verdict, and the mean and standard deviation of the
+        repetitions are uploaded. In steady-state mode the client runs
+        steady_state_intervals times, the leading warm-up runs of each label
+        are dropped, and the warm-up length and whether a steady state was
+        reached are uploaded. In thermal pacing mode each client run waits
+        until the device is cool enough, and the hottest temperature and
+        slowest CPU frequency seen after the runs are uploaded. In noise
+        probe mode the highest noise score of the runs is uploaded per
+        label, and with noise_exclude_noisy a noisy result skips the
+        threshold checks.
 
         Args:
             bits: integer (32 or 64), the number of bits in a word chosen
                   at the compile time (e.g., 32- vs. 64-bit library).
         """
-        # Start the benchmark service.
-        logging.info("Start the benchmark service(%s bit mode)", bits)
-        binary = "/data/local/tmp/%s/mq_benchmark_service%s" % (bits, bits)
-        results = self.dut.shell.one.Execute([
-            "chmod 755 %s" % binary, "LD_LIBRARY_PATH=/data/local/tmp/%s:"
-            "$LD_LIBRARY_PATH %s&" % (bits, binary)
-        ])
-        asserts.assertEqual(len(results[const.STDOUT]), 2)
-        asserts.assertFalse(any(results[const.EXIT_CODE]),
-            "Failed to start the benchmark service.")
+        try:
+            if self._services.EnsureRunning(bits):
+                self.web.AddProfilingDataLabeledVector(
+                    "fmq_service_startup_time_ms_%sbits" % bits,
+                    ["mq_benchmark_service%s" % bits],
+                    [self._services.GetService(bits).startup_time_ms],
+                    x_axis_label="Benchmark Service",
+                    y_axis_label="Time Until Ready (milliseconds)")
+        except fmq_service.ServiceError as e:
+            asserts.fail("Failed to start the benchmark service: %s" % e)
+
+        labels = []
+        samples = {}
+        if self._repetition_mode:
+            engine = repetition.RepetitionEngine(
+                lambda: self.RunClient(bits),
+                lambda label: self._thresholds.GetThreshold(bits, label[1]),
+                self._repetition_max_runs)
+            labels, samples = engine.Run()
+        elif self._steady_state_mode:
+            for _ in range(self._steady_state_intervals):
+                for label, value in self.RunClient(bits):
+                    if label not in samples:
+                        labels.append(label)
+                        samples[label] = []
+                    samples[label].append(value)
+        else:
+            for label, value in self.RunClient(bits):
+                labels.append(label)
+                samples[label] = [value]
+        if self._thermal_readings:
+            self.web.AddProfilingDataLabeledVector(
+                "fmq_latency_thermal_%sbits" % bits,
+                ["temperature_mc", "cpu_freq_khz"],
+                [max(r.temperature_mc for r in self._thermal_readings),
+                 min(r.cpu_freq_khz for r in self._thermal_readings)],
+                x_axis_label="Thermal State After the Client Runs",
+                y_axis_label="Hottest Thermal Zone (millidegrees Celsius) "
+                             "or Slowest CPU Frequency (kHz)")
+        noise_score = max(self._noise_scores) if self._noise_scores else None
+        check_thresholds = True
+        if (self._noise and self._noise.exclude_noisy and
+                noise_probe.IsNoisy(noise_score)):
+            logging.warning("Measured under noise score %s; thresholds not "
+                            "checked.", noise_score)
+            check_thresholds = False
+        warmups = {}
+        if self._steady_state_mode:
+            warmups = dict(zip(labels, steady_state.TrimWarmup(
+                labels, samples, max_cv=self._steady_state_max_cv)))
+
+        for operation in ("read", "write"):
+            op_labels = [size for op, size in labels if op == operation]
+            stats = [repetition.LabelStats(samples[(operation, size)])
+                     for size in op_labels]
+
+            # To upload to the web DB.
+            self.web.AddProfilingDataLabeledVector(
+                "fmq_%s_latency_benchmark_%sbits" % (operation, bits),
+                op_labels,
+                [int(label_stats.mean) for label_stats in stats],
+                x_axis_label="Message Size (Bytes)",
+                y_axis_label="Average Latency (nanoseconds)")
+            if self._repetition_mode:
+                self.web.AddProfilingDataLabeledVector(
+                    "fmq_%s_latency_stddev_%sbits" % (operation, bits),
+                    op_labels,
+                    [int(label_stats.stddev) for label_stats in stats],
+                    x_axis_label="Message Size (Bytes)",
+                    y_axis_label="Average Latency - Standard Deviation "
+                                 "(nanoseconds)")
+            if self._steady_state_mode:
+                op_warmups = [warmups[(operation, size)] for size in op_labels]
+                self.web.AddProfilingDataLabeledVector(
+                    "fmq_%s_latency_warmup_runs_%sbits" % (operation, bits),
+                    op_labels,
+                    [warmup.warmup_intervals for warmup in op_warmups],
+                    x_axis_label="Message Size (Bytes)",
+                    y_axis_label="Warm-up Client Runs")
+                self.web.AddProfilingDataLabeledVector(
+                    "fmq_%s_latency_steady_state_%sbits" % (operation, bits),
+                    op_labels,
+                    [int(warmup.steady) for warmup in op_warmups],
+                    x_axis_label="Message Size (Bytes)",
+                    y_axis_label="Steady State Reached")
+            if noise_score is not None:
+                self.web.AddProfilingDataLabeledVector(
+                    "fmq_%s_latency_noise_score_%sbits" % (operation, bits),
+                    op_labels,
+                    [noise_score] * len(op_labels),
+                    x_axis_label="Message Size (Bytes)",
+                    y_axis_label="Background Noise Score "
+                                 "(percent of the limit)")
+            if not check_thresholds:
+                continue
+
+            # Assertions to check the performance requirements
+            for label, label_stats in zip(op_labels, stats):
+                threshold = self._thresholds.GetThreshold(bits, label)
+                if threshold is not None:
+                    asserts.assertTrue(
+                        label_stats.IsBelowThreshold(threshold),
+                        "%s ns for %s is longer than the threshold %s ns" % (
+                            label_stats, label, threshold))
+
+    def RunClient(self, bits):
+        """Runs the benchmark client, between two noise probes if enabled.
+
+        Takes the bits and returns the latencies of RunClientOnce. In
+        noise probe mode a run measured under noise runs again, and the
+        noise score of the kept run is added to self._noise_scores.
+        """
+        if not self._noise:
+            return self.RunClientOnce(bits)
+        latencies, score = self._noise.Run(
+            lambda: self.RunClientOnce(bits))
+        self._noise_scores.append(score)
+        return latencies
+
+    def RunClientOnce(self, bits):
+        """Runs the benchmark client once and parses its result.
+
+        The benchmark service must be ready.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
 
+        Returns:
+            a list of ((operation, message size), latency in nanoseconds)
+            tuples where operation is 'read' or 'write'.
+        """
         # Runs the benchmark.
         logging.info("Start to run the benchmark (%s bit mode)", bits)
+        binary, command = self.ClientCommand(bits)
+
+        if self._pacer:
+            self._pacer.Pace()
+        if self._transport:
+            self.dut.shell.one.Execute("chmod 755 %s" % binary)
+            with self._transport.Run(
+                    command, "fmq_client_%sbits.out" % bits) as result_file:
+                logging.info("summary: %s", result_file.summary)
+                asserts.assertFalse(result_file.exit_code,
+                                    "FmqPerformanceTest failed.")
+                fmq_result = self.ParseClientOutput(result_file.Lines())
+        else:
+            results = self.dut.shell.one.Execute(["chmod 755 %s" % binary,
+                                                  command])
+            asserts.assertEqual(len(results[const.STDOUT]), 2)
+            asserts.assertFalse(any(results[const.EXIT_CODE]),
+                "FmqPerformanceTest failed.")
+            fmq_result = self.ParseClientOutput(
+                output_parser.IterLines(results[const.STDOUT][1]))
+        if self._pacer:
+            self._thermal_readings.append(self._pacer.Read())
+        return ([(("read", size), latency) for size, latency in
+                 zip(fmq_result.read_labels, fmq_result.read_latencies)] +
+                [(("write", size), latency) for size, latency in
+                 zip(fmq_result.write_labels, fmq_result.write_latencies)])
+
+    def ClientCommand(self, bits):
+        """Returns the binary and the command line of one client run.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+
+        Returns:
+            a tuple of the binary path and the shell command line.
+        """
         binary = "/data/local/tmp/%s/mq_benchmark_client%s" % (bits, bits)
+        command = ("LD_LIBRARY_PATH=/data/local/tmp/%s:$LD_LIBRARY_PATH "
+                   "%s" % (bits, binary))
+        return binary, command
+
+    def ParseClientOutput(self, lines):
+        """Parses the output of the benchmark client.
+
+        Args:
+            lines: iterable of strings, the lines of the client output.
+
+        Returns:
+            output_parser.FmqLatencyResult.
+        """
+        try:
+            return output_parser.ParseFmqOutput(lines)
+        except output_parser.ParseError as e:
+            asserts.fail("FmqPerformanceTest failed: %s" % e)
 
-        results = self.dut.shell.one.Execute([
-            "chmod 755 %s" % binary, "LD_LIBRARY_PATH=/data/local/tmp/%s:"
-            "$LD_LIBRARY_PATH %s" % (bits, binary)
-        ])
-
-        # Stop the benchmark service.
-        self.dut.shell.one.Execute("kill -9 `pidof mq_benchmark_service%s`" % bits)
-
-        # Parses the result.
-        asserts.assertEqual(len(results[const.STDOUT]), 2)
-        asserts.assertFalse(any(results[const.EXIT_CODE]),
-            "FmqPerformanceTest failed.")
-        read_label = []
-        read_latency = []
-        write_label = []
-        write_latency = []
-        stdout_lines = results[const.STDOUT][1].split("\n")
-        for line in stdout_lines:
-            if line.startswith("Average time to read"):
-                read_result = line.replace(
-                    "Average time to read", "").replace(
-                    "bytes", "").replace("ns", "")
-                (label, value) = read_result.split(": ")
-                read_label.append(label)
-                read_latency.append(int(value))
-            if line.startswith("Average time to write"):
-                write_result = line.replace(
-                    "Average time to write ", "").replace(
-                    "bytes", "").replace("ns", "")
-                (label, value) = write_result.split(": ")
-                write_label.append(label)
-                write_latency.append(int(value))
-
-        # To upload to the web DB.
-        self.web.AddProfilingDataLabeledVector(
-            "fmq_read_latency_benchmark_%sbits" % bits,
-            read_label,
-            read_latency,
-            x_axis_label="Message Size (Bytes)",
-            y_axis_label="Average Latency (nanoseconds)")
-
-        self.web.AddProfilingDataLabeledVector(
-            "fmq_write_latency_benchmark_%sbits" % bits,
-            write_label,
-            write_latency,
-            x_axis_label="Message Size (Bytes)",
-            y_axis_label="Average Latency (nanoseconds)")
-
-        # Assertions to check the performance requirements
-        for label, value in zip(read_label, read_latency):
-            if label in self.THRESHOLD[bits]:
-                asserts.assertLess(
-                    value, self.THRESHOLD[bits][label],
-                    "%s ns for %s is longer than the threshold %s ns" % (
-                        value, label, self.THRESHOLD[bits][label]))
-
-        for label, value in zip(write_label, write_latency):
-            if label in self.THRESHOLD[bits]:
-                asserts.assertLess(
-                    value, self.THRESHOLD[bits][label],
-                    "%s ns for %s is longer than the threshold %s ns" % (
-                        value, label, self.THRESHOLD[bits][label]))
 
 if __name__ == "__main__":
     test_runner.main()
@@ -22,6 +22,9 @@ from vts.runners.host import asserts
 from vts.runners.host import base_test
 from vts.runners.host import const
 from vts.runners.host import test_runner
+from vts.testcases.performance.utils import hidl_trace_store
+from vts.testcases.performance.utils import shard_runner
+from vts.testcases.performance.utils import trace_puller
 from vts.utils.python.controllers import android_device
 
 
@@ -47,15 +50,107 @@ class HidlTraceRecorder(base_test.BaseTestClass):
     TMP_DIR = "/data/local/tmp"
 
     def setUpClass(self):
-        self.dut = self.registerController(android_device)[0]
+        self._instrumentation_slots = int(self.getUserParam(
+            "instrumentation_slots", default_value=1))
+        self._trace_output_dir = self.getUserParam(
+            "trace_output_dir", default_value="")
+        self._trace_store = None
+        store_path = self.getUserParam(
+            "hidl_trace_store_path", default_value="")
+        if store_path and not self._trace_output_dir:
+            logging.warning("hidl_trace_store_path needs trace_output_dir; "
+                            "disabled.")
+        elif store_path:
+            self._trace_store = hidl_trace_store.HidlTraceStore(store_path)
+        self._last_callers = {}
+        self.duts = self.registerController(android_device)
+        self.dut = self.duts[0]
 
     def testRunCtsSensorTestCases(self):
-        """Runs all test cases in CtsSensorTestCases.apk."""
-        for cts_test in self.CTS_TESTS:
-          logging.info("Run %s", cts_test["apk"])
-          self.dut.adb.shell(
-              "am instrument -w -r %s/%s" % (cts_test["package"],
-                                             cts_test["runner"]))
+        """Runs all test cases in CtsSensorTestCases.apk.
+
+        The APKs are spread across all registered devices, and up to
+        instrumentation_slots APKs of distinct packages run at the same time
+        on one device. If trace_output_dir is set, the HIDL traces of a
+        device are pulled and compressed after each APK, while the others
+        are still running. If hidl_trace_store_path is also set, the calls
+        in the pulled traces are indexed with the APK package as the caller;
+        the traces written after the last pull of a device are indexed
+        under the last APK which ran on it.
+        """
+        puller = None
+        if self._trace_output_dir:
+            puller = trace_puller.IncrementalTracePuller(
+                self._trace_output_dir, self.TMP_DIR)
+        runner = shard_runner.ShardedJobRunner(
+            self.duts, slots_per_device=self._instrumentation_slots,
+            conflict_key=lambda index: self.CTS_TESTS[index]["package"])
+        try:
+            results = runner.Run(
+                range(len(self.CTS_TESTS)),
+                lambda dut, index: self.RunInstrumentation(
+                    dut, self.CTS_TESTS[index], puller))
+        finally:
+            if puller:
+                for dut in self.duts:
+                    puller.Pull(dut, self._TraceIndexer(
+                        dut, self._last_callers.get(dut.serial)))
+                puller.Close()
+            if self._trace_store:
+                self._trace_store.Flush()
+        for index, cts_test in enumerate(self.CTS_TESTS):
+            for serial, output in results[index]:
+                logging.info("%s on %s: %s", cts_test["apk"], serial,
+                             output.strip().splitlines()[-1:])
+            if self._trace_store:
+                for method in self._trace_store.GetTopMethods(
+                        cts_test["package"]):
+                    logging.info("%s top HIDL method %s %s::%s: %s calls "
+                                 "(%.1f%%)", cts_test["package"], method[0],
+                                 method[1], method[2], method[3],
+                                 method[4] * 100)
+
+    def RunInstrumentation(self, dut, cts_test, puller=None):
+        """Runs the instrumentation of one APK and pulls the new traces.
+
+        With several instrumentation slots, calls of an APK which overlaps
+        with another one on the same device may be indexed under either.
+
+        Args:
+            dut: the AndroidDevice to run on.
+            cts_test: dict, an element of CTS_TESTS.
+            puller: IncrementalTracePuller, or None to leave the traces on
+                    the device.
+
+        Returns:
+            string, the output of am instrument.
+        """
+        logging.info("Run %s on %s", cts_test["apk"], dut.serial)
+        output = dut.adb.shell(
+            "am instrument -w -r %s/%s" % (cts_test["package"],
+                                           cts_test["runner"]))
+        self._last_callers[dut.serial] = cts_test["package"]
+        if puller:
+            pulled = puller.Pull(
+                dut, self._TraceIndexer(dut, cts_test["package"]))
+            logging.info("Pulled %s trace bytes from %s", pulled, dut.serial)
+        return output
+
+    def _TraceIndexer(self, dut, caller):
+        """Returns the on_delta function which indexes pulled traces.
+
+        Args:
+            dut: the AndroidDevice the traces are pulled from.
+            caller: string, the package the calls are indexed under.
+
+        Returns:
+            a function for IncrementalTracePuller.Pull, or None if there is
+            no trace store or no caller.
+        """
+        if not self._trace_store or caller is None:
+            return None
+        return lambda remote_path, delta_path: self._trace_store.IngestFile(
+            delta_path, caller, "%s:%s" % (dut.serial, remote_path))
 
 if __name__ == "__main__":
     test_runner.main()
@@ -15,15 +15,15 @@
 # limitations under the License.
 #
 
-import logging
-
-from vts.runners.host import asserts
 from vts.runners.host import base_test
-from vts.runners.host import const
 from vts.runners.host import test_runner
+from vts.testcases.performance.utils import latency_runner
+from vts.testcases.performance.utils import quiesce_session
+from vts.testcases.performance.utils import result_store
+from vts.testcases.performance.utils import result_transport
+from vts.testcases.performance.utils import threshold_profile
 from vts.utils.python.controllers import android_device
 from vts.utils.python.cpu import cpu_frequency_scaling
-from vts.utils.python.performance import benchmark_parser
 
 
 class HwBinderPerformanceTest(base_test.BaseTestClass):
@@ -31,7 +31,19 @@ class HwBinderPerformanceTest(base_test.BaseTestClass):
 
     Attributes:
         dut: the target DUT (device under test) instance.
+        hidl_hal_mode: string, the HIDL mode of the current run.
+        _hal_modes: list of strings, the HIDL modes which each test case
+                    runs one after another, from hidl_hal_modes or else
+                    hidl_hal_mode.
+        _mode_webs: dict which maps each HIDL mode to a web feature which
+                    tags the vector names with the mode, if there are
+                    several modes.
         _cpu_freq: CpuFrequencyScalingController instance of self.dut.
+        _quiesce: QuiesceSession which keeps the framework stopped, possibly
+                  across several modules.
+        _transport: FileResultTransport which moves the benchmark output
+                    through a device file, or None to read it from stdout.
+        _runner: LatencyRunner which runs the benchmark.
     """
 
     THRESHOLD = {
@@ -72,82 +84,167 @@ class HwBinderPerformanceTest(base_test.BaseTestClass):
     }
 
     def setUpClass(self):
-        required_params = ["hidl_hal_mode"]
-        self.getUserParams(required_params)
+        self._hal_modes = self.getUserParam("hidl_hal_modes",
+                                            default_value=[])
+        if not self._hal_modes:
+            required_params = ["hidl_hal_mode"]
+            self.getUserParams(required_params)
+            self._hal_modes = [self.hidl_hal_mode]
+        self.hidl_hal_mode = self._hal_modes[0]
         self.dut = self.registerController(android_device)[0]
+        self._mode_webs = {}
+        if len(self._hal_modes) > 1:
+            for mode in self._hal_modes:
+                self._mode_webs[mode] = result_store.WrapWebFeature(
+                    self, self.dut, mode, tag_hal_mode=True)
+        self.web = result_store.WrapWebFeature(
+            self, self.dut, "" if self._mode_webs else self.hidl_hal_mode)
         self.dut.shell.InvokeTerminal("one")
-        self.dut.shell.one.Execute("stop")
-        self.dut.shell.one.Execute("setprop sys.boot_completed 0")
-        self._cpu_freq = cpu_frequency_scaling.CpuFrequencyScalingController(self.dut)
+        self._quiesce = quiesce_session.CreateSession(self, self.dut)
+        self._quiesce.Join()
+        self._cpu_freq = cpu_frequency_scaling.CpuFrequencyScalingController(
+            self.dut)
         self._cpu_freq.DisableCpuScaling()
+        self._transport = None
+        if self.getUserParam("file_result_transport", default_value=False):
+            self._transport = result_transport.FileResultTransport(self.dut)
+        self._runner = latency_runner.LatencyRunner(
+            self, self.dut, self._cpu_freq, self._transport, "hwbinder",
+            "HwBinder", self.BenchmarkCommand,
+            threshold_profile.LoadThresholds(
+                self, self.dut, "hwbinder_latency", self.THRESHOLD),
+            self.LoadCommand)
 
     def setUp(self):
-        self._cpu_freq.SkipIfThermalThrottling(retry_delay_secs=30)
+        if not self._runner.pacing:
+            self._cpu_freq.SkipIfThermalThrottling(retry_delay_secs=30)
 
     def tearDown(self):
-        self._cpu_freq.SkipIfThermalThrottling()
+        if not self._runner.pacing:
+            self._cpu_freq.SkipIfThermalThrottling()
 
     def tearDownClass(self):
         self._cpu_freq.EnableCpuScaling()
-        self.dut.shell.one.Execute("start")
-        self.dut.waitForBootCompletion()
+        if self._transport:
+            self._transport.Close()
+        self._quiesce.Leave(bool(self.results.failed or self.results.error))
 
     def testRunBenchmark32Bit(self):
         """A testcase which runs the 32-bit benchmark."""
-        self.RunBenchmark(32)
+        self.RunModes(32)
 
     def testRunBenchmark64Bit(self):
         """A testcase which runs the 64-bit benchmark."""
-        self.RunBenchmark(64)
+        self.RunModes(64)
+
+    def RunModes(self, bits):
+        """Runs the benchmark in each HIDL mode and checks the thresholds.
 
-    def RunBenchmark(self, bits):
-        """Runs the native binary and parses its result.
+        See LatencyRunner.Run for the modes of each run. With several HIDL
+        modes, the vectors of each mode are uploaded under names tagged
+        with the mode, and if both BINDERIZE and PASSTHROUGH ran, the
+        binderization overhead per message size is uploaded. The
+        thresholds are checked after all the modes ran.
 
         Args:
             bits: integer (32 or 64), the number of bits in a word chosen
                   at the compile time (e.g., 32- vs. 64-bit library).
         """
-        # Runs the benchmark.
-        logging.info(
-            "Start to run the benchmark with HIDL mode %s (%s bit mode)",
-            self.hidl_hal_mode, bits)
-        binary = "/data/local/tmp/%s/libhwbinder_benchmark%s" % (bits, bits)
+        results = {}
+        web = self.web
+        try:
+            for mode in self._hal_modes:
+                self.hidl_hal_mode = mode
+                self.web = self._mode_webs.get(mode, web)
+                results[mode] = self._runner.Run(bits)
+        finally:
+            self.web = web
+        if "BINDERIZE" in results and "PASSTHROUGH" in results:
+            self.ReportBinderizationOverhead(
+                bits, results["BINDERIZE"][:2], results["PASSTHROUGH"][:2])
+        for mode in self._hal_modes:
+            labels, stats, noise_score = results[mode]
+            self._runner.CheckThresholds(bits, labels, stats, noise_score)
+
+    def ReportBinderizationOverhead(self, bits, binderize, passthrough):
+        """Uploads the extra latency of BINDERIZE over PASSTHROUGH.
 
-        results = self.dut.shell.one.Execute([
-            "chmod 755 %s" % binary,
-            "LD_LIBRARY_PATH=/system/lib%s:/data/local/tmp/%s/hw:"
-            "/data/local/tmp/%s:$LD_LIBRARY_PATH "
-            "%s -m %s --benchmark_format=json" %
-            (bits, bits, bits, binary, self.hidl_hal_mode.encode("utf-8"))
-        ])
-
-        # Parses the result.
-        asserts.assertEqual(len(results[const.STDOUT]), 2)
-        logging.info("stderr: %s", results[const.STDERR][1])
-        logging.info("stdout: %s", results[const.STDOUT][1])
-        asserts.assertFalse(
-            any(results[const.EXIT_CODE]),
-            "HwBinderPerformanceTest failed.")
-        parser = benchmark_parser.GoogleBenchmarkJsonParser(
-            results[const.STDOUT][1])
-        label_result = parser.getArguments()
-        value_result = parser.getRealTime()
-
-        # To upload to the web DB.
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            binderize: tuple of the labels and LabelStats of BINDERIZE.
+            passthrough: tuple of the labels and LabelStats of PASSTHROUGH.
+        """
+        passthrough_means = dict(
+            (label, label_stats.mean)
+            for label, label_stats in zip(*passthrough))
+        labels = []
+        overhead_ns = []
+        overhead_percent = []
+        for label, label_stats in zip(*binderize):
+            base = passthrough_means.get(label)
+            if not base:
+                continue
+            labels.append(label)
+            overhead_ns.append(int(label_stats.mean - base))
+            overhead_percent.append(int(100 * (label_stats.mean - base) /
+                                        base))
+        self.web.AddProfilingDataLabeledVector(
+            "hwbinder_binderization_overhead_ns_%sbits" % bits,
+            labels,
+            overhead_ns,
+            x_axis_label="Message Size (Bytes)",
+            y_axis_label="Binderize - Passthrough Roundtrip Latency "
+                         "(nanoseconds)")
         self.web.AddProfilingDataLabeledVector(
-            "hwbinder_vector_roundtrip_latency_benchmark_%sbits" % bits,
-            label_result,
-            value_result,
+            "hwbinder_binderization_overhead_percent_%sbits" % bits,
+            labels,
+            overhead_percent,
             x_axis_label="Message Size (Bytes)",
-            y_axis_label="Roundtrip HwBinder RPC Latency (naonseconds)")
-
-        # Assertions to check the performance requirements
-        for label, value in zip(label_result, value_result):
-            if label in self.THRESHOLD[bits]:
-                asserts.assertLess(
-                    value, self.THRESHOLD[bits][label],
-                    "%s ns for %s is longer than the threshold %s ns" % (
-                        value, label, self.THRESHOLD[bits][label]))
+            y_axis_label="Binderization Overhead (percent of Passthrough)")
+
+    def BenchmarkCommand(self, bits, repetitions, extra_args):
+        """Returns the binary and the command line of one benchmark run.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            repetitions: integer, the Google Benchmark repetitions to run.
+            extra_args: string, extra command line arguments of the binary.
+
+        Returns:
+            a tuple of the binary path and the shell command line, which
+            runs in the HIDL mode of the test.
+        """
+        binary = "/data/local/tmp/%s/libhwbinder_benchmark%s" % (bits, bits)
+        command = (
+            "LD_LIBRARY_PATH=/system/lib%s:/data/local/tmp/%s/hw:"
+            "/data/local/tmp/%s:$LD_LIBRARY_PATH "
+            "%s -m %s --benchmark_format=json --benchmark_repetitions=%s %s" %
+            (bits, bits, bits, binary, self.hidl_hal_mode.encode("utf-8"),
+             repetitions, extra_args))
+        return binary, command
+
+    def LoadCommand(self, bits, workers, extra_args):
+        """Returns the binary and the command line of the background load.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            workers: positive integer, the number of throughput workers.
+            extra_args: string, extra command line arguments of the binary.
+
+        Returns:
+            a tuple of the binary path and the shell command line, which
+            runs in the HIDL mode of the test.
+        """
+        binary = "/data/local/tmp/%s/hwbinderThroughputTest%s" % (bits, bits)
+        command = ("LD_LIBRARY_PATH=/system/lib%s:/data/local/tmp/%s/hw:"
+                   "/data/local/tmp/%s:$LD_LIBRARY_PATH %s -m %s -w %s %s" % (
+                       bits, bits, bits, binary,
+                       self.hidl_hal_mode.encode("utf-8"), workers,
+                       extra_args))
+        return binary, command
 
 
 if __name__ == "__main__":
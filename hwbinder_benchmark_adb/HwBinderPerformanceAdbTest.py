@@ -21,6 +21,10 @@ from vts.runners.host import asserts
 from vts.runners.host import base_test
 from vts.runners.host import const
 from vts.runners.host import test_runner
+from vts.testcases.performance.utils import noise_probe
+from vts.testcases.performance.utils import quiesce_session
+from vts.testcases.performance.utils import result_store
+from vts.testcases.performance.utils import threshold_profile
 from vts.utils.python.controllers import adb
 from vts.utils.python.controllers import android_device
 
@@ -31,6 +35,12 @@ class HwBinderPerformanceAdbTest(base_test.BaseTestClass):
     Attributes:
         dut: the target DUT (device under test) instance.
         _cpu_freq: CpuFrequencyScalingController instance of self.dut.
+        _quiesce: QuiesceSession which keeps the framework stopped, possibly
+                  across several modules.
+        _thresholds: ThresholdTable of the latency limits, built from
+                     THRESHOLD and the threshold profiles of the device.
+        _noise: NoiseProbe which probes the background noise around each
+                binary run in noise probe mode, or None.
     """
 
     THRESHOLD = {
@@ -76,12 +86,18 @@ class HwBinderPerformanceAdbTest(base_test.BaseTestClass):
         required_params = ["hidl_hal_mode"]
         self.getUserParams(required_params)
         self.dut = self.registerController(android_device, False)[0]
-        # Reboot target without restarting VTS services.
-        self.dut.reboot(False)
-        self.dut.stop()
+        self.web = result_store.WrapWebFeature(
+            self, self.dut, self.hidl_hal_mode)
+        # Reboot target without restarting VTS services, unless an earlier
+        # module of the quiesce session already stopped the framework.
+        self._quiesce = quiesce_session.CreateSession(self, self.dut)
+        self._quiesce.Join(reboot=True)
+        self._thresholds = threshold_profile.LoadThresholds(
+            self, self.dut, "hwbinder_latency", self.THRESHOLD)
+        self._noise = noise_probe.CreateProbe(self, self.dut)
 
     def tearDownClass(self):
-        self.dut.start()
+        self._quiesce.Leave(bool(self.results.failed or self.results.error))
 
     def testRunBenchmark32Bit(self):
         """A testcase which runs the 32-bit benchmark."""
@@ -94,6 +110,11 @@ class HwBinderPerformanceAdbTest(base_test.BaseTestClass):
     def RunBenchmark(self, bits):
         """Runs the native binary and parses its result.
 
+        In noise probe mode the binary runs between two noise probes, a run
+        measured under noise runs again, and the noise score of the kept run
+        is uploaded per label. With noise_exclude_noisy a noisy result skips
+        the threshold checks.
+
         Args:
             bits: integer (32 or 64), the number of bits in a word chosen
                   at the compile time (e.g., 32- vs. 64-bit library).
@@ -106,12 +127,18 @@ class HwBinderPerformanceAdbTest(base_test.BaseTestClass):
 
         self.dut.adb.shell("chmod 755 %s" % binary)
 
+        command = ("LD_LIBRARY_PATH=/system/lib%s:/data/local/tmp/%s/hw:"
+                   "/data/local/tmp/%s:"
+                   "$LD_LIBRARY_PATH %s -m %s" %
+                   (bits, bits, bits, binary,
+                    self.hidl_hal_mode.encode("utf-8")))
+        noise_score = None
         try:
-            result = self.dut.adb.shell(
-                "LD_LIBRARY_PATH=/system/lib%s:/data/local/tmp/%s/hw:"
-                "/data/local/tmp/%s:"
-                "$LD_LIBRARY_PATH %s -m %s" %
-                (bits, bits, bits, binary, self.hidl_hal_mode.encode("utf-8")))
+            if self._noise:
+                result, noise_score = self._noise.Run(
+                    lambda: self.dut.adb.shell(command))
+            else:
+                result = self.dut.adb.shell(command)
         except adb.AdbError as e:
             asserts.fail("HwBinderPerformanceTest failed.")
 
@@ -142,14 +169,27 @@ class HwBinderPerformanceAdbTest(base_test.BaseTestClass):
             value_result,
             x_axis_label="Message Size (Bytes)",
             y_axis_label="Roundtrip HwBinder RPC Latency (naonseconds)")
+        if noise_score is not None:
+            self.web.AddProfilingDataLabeledVector(
+                "hwbinder_vector_roundtrip_latency_noise_score_%sbits" % bits,
+                label_result,
+                [noise_score] * len(label_result),
+                x_axis_label="Message Size (Bytes)",
+                y_axis_label="Background Noise Score (percent of the limit)")
+            if (self._noise.exclude_noisy and
+                    noise_probe.IsNoisy(noise_score)):
+                logging.warning("Measured under noise score %s; thresholds "
+                                "not checked.", noise_score)
+                return
 
         # Assertions to check the performance requirements
         for label, value in zip(label_result, value_result):
-            if label in self.THRESHOLD[bits]:
+            threshold = self._thresholds.GetThreshold(bits, label)
+            if threshold is not None:
                 asserts.assertLess(
-                    value, self.THRESHOLD[bits][label],
+                    value, threshold,
                     "%s ns for %s is longer than the threshold %s ns" % (
-                        value, label, self.THRESHOLD[bits][label]))
+                        value, label, threshold))
 
 
 if __name__ == "__main__":
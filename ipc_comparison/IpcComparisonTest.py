@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import functools
+import logging
+
+from vts.proto import VtsReportMessage_pb2 as ReportMsg
+from vts.runners.host import asserts
+from vts.runners.host import base_test
+from vts.runners.host import const
+from vts.runners.host import test_runner
+from vts.testcases.performance.utils import fmq_service
+from vts.testcases.performance.utils import ipc_comparison
+from vts.testcases.performance.utils import noise_probe
+from vts.testcases.performance.utils import output_parser
+from vts.testcases.performance.utils import quiesce_session
+from vts.testcases.performance.utils import result_store
+from vts.testcases.performance.utils import thermal_pacer
+from vts.utils.python.controllers import android_device
+from vts.utils.python.cpu import cpu_frequency_scaling
+
+# the HIDL mode of each hwbinder mechanism.
+_HIDL_HAL_MODES = {
+    "hwbinder_binderize": "BINDERIZE",
+    "hwbinder_passthrough": "PASSTHROUGH",
+}
+
+
+class IpcComparisonTest(base_test.BaseTestClass):
+    """Compares binder, hwbinder and FMQ on identical message sizes.
+
+    All the mechanisms run in one session under the same device conditions:
+    the framework is stopped, CPU scaling is disabled, and each round runs
+    every mechanism once so slow drifts such as heat affect them alike.
+
+    Attributes:
+        dut: the target DUT (device under test) instance.
+        _sizes: list of integers, the message sizes in bytes.
+        _mechanisms: list of strings, the compared mechanisms, a subset of
+                     ipc_comparison.MECHANISMS.
+        _baseline: string, the mechanism the ratios are relative to.
+        _rounds: integer, the number of runs of every mechanism.
+        _fmq_args_template: string, the FMQ client arguments of one size,
+                            formatted with 'message_size', or empty to run
+                            the client once with its built-in sizes.
+        _cpu_freq: CpuFrequencyScalingController instance of self.dut.
+        _quiesce: QuiesceSession which keeps the framework stopped, possibly
+                  across several modules.
+        _pacer: ThermalPacer which waits for the device to cool down before
+                each run in thermal pacing mode, or None.
+        _noise: NoiseProbe which probes the background noise around each
+                run in noise probe mode, or None.
+        _services: FmqServicePool of the FMQ benchmark services, one per
+                   bitness.
+    """
+
+    def setUpClass(self):
+        self._sizes = [int(size) for size in self.getUserParam(
+            "comparison_sizes", default_value=ipc_comparison.DEFAULT_SIZES)]
+        mechanisms = self.getUserParam(
+            "comparison_mechanisms",
+            default_value=list(ipc_comparison.MECHANISMS))
+        self._mechanisms = [mechanism for mechanism in mechanisms
+                            if mechanism in ipc_comparison.MECHANISMS]
+        if len(self._mechanisms) != len(mechanisms):
+            logging.warning("Unknown mechanisms ignored: %s", ", ".join(
+                set(mechanisms) - set(self._mechanisms)))
+        self._baseline = self.getUserParam(
+            "comparison_baseline", default_value=self._mechanisms[0])
+        self._rounds = int(self.getUserParam(
+            "comparison_rounds", default_value=3))
+        self._fmq_args_template = self.getUserParam(
+            "comparison_fmq_args_template", default_value="")
+        self.dut = self.registerController(android_device)[0]
+        self.web = result_store.WrapWebFeature(self, self.dut)
+        self.dut.shell.InvokeTerminal("one")
+        self._quiesce = quiesce_session.CreateSession(self, self.dut)
+        self._quiesce.Join()
+        self._cpu_freq = cpu_frequency_scaling.CpuFrequencyScalingController(
+            self.dut)
+        self._cpu_freq.DisableCpuScaling()
+        self._pacer = thermal_pacer.CreatePacer(self, self.dut, self._cpu_freq)
+        self._noise = noise_probe.CreateProbe(self, self.dut)
+        self._services = fmq_service.FmqServicePool(self.dut.shell.one)
+
+    def tearDownClass(self):
+        try:
+            self._services.Stop()
+        except fmq_service.ServiceError as e:
+            logging.error(e)
+        self._cpu_freq.EnableCpuScaling()
+        self._quiesce.Leave(bool(self.results.failed or self.results.error))
+
+    def setUp(self):
+        if not self._pacer:
+            self._cpu_freq.SkipIfThermalThrottling(retry_delay_secs=30)
+
+    def tearDown(self):
+        if not self._pacer:
+            self._cpu_freq.SkipIfThermalThrottling()
+
+    def testCompare32Bit(self):
+        """A testcase which compares the 32-bit mechanisms."""
+        self.RunComparison(32)
+
+    def testCompare64Bit(self):
+        """A testcase which compares the 64-bit mechanisms."""
+        self.RunComparison(64)
+
+    def RunComparison(self, bits):
+        """Runs every mechanism on the size grid and reports them together.
+
+        The latency of each mechanism is uploaded per size, named after its
+        kind, round trip or one way. The latency of each other mechanism of
+        the same kind as the baseline is uploaded in percent of the
+        baseline's. In noise probe mode the highest noise score of the runs
+        of each mechanism is uploaded too.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+        """
+        if "fmq" in self._mechanisms:
+            try:
+                self._services.EnsureRunning(bits)
+            except fmq_service.ServiceError as e:
+                asserts.fail("Failed to start the benchmark service: %s" % e)
+
+        table = ipc_comparison.ComparisonTable(self._sizes, self._mechanisms)
+        noise_scores = dict((mechanism, []) for mechanism in self._mechanisms)
+        for round_index in range(self._rounds):
+            for mechanism in self._mechanisms:
+                logging.info("Round %s/%s: %s (%s bit mode)",
+                             round_index + 1, self._rounds, mechanism, bits)
+                if self._pacer:
+                    self._pacer.Pace()
+                if mechanism == "fmq":
+                    run = functools.partial(self.RunFmq, bits)
+                else:
+                    run = functools.partial(self.RunLatencyBinary, bits,
+                                            mechanism)
+                if self._noise:
+                    samples, score = self._noise.Run(run)
+                    noise_scores[mechanism].append(score)
+                else:
+                    samples = run()
+                if mechanism == "fmq":
+                    for size, latency in samples:
+                        table.Add("fmq", size, latency)
+                else:
+                    table.AddGoogleBenchmarkSamples(mechanism, samples)
+        logging.info("IPC comparison (%s bits):\n%s", bits,
+                     table.Format(self._baseline))
+
+        for mechanism in self._mechanisms:
+            sizes = [size for size in self._sizes
+                     if table.GetLatency(mechanism, size) is not None]
+            labels = [ipc_comparison.SizeLabel(size) for size in sizes]
+            kind = ipc_comparison.KINDS[mechanism]
+            self.web.AddProfilingDataLabeledVector(
+                "ipc_comparison_%s_%s_latency_ns_%sbits" % (mechanism, kind,
+                                                            bits),
+                labels,
+                [int(table.GetLatency(mechanism, size)) for size in sizes],
+                x_axis_label="Message Size (Bytes)",
+                y_axis_label="%s Latency (nanoseconds)" %
+                             kind.replace("_", " ").title(),
+                regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+            if noise_scores[mechanism]:
+                self.web.AddProfilingDataLabeledVector(
+                    "ipc_comparison_%s_noise_score_%sbits" % (mechanism, bits),
+                    labels,
+                    [max(noise_scores[mechanism])] * len(labels),
+                    x_axis_label="Message Size (Bytes)",
+                    y_axis_label="Background Noise Score "
+                                 "(percent of the limit)",
+                    regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+            if mechanism == self._baseline:
+                continue
+            if kind != ipc_comparison.KINDS[self._baseline]:
+                logging.info("%s is not compared to %s: %s vs. %s latency.",
+                             mechanism, self._baseline, kind,
+                             ipc_comparison.KINDS[self._baseline])
+                continue
+            sizes = [size for size in sizes if table.GetRatio(
+                mechanism, self._baseline, size) is not None]
+            self.web.AddProfilingDataLabeledVector(
+                "ipc_comparison_%s_vs_%s_latency_percent_%sbits" % (
+                    mechanism, self._baseline, bits),
+                [ipc_comparison.SizeLabel(size) for size in sizes],
+                [int(round(100 * table.GetRatio(mechanism, self._baseline,
+                                                size)))
+                 for size in sizes],
+                x_axis_label="Message Size (Bytes)",
+                y_axis_label="Latency in Percent of %s" % self._baseline,
+                regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+
+    def RunLatencyBinary(self, bits, mechanism):
+        """Runs the binder or hwbinder latency binary on the size grid.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            mechanism: string, 'binder' or a hwbinder mechanism.
+
+        Returns:
+            a list of (label, latency in nanoseconds) tuples.
+        """
+        args = "--benchmark_format=json --benchmark_filter=%s" % (
+            ipc_comparison.BenchmarkFilter(self._sizes))
+        if mechanism == "binder":
+            binary = "/data/local/tmp/%s/libbinder_benchmark%s" % (bits, bits)
+            command = ("LD_LIBRARY_PATH=/data/local/tmp/%s/hw:"
+                       "/data/local/tmp/%s:$LD_LIBRARY_PATH %s %s" % (
+                           bits, bits, binary, args))
+        else:
+            binary = "/data/local/tmp/%s/libhwbinder_benchmark%s" % (bits,
+                                                                    bits)
+            command = ("LD_LIBRARY_PATH=/system/lib%s:/data/local/tmp/%s/hw:"
+                       "/data/local/tmp/%s:$LD_LIBRARY_PATH %s -m %s %s" % (
+                           bits, bits, bits, binary,
+                           _HIDL_HAL_MODES[mechanism], args))
+        results = self.dut.shell.one.Execute(["chmod 755 %s" % binary,
+                                              command])
+        asserts.assertEqual(len(results[const.STDOUT]), 2)
+        logging.info("stderr: %s", results[const.STDERR][1])
+        asserts.assertFalse(any(results[const.EXIT_CODE]),
+                            "%s benchmark failed." % mechanism)
+        try:
+            return output_parser.ParseGoogleBenchmarkSamples(
+                results[const.STDOUT][1])
+        except output_parser.ParseError as e:
+            asserts.fail("%s benchmark failed: %s" % (mechanism, e))
+
+    def RunFmq(self, bits):
+        """Runs the FMQ client on the size grid.
+
+        The stock client measures its own fixed sizes, so by default it runs
+        once and the sizes of the grid are taken from its output. With
+        comparison_fmq_args_template it runs once per size. The latency of
+        a size is its write time plus its read time.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+
+        Returns:
+            a list of (size, latency in nanoseconds) tuples.
+        """
+        binary = "/data/local/tmp/%s/mq_benchmark_client%s" % (bits, bits)
+        self.dut.shell.one.Execute("chmod 755 %s" % binary)
+        if self._fmq_args_template:
+            args = [self._fmq_args_template % {"message_size": size}
+                    for size in self._sizes]
+        else:
+            args = [""]
+        read = {}
+        write = {}
+        for client_args in args:
+            results = self.dut.shell.one.Execute(
+                "LD_LIBRARY_PATH=/data/local/tmp/%s:$LD_LIBRARY_PATH %s %s" % (
+                    bits, binary, client_args))
+            asserts.assertFalse(any(results[const.EXIT_CODE]),
+                                "fmq benchmark failed.")
+            try:
+                result = output_parser.ParseFmqOutput(
+                    output_parser.IterLines(results[const.STDOUT][0]))
+            except output_parser.ParseError as e:
+                asserts.fail("fmq benchmark failed: %s" % e)
+            read.update(zip(result.read_labels, result.read_latencies))
+            write.update(zip(result.write_labels, result.write_latencies))
+        latencies = []
+        for size in self._sizes:
+            if str(size) in read and str(size) in write:
+                latencies.append((size, read[str(size)] + write[str(size)]))
+            else:
+                logging.warning("No fmq result for %s bytes.", size)
+        return latencies
+
+if __name__ == "__main__":
+    test_runner.main()
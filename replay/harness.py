@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Runs performance test modules against a replayed device.
+
+The test modules register their devices and create their CPU frequency
+controllers, batch executors and result transports as on a real device.
+Install replaces those with the stand-ins of replay_device from the
+outside, so no test module depends on the replay code. For example
+
+    python -m vts.testcases.performance.replay.harness \
+        --fixture my_fixture.json \
+        vts.testcases.performance.binder_benchmark.BinderPerformanceTest \
+        <arguments of the test module>
+"""
+
+import logging
+import runpy
+import sys
+
+from vts.runners.host import base_test
+from vts.testcases.performance.replay import replay_device
+from vts.testcases.performance.utils import batch_executor
+from vts.testcases.performance.utils import result_transport
+from vts.utils.python.cpu import cpu_frequency_scaling
+
+
+def Install(fixture_path=replay_device.DEFAULT_FIXTURE_PATH):
+    """Replaces the device controllers with replaying stand-ins.
+
+    Every registerController call of a test class returns one ReplayDevice
+    which replays the fixture.
+
+    Args:
+        fixture_path: string, the JSON fixture to replay.
+
+    Returns:
+        a function which restores the original controllers.
+    """
+    logging.info("Replaying the device commands of %s", fixture_path)
+    device = replay_device.ReplayDevice(
+        replay_device.ReplayFixture(fixture_path))
+    patches = [
+        (base_test.BaseTestClass, "registerController",
+         lambda test, module, *args, **kwargs: [device]),
+        (cpu_frequency_scaling, "CpuFrequencyScalingController",
+         replay_device.ReplayCpuFrequencyScalingController),
+        (batch_executor, "BatchExecutor", replay_device.ReplayBatchExecutor),
+        (result_transport, "FileResultTransport",
+         replay_device.ReplayResultTransport),
+    ]
+    originals = [(owner, name, getattr(owner, name))
+                 for owner, name, _ in patches]
+    for owner, name, replacement in patches:
+        setattr(owner, name, replacement)
+
+    def Restore():
+        for owner, name, original in originals:
+            setattr(owner, name, original)
+
+    return Restore
+
+
+def main(argv):
+    """Installs the stand-ins and runs a test module as __main__.
+
+    Args:
+        argv: list of strings, an optional '--fixture <path>', the test
+              module name and the arguments of the test module.
+    """
+    args = list(argv[1:])
+    fixture_path = replay_device.DEFAULT_FIXTURE_PATH
+    if len(args) >= 2 and args[0] == "--fixture":
+        fixture_path = args[1]
+        args = args[2:]
+    if not args:
+        sys.exit("Usage: %s [--fixture <path>] <test module> [arguments]" %
+                 argv[0])
+    Install(fixture_path)
+    sys.argv = args
+    runpy.run_module(args[0], run_name="__main__", alter_sys=True)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
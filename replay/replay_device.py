@@ -0,0 +1,545 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Offline replay of device commands.
+
+The test classes know nothing of replay: the harness module installs the
+stand-ins of this module in place of the device controllers, so a test
+class runs against a ReplayDevice instead of a real DUT. Its shell
+terminals and adb serve the outputs of a fixture, a JSON file of the form
+
+    {
+        "serial": "replay",
+        "seed": 0,
+        "rules": [
+            {"pattern": "^getprop ro.board.platform$", "stdout": "msm8998"},
+            {"pattern": "libbinder_benchmark",
+             "synthetic": "google_benchmark", "args": {"base_ns": 30000}},
+            {"pattern": "mq_benchmark_service64&$",
+             "set": {"fmq_service": true}},
+            {"pattern": "^pidof mq_benchmark_service",
+             "when": {"fmq_service": true}, "stdout": "4242"}
+        ]
+    }
+
+The first rule whose pattern matches a command (re.search) and whose
+'when' state holds serves it. A rule answers with 'stdout', 'stderr' and
+'exit_code' (default 0), 'stdout_file' (relative to the fixture) or the
+output of a 'synthetic' generator called with 'args', and then updates the
+fixture state with 'set'. Commands matched by no rule succeed silently.
+The synthetic generators make outputs of any size, so the parsing and
+reporting of the host side can be benchmarked without a device.
+"""
+
+import json
+import logging
+import os
+import random
+import re
+
+from vts.runners.host import const
+from vts.testcases.performance.utils import batch_executor
+from vts.testcases.performance.utils import output_parser
+from vts.testcases.performance.utils import result_transport
+from vts.utils.python.controllers import adb
+
+DEFAULT_FIXTURE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "fixtures", "default.json")
+
+_REPETITIONS_PATTERN = re.compile(r"--benchmark_repetitions=(\d+)")
+_THREADS_PATTERN = re.compile(r"-w\s+(\d+)")
+_MESSAGE_SIZE_PATTERN = re.compile(r"--message_size=(\d+)")
+_MESSAGE_SIZES = ["4", "8", "16", "32", "64", "128", "256", "512", "1024",
+                  "2k", "4k", "8k", "16k", "32k", "64k"]
+_NS_PER_MS = 1000000.0
+
+
+class ReplayError(Exception):
+    """Raised when a fixture is malformed."""
+
+
+def _SizeInBytes(label):
+    """Returns the size of a message size label, e.g. 2048 for '2k'."""
+    if label.endswith("k"):
+        return int(label[:-1]) * 1024
+    return int(label)
+
+
+def _Jitter(rng, value, spread=0.05):
+    """Returns value randomly moved by up to spread of itself."""
+    return value * (1 + rng.uniform(-spread, spread))
+
+
+def _DefaultBenchmarkName(command):
+    if "libbinder_benchmark" in command:
+        return "BM_sendVec_binder"
+    if "PASSTHROUGH" in command:
+        return "BM_sendVec_passthrough"
+    return "BM_sendVec_binderize"
+
+
+def SyntheticGoogleBenchmarkOutput(command, rng, name=None, sizes=None,
+                                   base_ns=20000, ns_per_kb=500,
+                                   iterations=1000):
+    """Generates the --benchmark_format=json output of a latency binary.
+
+    Args:
+        command: string, the replayed command. Its --benchmark_repetitions
+                 sets the number of runs per size.
+        rng: random.Random used for the noise.
+        name: string, the benchmark name, or None to derive it from the
+              command.
+        sizes: list of message size labels, e.g. ['4', '2k'].
+        base_ns: number, the latency of an empty message.
+        ns_per_kb: number, the extra latency per KiB of message.
+        iterations: integer, the iterations of each run.
+
+    Returns:
+        string, the JSON document.
+    """
+    match = _REPETITIONS_PATTERN.search(command)
+    repetitions = int(match.group(1)) if match else 1
+    name = name or _DefaultBenchmarkName(command)
+    benchmarks = []
+    for label in sizes or _MESSAGE_SIZES:
+        latency = base_ns + ns_per_kb * _SizeInBytes(label) / 1024.0
+        real_times = [_Jitter(rng, latency) for _ in range(repetitions)]
+        run_name = "%s/%s" % (name, label)
+        if repetitions > 1:
+            run_name += "/repeats:%s" % repetitions
+        for real_time in real_times:
+            benchmarks.append({"name": run_name, "run_type": "iteration",
+                               "iterations": iterations,
+                               "real_time": real_time,
+                               "cpu_time": real_time / 2, "time_unit": "ns"})
+        if repetitions > 1:
+            benchmarks.append({"name": run_name + "_mean",
+                               "run_type": "aggregate",
+                               "iterations": repetitions,
+                               "real_time": sum(real_times) / repetitions,
+                               "cpu_time": sum(real_times) / repetitions / 2,
+                               "time_unit": "ns"})
+    return json.dumps({"context": {"library_build_type": "release"},
+                       "benchmarks": benchmarks}, indent=2)
+
+
+def SyntheticGoogleBenchmarkConsoleOutput(command, rng, name=None,
+                                          sizes=None, base_ns=20000,
+                                          ns_per_kb=500, iterations=1000):
+    """Generates the console output of a latency binary.
+
+    See SyntheticGoogleBenchmarkOutput for the arguments.
+    """
+    name = name or _DefaultBenchmarkName(command)
+    lines = ["Benchmark                Time           CPU Iterations",
+             "-" * 56]
+    for label in sizes or _MESSAGE_SIZES:
+        latency = _Jitter(
+            rng, base_ns + ns_per_kb * _SizeInBytes(label) / 1024.0)
+        lines.append("%s/%s %10d ns %10d ns %10d" % (
+            name, label, latency, latency / 2, iterations))
+    return "\n".join(lines) + "\n"
+
+
+def SyntheticThroughputOutput(command, rng, samples=0, samples_per_line=1,
+                              base_ns=50000, saturation_threads=4):
+    """Generates the output of a binder throughput binary.
+
+    The latency grows linearly once the thread count of the command (-w)
+    exceeds saturation_threads, so the throughput saturates there.
+
+    Args:
+        command: string, the replayed command.
+        rng: random.Random used for the noise.
+        samples: integer, the number of raw latency samples (nanoseconds)
+                 to print in a sample block.
+        samples_per_line: integer, the number of samples per line.
+        base_ns: number, the average latency below saturation.
+        saturation_threads: integer, the thread count of the knee.
+
+    Returns:
+        string, the output.
+    """
+    match = _THREADS_PATTERN.search(command)
+    threads = int(match.group(1)) if match else 1
+    average = base_ns * max(1.0, float(threads) / saturation_threads)
+    lines = []
+    line = []
+    if samples:
+        lines.append(output_parser.SAMPLE_BLOCK_BEGIN)
+    for _ in range(samples):
+        line.append("%d" % rng.expovariate(1.0 / average))
+        if len(line) == samples_per_line:
+            lines.append(" ".join(line))
+            line = []
+    if line:
+        lines.append(" ".join(line))
+    if samples:
+        lines.append(output_parser.SAMPLE_BLOCK_END)
+    lines.append("iterations per sec: %s" % _Jitter(
+        rng, threads * 1e9 / average))
+    lines.append("average:%sms worst:%sms best:%sms" % (
+        average / _NS_PER_MS, 10 * average / _NS_PER_MS,
+        average / 4 / _NS_PER_MS))
+    lines.append(" ".join(
+        "%s%%: %s" % (percentile, factor * average / _NS_PER_MS)
+        for percentile, factor in ((50, 0.7), (90, 2.3), (95, 3.0),
+                                   (99, 4.6))))
+    return "\n".join(lines) + "\n"
+
+
+def SyntheticFmqOutput(command, rng, sizes=(64, 128, 256, 512),
+                       read_ns=80, write_ns=60, ns_per_byte=0.05):
+    """Generates the output of mq_benchmark_client.
+
+    Only the --message_size of the command is printed if it has one.
+
+    Args:
+        command: string, the replayed command.
+        rng: random.Random used for the noise.
+        sizes: list of integers, the message sizes in bytes.
+        read_ns: number, the read latency of an empty message.
+        write_ns: number, the write latency of an empty message.
+        ns_per_byte: number, the extra latency per byte.
+
+    Returns:
+        string, the output.
+    """
+    match = _MESSAGE_SIZE_PATTERN.search(command)
+    if match:
+        sizes = [int(match.group(1))]
+    lines = []
+    for operation, base in (("read", read_ns), ("write", write_ns)):
+        for size in sizes:
+            lines.append("Average time to %s %sbytes: %d ns" % (
+                operation, size, _Jitter(rng, base + ns_per_byte * size)))
+    return "\n".join(lines) + "\n"
+
+
+def SyntheticBinderTrace(command, rng, client_comm="libbinder_bench",
+                         round_trips=20, sizes=None, header_bytes=48):
+    """Generates the atrace output of binder round trips of every size.
+
+    Args:
+        command: string, the replayed command.
+        rng: random.Random used for the noise.
+        client_comm: string, the thread name of the client.
+        round_trips: integer, the number of round trips per message size.
+        sizes: list of message size labels, e.g. ['4', '2k'].
+        header_bytes: integer, the parcel bytes added to each message.
+
+    Returns:
+        string, the output with the ftrace text after the TRACE: line.
+    """
+    lines = ["capturing trace... done", "TRACE:", "# tracer: nop"]
+    client, server = 4000, 4001
+    timestamp = 1000000000
+    transaction = 1
+    # (pid, event, arguments, nanoseconds to the next event)
+    for label in sizes or _MESSAGE_SIZES:
+        size = _SizeInBytes(label) + header_bytes
+        for _ in range(round_trips):
+            copy_ns = int(_Jitter(rng, 2000 + size / 16.0, 0.2))
+            events = [
+                (client, "binder_transaction",
+                 "transaction=%s dest_node=1 dest_proc=%s dest_thread=0 "
+                 "reply=0 flags=0x10 code=0x1" % (transaction, server),
+                 1000),
+                (client, "binder_transaction_alloc_buf",
+                 "transaction=%s data_size=%s offsets_size=0" %
+                 (transaction, size), copy_ns),
+                (client, "sched_wakeup",
+                 "comm=server pid=%s prio=120 target_cpu=001" % server,
+                 int(_Jitter(rng, 3000, 0.5))),
+                (server, "sched_switch",
+                 "prev_comm=swapper prev_pid=0 prev_prio=120 prev_state=R "
+                 "==> next_comm=server next_pid=%s next_prio=120" % server,
+                 int(_Jitter(rng, 1500, 0.2))),
+                (server, "binder_transaction_received",
+                 "transaction=%s" % transaction,
+                 int(_Jitter(rng, 4000, 0.3))),
+                (server, "binder_transaction",
+                 "transaction=%s dest_node=0 dest_proc=%s dest_thread=%s "
+                 "reply=1 flags=0x0 code=0x0" % (transaction + 1, client,
+                                                 client), 1000),
+                (server, "sched_wakeup",
+                 "comm=client pid=%s prio=120 target_cpu=000" % client,
+                 int(_Jitter(rng, 3000, 0.5))),
+                (client, "sched_switch",
+                 "prev_comm=swapper prev_pid=0 prev_prio=120 prev_state=R "
+                 "==> next_comm=client next_pid=%s next_prio=120" % client,
+                 int(_Jitter(rng, 1500, 0.2))),
+                (client, "binder_transaction_received",
+                 "transaction=%s" % (transaction + 1), 5000),
+            ]
+            for pid, event, arguments, delay in events:
+                lines.append("%s-%s [000] ...1 %d.%06d: %s: %s" % (
+                    "server" if pid == server else client_comm, pid,
+                    timestamp // 1000000000, timestamp % 1000000000 // 1000,
+                    event, arguments))
+                timestamp += delay
+            transaction += 2
+    return "\n".join(lines) + "\n"
+
+
+_GENERATORS = {
+    "google_benchmark": SyntheticGoogleBenchmarkOutput,
+    "google_benchmark_console": SyntheticGoogleBenchmarkConsoleOutput,
+    "throughput": SyntheticThroughputOutput,
+    "fmq": SyntheticFmqOutput,
+    "binder_trace": SyntheticBinderTrace,
+}
+
+
+class ReplayFixture(object):
+    """The recorded or synthetic outputs served to a ReplayDevice.
+
+    Attributes:
+        serial: string, the serial number of the replayed device.
+        state: dict, the flags set by the rules so far.
+        _rules: list of (compiled pattern, rule dict).
+        _directory: string, the directory of the fixture file.
+        _rng: random.Random used by the synthetic generators.
+    """
+
+    def __init__(self, path):
+        try:
+            with open(path) as fixture_file:
+                fixture = json.load(fixture_file)
+            self._rules = [(re.compile(rule["pattern"]), rule)
+                           for rule in fixture["rules"]]
+        except (IOError, ValueError, KeyError, TypeError, re.error) as e:
+            raise ReplayError("Invalid replay fixture %s: %s" % (path, e))
+        for _, rule in self._rules:
+            if rule.get("synthetic", "") and (
+                    rule["synthetic"] not in _GENERATORS):
+                raise ReplayError("Unknown synthetic output %s in %s" %
+                                  (rule["synthetic"], path))
+        self.serial = fixture.get("serial", "replay")
+        self.state = {}
+        self._directory = os.path.dirname(os.path.abspath(path))
+        self._rng = random.Random(fixture.get("seed", 0))
+
+    def _Matches(self, pattern, rule, command):
+        if not pattern.search(command):
+            return False
+        return all(self.state.get(key) == value
+                   for key, value in rule.get("when", {}).items())
+
+    def Execute(self, command):
+        """Replays a shell command.
+
+        Args:
+            command: string, the command line.
+
+        Returns:
+            a tuple of stdout, stderr and exit code.
+        """
+        for pattern, rule in self._rules:
+            if not self._Matches(pattern, rule, command):
+                continue
+            if "synthetic" in rule:
+                stdout = _GENERATORS[rule["synthetic"]](
+                    command, self._rng, **rule.get("args", {}))
+            elif "stdout_file" in rule:
+                with open(os.path.join(self._directory,
+                                       rule["stdout_file"])) as stdout_file:
+                    stdout = stdout_file.read()
+            else:
+                stdout = rule.get("stdout", "")
+            self.state.update(rule.get("set", {}))
+            return stdout, rule.get("stderr", ""), rule.get("exit_code", 0)
+        logging.debug("No replay rule for %s", command)
+        return "", "", 0
+
+
+class ReplayTerminal(object):
+    """A stand-in for a shell terminal of the device, e.g. dut.shell.one.
+
+    Attributes:
+        _fixture: ReplayFixture which serves the commands.
+    """
+
+    def __init__(self, fixture):
+        self._fixture = fixture
+
+    def Execute(self, commands):
+        """Replays one command or a list of commands.
+
+        Returns:
+            a dict of the stdout, stderr and exit code lists, keyed like
+            the results of a real terminal.
+        """
+        if not isinstance(commands, list):
+            commands = [commands]
+        results = {const.STDOUT: [], const.STDERR: [], const.EXIT_CODE: []}
+        for command in commands:
+            stdout, stderr, exit_code = self._fixture.Execute(command)
+            results[const.STDOUT].append(stdout)
+            results[const.STDERR].append(stderr)
+            results[const.EXIT_CODE].append(exit_code)
+        return results
+
+
+class ReplayShell(object):
+    """A stand-in for dut.shell whose terminals replay a fixture.
+
+    Attributes:
+        _fixture: ReplayFixture which serves the commands.
+    """
+
+    def __init__(self, fixture):
+        self._fixture = fixture
+
+    def InvokeTerminal(self, name):
+        """Creates the terminal dut.shell.<name>."""
+        setattr(self, name, ReplayTerminal(self._fixture))
+
+
+class ReplayAdb(object):
+    """A stand-in for dut.adb which replays a fixture.
+
+    Attributes:
+        _fixture: ReplayFixture which serves the commands.
+    """
+
+    def __init__(self, fixture):
+        self._fixture = fixture
+
+    def shell(self, command):
+        """Replays an adb shell command.
+
+        Returns:
+            string, the stdout.
+
+        Raises:
+            AdbError if the replayed exit code is not 0.
+        """
+        stdout, stderr, exit_code = self._fixture.Execute(command)
+        if exit_code:
+            raise adb.AdbError(command, stdout, stderr, exit_code)
+        return stdout
+
+    def pull(self, args):
+        """Replays an adb pull by writing the stdout of 'pull <remote>'.
+
+        Args:
+            args: string, the remote and the local path.
+        """
+        remote, local = args.split()
+        with open(local, "w") as local_file:
+            local_file.write(self.shell("pull %s" % remote))
+
+
+class ReplayDevice(object):
+    """A stand-in for an AndroidDevice which replays a fixture.
+
+    Attributes:
+        serial: string, the serial number from the fixture.
+        fixture: ReplayFixture which serves the commands.
+        shell: ReplayShell.
+        adb: ReplayAdb.
+    """
+
+    def __init__(self, fixture):
+        self.serial = fixture.serial
+        self.fixture = fixture
+        self.shell = ReplayShell(fixture)
+        self.adb = ReplayAdb(fixture)
+
+    def reboot(self, restart_services=True):
+        pass
+
+    def stop(self):
+        pass
+
+    def start(self):
+        pass
+
+    def waitForBootCompletion(self, timeout=900):
+        pass
+
+
+class ReplayCpuFrequencyScalingController(object):
+    """A CpuFrequencyScalingController stand-in which never throttles."""
+
+    def __init__(self, dut):
+        self._dut = dut
+
+    def DisableCpuScaling(self):
+        pass
+
+    def EnableCpuScaling(self):
+        pass
+
+    def IsUnderThermalThrottling(self):
+        return False
+
+    def SkipIfThermalThrottling(self, retry_delay_secs=0):
+        pass
+
+
+class ReplayBatchExecutor(object):
+    """A BatchExecutor stand-in which replays each step on its own.
+
+    Attributes:
+        _shell: ReplayTerminal which serves the commands.
+    """
+
+    def __init__(self, shell):
+        self._shell = shell
+
+    def Run(self, steps, setup=()):
+        """Replays the setup commands and the steps in order.
+
+        Returns:
+            a list of batch_executor.StepResult in the order of the steps.
+        """
+        for command in setup:
+            self._shell.Execute(command)
+        step_results = []
+        for step in steps:
+            results = self._shell.Execute(step.command)
+            step_results.append(batch_executor.StepResult(
+                results[const.STDOUT][0], results[const.STDERR][0],
+                results[const.EXIT_CODE][0]))
+        return step_results
+
+
+class ReplayResultTransport(result_transport.FileResultTransport):
+    """A FileResultTransport whose files hold the replayed stdout.
+
+    Attributes:
+        _outputs: dict which maps a remote path to the replayed stdout
+                  which was not fetched yet.
+    """
+
+    def __init__(self, dut, **kwargs):
+        super(ReplayResultTransport, self).__init__(dut, **kwargs)
+        self._outputs = {}
+
+    def _Execute(self, command, remote_path):
+        """Replays the command itself and keeps its whole stdout."""
+        results = self._dut.shell.one.Execute(command)
+        stdout = results[const.STDOUT][0]
+        self._outputs[remote_path] = stdout
+        summary = "\n".join(stdout.splitlines()[-self._summary_lines:])
+        return summary, results[const.EXIT_CODE][0]
+
+    def _Fetch(self, remote_path, local_path):
+        """Writes the kept stdout to the local file."""
+        with open(local_path, "wb") as local_file:
+            local_file.write(self._outputs.pop(remote_path).encode("utf-8"))
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Background binder traffic for measuring latency under load.
+
+The throughput binary runs with a fixed number of workers in a shell loop
+on the device, restarted whenever it finishes, while a latency benchmark
+measures its round trips. LoadCurve collects the latencies of every
+message size at every load level.
+
+The latency binaries report one mean per Google Benchmark repetition, not
+one latency per call, so the percentiles of a LoadCurve describe the
+spread of the repetition means. They are not the tail latency of single
+round trips.
+"""
+
+import logging
+
+from vts.runners.host import const
+from vts.testcases.performance.utils import latency_histogram
+from vts.testcases.performance.utils import repetition
+
+# the percentiles of the repetition means reported per load level.
+PERCENTILES = [50, 90, 99]
+
+
+class BackgroundLoad(object):
+    """Runs a command over and over in the background of a device.
+
+    Attributes:
+        _shell: the shell terminal of the device, e.g. dut.shell.one.
+        _command: string, the command line of the load.
+        _process_name: string, the name of the processes the command
+                       starts, which are killed by Stop.
+        _loop_pid: string, the pid of the shell loop while it runs.
+    """
+
+    def __init__(self, shell, command, process_name):
+        self._shell = shell
+        self._command = command
+        self._process_name = process_name
+        self._loop_pid = None
+
+    def Start(self):
+        """Starts the loop and returns at once."""
+        results = self._shell.Execute(
+            "(while true; do %s; done) > /dev/null 2>&1 & echo $!" %
+            self._command)
+        tokens = results[const.STDOUT][0].split()
+        self._loop_pid = tokens[-1] if tokens else None
+        logging.info("Started the background load %s (pid %s).",
+                     self._process_name, self._loop_pid)
+
+    def Stop(self):
+        """Stops the loop, then the run it started last."""
+        kill = "kill %s 2>/dev/null; " % self._loop_pid if (
+            self._loop_pid) else ""
+        self._loop_pid = None
+        self._shell.Execute("%skillall %s 2>/dev/null; true" % (
+            kill, self._process_name))
+
+
+class LoadCurve(object):
+    """The latency samples of every label at every background load.
+
+    Attributes:
+        loads: list of integers, the load levels, e.g. worker counts where
+               0 is an idle device.
+        labels: list of strings, the labels in the order they were added.
+        _samples: dict which maps (load, label) to the list of latencies.
+    """
+
+    def __init__(self, loads):
+        self.loads = loads
+        self.labels = []
+        self._samples = {}
+
+    def Add(self, load, samples):
+        """Adds the latencies of one benchmark run.
+
+        Args:
+            load: integer, the load level of the run.
+            samples: list of (label, latency) tuples. A label may appear
+                     several times, e.g. with Google Benchmark repetitions.
+        """
+        for label, latency in samples:
+            if label not in self.labels:
+                self.labels.append(label)
+            self._samples.setdefault((load, label), []).append(latency)
+
+    def GetMean(self, load, label):
+        """Returns the mean latency, or None if unmeasured."""
+        samples = self._samples.get((load, label))
+        if not samples:
+            return None
+        return repetition.LabelStats(samples).mean
+
+    def GetPercentile(self, load, label, percentile):
+        """Returns a percentile of the samples, or None if unmeasured.
+
+        With Google Benchmark repetitions the samples are repetition means,
+        so this is not a percentile of single calls.
+        """
+        histogram = latency_histogram.LatencyHistogram()
+        for latency in self._samples.get((load, label), []):
+            histogram.Record(latency)
+        return histogram.GetPercentile(percentile)
+
+    def GetSlowdown(self, load, label):
+        """Returns the mean latency in percent of the lowest load's.
+
+        Returns:
+            float, or None if either mean is unmeasured.
+        """
+        mean = self.GetMean(load, label)
+        base = self.GetMean(min(self.loads), label)
+        if mean is None or not base:
+            return None
+        return 100.0 * mean / base
+
+    def Format(self):
+        """Formats the mean and the 99th percentile of the samples.
+
+        Returns:
+            string, with a column per load level and a row per label; '-'
+            marks a missing value.
+        """
+        width = 26
+        lines = ["%10s" % "load" + "".join(
+            str(load).rjust(width) for load in self.loads)]
+        for label in self.labels:
+            cells = []
+            for load in self.loads:
+                mean = self.GetMean(load, label)
+                cells.append(("-" if mean is None else "%d (p99 of reps %d)" % (
+                    mean, self.GetPercentile(load, label, 99))).rjust(width))
+            lines.append("%10s" % label + "".join(cells))
+        return "\n".join(lines)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import collections
+import logging
+import time
+
+from vts.runners.host import const
+
+# the device directory of a batch, removed after the results are fetched.
+DEFAULT_WORK_DIR = "/data/local/tmp/vts_batch"
+
+_SCRIPT_NAME = "batch.sh"
+_PROGRESS_NAME = "progress"
+_RESULTS_NAME = "results"
+_HEREDOC_DELIMITER = "VTS_BATCH_SCRIPT_EOF"
+_DONE_LINE = "done"
+_BEGIN_MARKER = "@@VTS_BATCH_BEGIN"
+_STDERR_MARKER = "@@VTS_BATCH_STDERR"
+_END_MARKER = "@@VTS_BATCH_END"
+
+BatchStep = collections.namedtuple("BatchStep", ["name", "command"])
+StepResult = collections.namedtuple(
+    "StepResult", ["stdout", "stderr", "exit_code"])
+
+
+class BatchError(Exception):
+    """Raised when a batch cannot be started or does not finish."""
+
+
+def ParseResults(text, step_count):
+    """Parses the results file of a batch.
+
+    Args:
+        text: string, the content of the results file.
+        step_count: integer, the number of steps of the batch.
+
+    Returns:
+        a list of StepResult in the order of the steps.
+
+    Raises:
+        BatchError if a step has no result.
+    """
+    results = {}
+    index = None
+    section = None
+    stdout = []
+    stderr = []
+    for line in text.splitlines(True):
+        if line.startswith(_BEGIN_MARKER + " "):
+            index = int(line.split()[1])
+            stdout = []
+            stderr = []
+            section = stdout
+        elif index is not None and line.startswith(_STDERR_MARKER + " "):
+            section = stderr
+        elif index is not None and line.startswith(_END_MARKER + " "):
+            exit_code = int(line.split()[2])
+            # The script adds a newline after each output.
+            results[index] = StepResult("".join(stdout)[:-1],
+                                        "".join(stderr)[:-1], exit_code)
+            index = None
+        elif index is not None:
+            section.append(line)
+    missing = [i for i in range(step_count) if i not in results]
+    if missing:
+        raise BatchError("No result for the steps %s." % missing)
+    return [results[i] for i in range(step_count)]
+
+
+class BatchExecutor(object):
+    """Runs a list of shell commands on a device in one script.
+
+    The script runs in the background on the device and writes each
+    step's output to a results file there. The host polls a small progress
+    file to log each finished step, then fetches all the results at once.
+    This saves a round trip and a shell start per step.
+
+    Attributes:
+        _shell: the shell terminal of the device, e.g. dut.shell.one.
+        _work_dir: string, the device directory of the batch files.
+        _poll_interval_secs: float, the pause between progress checks.
+        _timeout_secs: float, the longest time a batch may run.
+    """
+
+    def __init__(self, shell, work_dir=DEFAULT_WORK_DIR, poll_interval_secs=2,
+                 timeout_secs=3600):
+        self._shell = shell
+        self._work_dir = work_dir
+        self._poll_interval_secs = poll_interval_secs
+        self._timeout_secs = timeout_secs
+
+    def _Execute(self, command):
+        """Runs a shell command and returns (stdout, exit code)."""
+        results = self._shell.Execute(command)
+        return results[const.STDOUT][0], results[const.EXIT_CODE][0]
+
+    def _BuildScript(self, steps, setup):
+        """Returns the script text of a batch."""
+        lines = ["cd %s || exit 1" % self._work_dir]
+        lines.extend(setup)
+        for index, step in enumerate(steps):
+            lines.extend([
+                "(",
+                step.command,
+                ") > %s.out 2> %s.err" % (index, index),
+                "code=$?",
+                "{ echo '%s %s'; cat %s.out; echo; echo '%s %s'; "
+                "cat %s.err; echo; echo \"%s %s $code\"; } >> %s" % (
+                    _BEGIN_MARKER, index, index, _STDERR_MARKER, index,
+                    index, _END_MARKER, index, _RESULTS_NAME),
+                "rm -f %s.out %s.err" % (index, index),
+                "echo \"%s $code\" >> %s" % (index, _PROGRESS_NAME),
+            ])
+        lines.append("echo %s >> %s" % (_DONE_LINE, _PROGRESS_NAME))
+        return "\n".join(lines)
+
+    def Run(self, steps, setup=()):
+        """Runs the steps one after another and returns their results.
+
+        Args:
+            steps: list of BatchStep.
+            setup: list of strings, shell commands which run once before the
+                   steps, e.g. chmod of the binaries.
+
+        Returns:
+            a list of StepResult in the order of the steps.
+
+        Raises:
+            BatchError if the batch cannot be started, times out, or its
+            results are incomplete.
+        """
+        if not steps:
+            return []
+        script = self._BuildScript(steps, setup)
+        _, exit_code = self._Execute(
+            "rm -rf %s && mkdir -p %s && cat > %s/%s << '%s'\n%s\n%s" % (
+                self._work_dir, self._work_dir, self._work_dir, _SCRIPT_NAME,
+                _HEREDOC_DELIMITER, script, _HEREDOC_DELIMITER))
+        if exit_code:
+            raise BatchError("Failed to write the batch script.")
+        _, exit_code = self._Execute(
+            "nohup sh %s/%s > /dev/null 2>&1 &" % (self._work_dir,
+                                                   _SCRIPT_NAME))
+        if exit_code:
+            raise BatchError("Failed to start the batch script.")
+        logging.info("Started a batch of %s steps.", len(steps))
+
+        deadline = time.time() + self._timeout_secs
+        reported = 0
+        while True:
+            progress, _ = self._Execute("cat %s/%s 2>/dev/null" % (
+                self._work_dir, _PROGRESS_NAME))
+            lines = progress.splitlines()
+            for line in lines[reported:]:
+                tokens = line.split()
+                if len(tokens) == 2:
+                    logging.info("Batch step %s/%s (%s) exited with %s.",
+                                 int(tokens[0]) + 1, len(steps),
+                                 steps[int(tokens[0])].name, tokens[1])
+            reported = max(reported, len(lines))
+            if _DONE_LINE in lines:
+                break
+            if time.time() >= deadline:
+                raise BatchError("The batch did not finish within %s "
+                                 "seconds." % self._timeout_secs)
+            time.sleep(self._poll_interval_secs)
+
+        text, exit_code = self._Execute("cat %s/%s" % (self._work_dir,
+                                                       _RESULTS_NAME))
+        self._Execute("rm -rf %s" % self._work_dir)
+        if exit_code:
+            raise BatchError("Failed to fetch the batch results.")
+        return ParseResults(text, len(steps))
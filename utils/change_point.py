@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import argparse
+import math
+
+from vts.testcases.performance.utils import result_store
+
+
+class ChangePoint(object):
+    """A step change in a series.
+
+    Attributes:
+        index: integer, the index of the first point after the step.
+        before: float, the mean of the segment before the step.
+        after: float, the mean of the segment after the step.
+        score: float, the t statistic of the step.
+    """
+
+    def __init__(self, index, before, after, score):
+        self.index = index
+        self.before = before
+        self.after = after
+        self.score = score
+
+    def GetRelativeChange(self):
+        """Returns (after - before) / before."""
+        if not self.before:
+            return float("inf") if self.after else 0.0
+        return (self.after - self.before) / abs(self.before)
+
+
+def _Mean(values):
+    return float(sum(values)) / len(values)
+
+
+def _Variance(values, mean):
+    if len(values) < 2:
+        return 0.0
+    return sum((value - mean) ** 2 for value in values) / (len(values) - 1)
+
+
+def _BestSplit(values, min_segment):
+    """Finds the split which maximizes Welch's t statistic.
+
+    Returns:
+        a ChangePoint relative to values, or None if values is too short.
+    """
+    best = None
+    for index in range(min_segment, len(values) - min_segment + 1):
+        before = values[:index]
+        after = values[index:]
+        before_mean = _Mean(before)
+        after_mean = _Mean(after)
+        error = math.sqrt(_Variance(before, before_mean) / len(before) +
+                          _Variance(after, after_mean) / len(after))
+        difference = abs(after_mean - before_mean)
+        if error:
+            score = difference / error
+        else:
+            score = float("inf") if difference else 0.0
+        if best is None or score > best.score:
+            best = ChangePoint(index, before_mean, after_mean, score)
+    return best
+
+
+def _Segment(values, min_segment, min_score, min_relative_change, offset):
+    """Recursively splits values, see DetectStepChanges."""
+    if len(values) < 2 * min_segment:
+        return []
+    split = _BestSplit(values, min_segment)
+    if (split is None or split.score < min_score or
+            abs(split.GetRelativeChange()) < min_relative_change):
+        return []
+    left = _Segment(values[:split.index], min_segment, min_score,
+                    min_relative_change, offset)
+    right = _Segment(values[split.index:], min_segment, min_score,
+                     min_relative_change, offset + split.index)
+    split.index += offset
+    return left + [split] + right
+
+
+def DetectStepChanges(values, min_segment=3, min_score=4.0,
+                      min_relative_change=0.03):
+    """Finds step changes in a series by binary segmentation.
+
+    The series is split where the means on both sides differ the most
+    relative to their noise. A split is kept if it is both statistically
+    strong and large enough to matter, and then both halves are searched.
+
+    Args:
+        values: list of numbers, e.g. one latency per build.
+        min_segment: integer, the minimum number of points on each side.
+        min_score: float, the minimum t statistic of a step.
+        min_relative_change: float, the minimum relative step size.
+
+    Returns:
+        a list of ChangePoint ordered by index. The before and after means
+        are those of the segments adjacent to each step.
+    """
+    changes = _Segment(values, min_segment, min_score, min_relative_change,
+                       0)
+    bounds = [0] + [change.index for change in changes] + [len(values)]
+    for position, change in enumerate(changes):
+        change.before = _Mean(values[bounds[position]:change.index])
+        change.after = _Mean(values[change.index:bounds[position + 2]])
+    return changes
+
+
+# Vector name fragments which tell how a series should move. Environment
+# readings have no better direction and are never reported.
+_UNDIRECTED = ("temperature_mc", "cpu_freq_khz", "knee_saturated")
+_LOWER_IS_BETTER = ("_spread",)
+_HIGHER_IS_BETTER = ("per_second", "knee_threads", "steady_state")
+
+
+def GetDirection(name):
+    """Returns which way a series named name improves.
+
+    Throughput, e.g. iterations or bytes per second, improves when it goes
+    up. Latency, CPU cost, warm-up, spread and noise improve when they go
+    down.
+
+    Args:
+        name: string, the profiling data name.
+
+    Returns:
+        1 if higher values are better, -1 if lower values are better, or 0
+        if the series has no better direction.
+    """
+    if any(fragment in name for fragment in _UNDIRECTED):
+        return 0
+    if any(fragment in name for fragment in _LOWER_IS_BETTER):
+        return -1
+    if any(fragment in name for fragment in _HIGHER_IS_BETTER):
+        return 1
+    return -1
+
+
+def _FindChanges(store, sign, min_segment, min_score, min_relative_change):
+    """Scans every series for steps which move it in one direction.
+
+    Args:
+        store: result_store.ResultStore.
+        sign: integer, -1 for the steps which make a series worse or 1 for
+              those which make it better.
+        min_segment: see DetectStepChanges.
+        min_score: see DetectStepChanges.
+        min_relative_change: see DetectStepChanges.
+
+    Returns:
+        a list of (series key, build fingerprint, ChangePoint) tuples.
+    """
+    found = []
+    for key in store.GetSeriesKeys():
+        direction = GetDirection(key[0])
+        if not direction:
+            continue
+        series = store.GetSeries(*key)
+        values = [value for _, value in series]
+        for change in DetectStepChanges(values, min_segment, min_score,
+                                        min_relative_change):
+            if (change.after - change.before) * direction * sign > 0:
+                found.append((key, series[change.index][0], change))
+    return found
+
+
+def FindRegressions(store, min_segment=3, min_score=4.0,
+                    min_relative_change=0.03):
+    """Scans every series of a result store for steps to the worse.
+
+    A step is a regression if it moves the series against the direction
+    given by GetDirection, e.g. a latency step up or a throughput step down.
+
+    Args:
+        store: result_store.ResultStore.
+        min_segment: see DetectStepChanges.
+        min_score: see DetectStepChanges.
+        min_relative_change: see DetectStepChanges.
+
+    Returns:
+        a list of (series key, build fingerprint, ChangePoint) tuples where
+        the series key is (name, label, product, bits, hal_mode) and the
+        build is the first one after the step.
+    """
+    return _FindChanges(store, -1, min_segment, min_score,
+                        min_relative_change)
+
+
+def FindImprovements(store, min_segment=3, min_score=4.0,
+                     min_relative_change=0.03):
+    """Scans every series of a result store for steps to the better.
+
+    Args:
+        store: result_store.ResultStore.
+        min_segment: see DetectStepChanges.
+        min_score: see DetectStepChanges.
+        min_relative_change: see DetectStepChanges.
+
+    Returns:
+        a list of tuples as returned by FindRegressions.
+    """
+    return _FindChanges(store, 1, min_segment, min_score,
+                        min_relative_change)
+
+
+def _PrintChanges(title, changes):
+    """Prints one section of the report."""
+    print("%s:" % title)
+    for key, build, change in changes:
+        print("  %s %s: %+.1f%% (%.1f -> %.1f, t=%.1f) since %s" % (
+            "/".join(str(field) for field in key[:2]),
+            "/".join(str(field) for field in key[2:]),
+            change.GetRelativeChange() * 100, change.before, change.after,
+            change.score, build))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Reports step changes in a local performance result "
+                    "store.")
+    parser.add_argument("store", help="path to the result store database")
+    parser.add_argument("--min_segment", type=int, default=3)
+    parser.add_argument("--min_score", type=float, default=4.0)
+    parser.add_argument("--min_relative_change", type=float, default=0.03)
+    args = parser.parse_args()
+
+    store = result_store.ResultStore(args.store)
+    thresholds = (args.min_segment, args.min_score, args.min_relative_change)
+    _PrintChanges("Regressions", FindRegressions(store, *thresholds))
+    _PrintChanges("Improvements", FindImprovements(store, *thresholds))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""CPU cost per transaction of the IPC benchmarks.
+
+A shell loop on the device samples, during a benchmark run:
+
+    /proc/uptime and the 'cpu' and 'ctxt' lines of /proc/stat,
+    /proc/<pid>/stat of every benchmark process (client and server),
+    the allocated buffers of those processes in binder debugfs,
+    the BC_TRANSACTION count of the global binder debugfs stats.
+
+The first and last samples are taken synchronously before and after the
+run, so the deltas of the system-wide counters cover the whole run. The
+process times are the last ones seen before a process exited, so they are
+a lower bound with an error of at most one sampling interval.
+
+The sampling loop forks a few tools per sample, and their CPU time adds
+to the system-wide busy time. Right before the loop is stopped, its own
+and its reaped children's times are read from /proc/<loop pid>/stat and
+subtracted, so only the last partial sample of the loop is counted.
+"""
+
+import logging
+
+from vts.runners.host import const
+
+DEFAULT_REMOTE_PATH = "/data/local/tmp/vts_cpu_cost"
+
+_BINDER_DEBUGFS = "/sys/kernel/debug/binder"
+_SAMPLE_MARKER = "@@sample"
+_LOOP_MARKER = "@@loop"
+_DEFAULT_CLOCK_TICKS = 100
+
+# the keys of CpuCost.ToDict and their y-axis labels.
+VECTORS = [
+    ("cpu_ns_per_transaction",
+     "CPU Time Per Transaction (nanoseconds)"),
+    ("process_cpu_ns_per_transaction",
+     "Client and Server CPU Time Per Transaction (nanoseconds)"),
+    ("context_switches_per_1k_transactions",
+     "Context Switches Per 1000 Transactions"),
+    ("binder_buffer_peak_bytes", "Peak Binder Buffer Usage (bytes)"),
+]
+
+# the shell function which appends one sample to the file in $f.
+_SAMPLE_FUNCTION = (
+    "s() { { echo %(marker)s; cat /proc/uptime; head -n 1 /proc/stat; "
+    "grep '^ctxt' /proc/stat; "
+    "for p in $(pidof %(names)s); do "
+    "echo \"pid $p $(cat /proc/$p/stat 2>/dev/null)\"; "
+    "sed -n \"s/^ *buffer [0-9]*: [^ ]* size \\([0-9]*\\):.*/buf $p \\1/p\" "
+    "%(debugfs)s/proc/$p 2>/dev/null; done; "
+    "grep '^BC_TRANSACTION:' %(debugfs)s/stats 2>/dev/null; } >> $f; }")
+
+
+class CpuCost(object):
+    """The CPU counters of one benchmark run.
+
+    Attributes:
+        elapsed_secs: float, the time between the first and last samples.
+        cpu_us: integer, the busy time of all CPUs in microseconds, without
+                the sampling loop.
+        sampler_cpu_us: integer, the CPU time of the sampling loop and the
+                        tools it ran, in microseconds.
+        process_cpu_us: integer, the user and system time of the benchmark
+                        processes in microseconds.
+        context_switches: integer, the context switches of the system.
+        transactions: integer, the binder transactions counted by debugfs,
+                      or None if debugfs is not readable.
+        buffer_peak_bytes: integer, the most binder buffer bytes the
+                           benchmark processes held at one sample.
+    """
+
+    def __init__(self, elapsed_secs=0.0, cpu_us=0, process_cpu_us=0,
+                 context_switches=0, transactions=None, buffer_peak_bytes=0,
+                 sampler_cpu_us=0):
+        self.elapsed_secs = elapsed_secs
+        self.cpu_us = cpu_us
+        self.sampler_cpu_us = sampler_cpu_us
+        self.process_cpu_us = process_cpu_us
+        self.context_switches = context_switches
+        self.transactions = transactions
+        self.buffer_peak_bytes = buffer_peak_bytes
+
+    def Merge(self, other):
+        """Adds the counters of another run, e.g. of a repetition."""
+        self.elapsed_secs += other.elapsed_secs
+        self.cpu_us += other.cpu_us
+        self.sampler_cpu_us += other.sampler_cpu_us
+        self.process_cpu_us += other.process_cpu_us
+        self.context_switches += other.context_switches
+        if self.transactions is None or other.transactions is None:
+            self.transactions = None
+        else:
+            self.transactions += other.transactions
+        self.buffer_peak_bytes = max(self.buffer_peak_bytes,
+                                     other.buffer_peak_bytes)
+
+    def ToDict(self, fallback_transactions=None):
+        """Returns the cost per transaction.
+
+        Args:
+            fallback_transactions: number, the transactions to divide by if
+                                   debugfs did not count them, e.g. from
+                                   the benchmark output.
+
+        Returns:
+            a dict with the integer values 'cpu_ns_per_transaction',
+            'process_cpu_ns_per_transaction',
+            'context_switches_per_1k_transactions' and
+            'binder_buffer_peak_bytes'. The values per transaction are left
+            out if the number of transactions is unknown.
+        """
+        result = {"binder_buffer_peak_bytes": self.buffer_peak_bytes}
+        transactions = self.transactions
+        if not transactions:
+            transactions = fallback_transactions
+        if not transactions:
+            logging.warning("Unknown number of transactions; no CPU cost.")
+            return result
+        result.update({
+            "cpu_ns_per_transaction":
+                int(self.cpu_us * 1000.0 / transactions),
+            "process_cpu_ns_per_transaction":
+                int(self.process_cpu_us * 1000.0 / transactions),
+            "context_switches_per_1k_transactions":
+                int(self.context_switches * 1000.0 / transactions),
+        })
+        return result
+
+
+def _ParseProcessTicks(stat, with_children=False):
+    """Returns utime + stime of a /proc/<pid>/stat line, or None.
+
+    Args:
+        stat: string, the line.
+        with_children: bool, whether to add cutime + cstime, the times of
+                       the children the process waited for.
+    """
+    # The command name is in parentheses and may contain spaces.
+    fields = stat[stat.rfind(")") + 1:].split()
+    if len(fields) < 15 or not all(
+            field.isdigit() for field in fields[11:15]):
+        return None
+    ticks = int(fields[11]) + int(fields[12])
+    if with_children:
+        ticks += int(fields[13]) + int(fields[14])
+    return ticks
+
+
+def ParseSamples(text, clock_ticks=_DEFAULT_CLOCK_TICKS):
+    """Parses the sample file into a CpuCost.
+
+    Args:
+        text: string, the content of the sample file, and optionally an
+              '@@loop' line with the /proc/<pid>/stat of the sampling loop.
+        clock_ticks: integer, the clock ticks per second of /proc.
+
+    Returns:
+        CpuCost of the run between the first and the last sample, or None
+        if there are less than two samples.
+    """
+    samples = []
+    loop_ticks = 0
+    for line in text.splitlines():
+        tokens = line.split()
+        if not tokens:
+            continue
+        if tokens[0] == _LOOP_MARKER:
+            loop_ticks = _ParseProcessTicks(line, with_children=True) or 0
+        elif tokens[0] == _SAMPLE_MARKER:
+            sample = {"processes": {}, "buffers": 0}
+            samples.append(sample)
+        elif not samples:
+            continue
+        elif tokens[0] == "cpu":
+            ticks = [int(token) for token in tokens[1:] if token.isdigit()]
+            # idle and iowait are the 4th and 5th values.
+            sample["busy"] = sum(ticks) - sum(ticks[3:5])
+        elif tokens[0] == "ctxt" and len(tokens) == 2:
+            sample["ctxt"] = int(tokens[1])
+        elif tokens[0] == "pid" and len(tokens) > 2:
+            ticks = _ParseProcessTicks(line)
+            if ticks is not None:
+                sample["processes"][tokens[1]] = ticks
+        elif tokens[0] == "buf" and len(tokens) == 3:
+            sample["buffers"] += int(tokens[2])
+        elif tokens[0] == "BC_TRANSACTION:" and len(tokens) == 2:
+            sample["transactions"] = int(tokens[1])
+        elif ("uptime" not in sample and
+              tokens[0].replace(".", "", 1).isdigit()):
+            sample["uptime"] = float(tokens[0])
+    if len(samples) < 2:
+        return None
+
+    first, last = samples[0], samples[-1]
+    process_ticks = {}
+    for sample in samples:
+        process_ticks.update(sample["processes"])
+    for pid, ticks in first["processes"].items():
+        process_ticks[pid] -= ticks
+    transactions = None
+    if "transactions" in first and "transactions" in last:
+        transactions = last["transactions"] - first["transactions"]
+    us_per_tick = 1000000.0 / clock_ticks
+    busy_ticks = last.get("busy", 0) - first.get("busy", 0)
+    return CpuCost(
+        elapsed_secs=last.get("uptime", 0) - first.get("uptime", 0),
+        cpu_us=int(max(0, busy_ticks - loop_ticks) * us_per_tick),
+        sampler_cpu_us=int(loop_ticks * us_per_tick),
+        process_cpu_us=int(sum(process_ticks.values()) * us_per_tick),
+        context_switches=last.get("ctxt", 0) - first.get("ctxt", 0),
+        transactions=transactions,
+        buffer_peak_bytes=max(sample["buffers"] for sample in samples))
+
+
+class CpuCostSampler(object):
+    """Samples the CPU counters of a device during a benchmark run.
+
+    Attributes:
+        _shell: the shell terminal of the device, e.g. dut.shell.one.
+        _process_names: list of strings, the names of the benchmark
+                        processes, e.g. the base name of the binary.
+        _interval_secs: float, the pause between two background samples.
+        _remote_path: string, the device file of the samples.
+        _clock_ticks: integer, the clock ticks per second of /proc.
+        _loop_pid: string, the pid of the sampling loop while it runs.
+        cost: CpuCost returned by the last Stop, or None.
+    """
+
+    def __init__(self, shell, process_names, interval_secs=0.2,
+                 remote_path=DEFAULT_REMOTE_PATH):
+        self._shell = shell
+        self._process_names = process_names
+        self._interval_secs = interval_secs
+        self._remote_path = remote_path
+        self._clock_ticks = _DEFAULT_CLOCK_TICKS
+        self._loop_pid = None
+        self.cost = None
+
+    def _SampleFunction(self):
+        """Returns the shell definition of the sample function."""
+        return "f=%s; %s" % (self._remote_path, _SAMPLE_FUNCTION % {
+            "marker": _SAMPLE_MARKER,
+            "names": " ".join(self._process_names),
+            "debugfs": _BINDER_DEBUGFS})
+
+    def Start(self):
+        """Takes the first sample and starts sampling in the background."""
+        results = self._shell.Execute(
+            "%s; rm -f $f; s; getconf CLK_TCK 2>/dev/null; "
+            "(while true; do s; sleep %s; done) > /dev/null 2>&1 & "
+            "echo $!" % (self._SampleFunction(), self._interval_secs))
+        tokens = results[const.STDOUT][0].split()
+        if len(tokens) > 1 and tokens[0].isdigit():
+            self._clock_ticks = int(tokens[0])
+        self._loop_pid = tokens[-1] if tokens else None
+
+    def Stop(self):
+        """Stops sampling, takes the last sample and parses them.
+
+        Returns:
+            CpuCost of the run, or None if the samples are incomplete.
+        """
+        kill = ""
+        if self._loop_pid:
+            kill = ("echo \"%s $(cat /proc/%s/stat 2>/dev/null)\"; "
+                    "kill %s 2>/dev/null; " % (
+                        _LOOP_MARKER, self._loop_pid, self._loop_pid))
+        self._loop_pid = None
+        results = self._shell.Execute(
+            "%s%s; s; cat $f; rm -f $f" % (kill, self._SampleFunction()))
+        self.cost = ParseSamples(results[const.STDOUT][0], self._clock_ticks)
+        if self.cost is None:
+            logging.warning("Too few CPU samples of %s.",
+                            " ".join(self._process_names))
+        return self.cost
+
+
+def CreateSampler(test, dut, binary):
+    """Returns a CpuCostSampler if the cpu_cost_mode user param is set.
+
+    Args:
+        test: BaseTestClass instance, used to read the user params.
+        dut: the AndroidDevice, whose shell.one terminal must exist.
+        binary: string, the device path of the benchmark binary whose
+                processes are the client and the server.
+
+    Returns:
+        CpuCostSampler, or None if CPU cost sampling is disabled.
+    """
+    if not test.getUserParam("cpu_cost_mode", default_value=False):
+        return None
+    return CpuCostSampler(
+        dut.shell.one, [binary.rsplit("/", 1)[-1]],
+        float(test.getUserParam("cpu_cost_interval_secs",
+                                default_value=0.2)))
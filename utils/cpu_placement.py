@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Client and server CPU placements of the IPC benchmarks.
+
+On heterogeneous SoCs the latency depends on where the scheduler puts
+each side, so the placement matrix pins them explicitly:
+
+    same_core: client and server share one CPU.
+    sibling_cores: the server runs on the SMT sibling of the client CPU,
+                   or on the next CPU of its cluster without SMT.
+    same_cluster: the server runs on the last CPU of the client cluster.
+    cross_cluster: the server runs on the first CPU of another cluster.
+
+The client always runs on the first CPU of the fastest cluster.
+"""
+
+import collections
+import logging
+import re
+
+from vts.runners.host import const
+
+PLACEMENTS = ("same_core", "sibling_cores", "same_cluster", "cross_cluster")
+
+# prints 'cpu;thread siblings;cluster CPUs;max frequency' for each CPU.
+_TOPOLOGY_COMMAND = (
+    "cd /sys/devices/system/cpu && for c in cpu[0-9]*; do "
+    "echo \"${c#cpu};"
+    "$(cat $c/topology/thread_siblings_list 2>/dev/null);"
+    "$(cat $c/cpufreq/related_cpus 2>/dev/null || "
+    "cat $c/topology/core_siblings_list 2>/dev/null);"
+    "$(cat $c/cpufreq/cpuinfo_max_freq 2>/dev/null)\"; done")
+
+# an environment assignment before the binary, e.g. 'LD_LIBRARY_PATH=/x'.
+_ASSIGNMENT_PATTERN = re.compile(r"^\w+=\S*$")
+
+# polls of 10 ms to wait for the benchmark to fork its server.
+_FORK_POLLS = 200
+
+Placement = collections.namedtuple(
+    "Placement", ["name", "client_cpus", "server_cpus"])
+
+
+class CpuTopology(object):
+    """The CPUs of a device grouped into clusters.
+
+    Attributes:
+        clusters: list of sorted CPU lists, fastest cluster first.
+        thread_siblings: dict which maps a CPU to the sorted list of the
+                         CPUs which share its core, itself included.
+    """
+
+    def __init__(self, clusters, thread_siblings):
+        self.clusters = clusters
+        self.thread_siblings = thread_siblings
+
+
+def _ParseCpuList(text):
+    """Parses '0-3,6' or '0 1 2 3' into a sorted list of integers."""
+    cpus = set()
+    for token in re.split(r"[,\s]+", text.strip()):
+        if not token:
+            continue
+        if "-" in token:
+            first, last = token.split("-", 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(token))
+    return sorted(cpus)
+
+
+def ParseTopology(output):
+    """Parses the output of the topology command.
+
+    Args:
+        output: string, one 'cpu;siblings;cluster;max frequency' per line.
+
+    Returns:
+        CpuTopology. A CPU without cluster information, e.g. an offline
+        one, is left out.
+    """
+    cluster_freqs = {}
+    thread_siblings = {}
+    for line in output.splitlines():
+        fields = line.strip().split(";")
+        if len(fields) != 4 or not fields[0].isdigit():
+            continue
+        cpu = int(fields[0])
+        cluster = tuple(_ParseCpuList(fields[2]))
+        if cpu not in cluster:
+            continue
+        freq = int(fields[3]) if fields[3].strip().isdigit() else 0
+        cluster_freqs[cluster] = max(freq, cluster_freqs.get(cluster, 0))
+        thread_siblings[cpu] = _ParseCpuList(fields[1]) or [cpu]
+    clusters = sorted(cluster_freqs,
+                      key=lambda cluster: (-cluster_freqs[cluster], cluster))
+    return CpuTopology([list(cluster) for cluster in clusters],
+                       thread_siblings)
+
+
+def ReadTopology(shell):
+    """Reads the CPU topology of a device.
+
+    Args:
+        shell: the shell terminal of the device, e.g. dut.shell.one.
+
+    Returns:
+        CpuTopology.
+    """
+    results = shell.Execute(_TOPOLOGY_COMMAND)
+    return ParseTopology(results[const.STDOUT][0])
+
+
+def PlanPlacements(topology):
+    """Picks the client and server CPUs of each placement.
+
+    Args:
+        topology: CpuTopology of the device.
+
+    Returns:
+        a list of Placement in the order of PLACEMENTS. A placement which
+        the device cannot provide, e.g. cross_cluster on a single cluster,
+        is left out.
+    """
+    if not topology.clusters:
+        return []
+    cluster = topology.clusters[0]
+    client = cluster[0]
+    placements = [Placement("same_core", [client], [client])]
+    siblings = [cpu for cpu in topology.thread_siblings.get(client, [])
+                if cpu != client]
+    if not siblings:
+        siblings = cluster[1:2]
+    if siblings:
+        placements.append(
+            Placement("sibling_cores", [client], [siblings[0]]))
+    if len(cluster) > 1:
+        placements.append(
+            Placement("same_cluster", [client], [cluster[-1]]))
+    if len(topology.clusters) > 1:
+        placements.append(
+            Placement("cross_cluster", [client], [topology.clusters[1][0]]))
+    missing = set(PLACEMENTS) - set(p.name for p in placements)
+    if missing:
+        logging.info("Placements not available on this device: %s",
+                     ", ".join(sorted(missing)))
+    return placements
+
+
+def _Mask(cpus):
+    """Returns the hexadecimal taskset mask of a list of CPUs."""
+    return "%x" % sum(1 << cpu for cpu in cpus)
+
+
+def PinCommand(command, placement, split=True):
+    """Wraps a benchmark command line to run with a placement.
+
+    Args:
+        command: string, optional environment assignments followed by the
+                 binary and its arguments.
+        placement: Placement.
+        split: bool, whether the binary forks its server. If so, the
+               binary runs on the client CPUs from its start and the
+               processes it forks are moved to the server CPUs. Otherwise
+               every process may run on the client and the server CPUs,
+               e.g. for the throughput tests whose workers are both
+               clients and servers.
+
+    Returns:
+        string, the shell command line. Its exit code is the one of the
+        benchmark, or 1 if a split placement could not be applied.
+    """
+    tokens = command.split(" ")
+    index = 0
+    while index < len(tokens) and _ASSIGNMENT_PATTERN.match(tokens[index]):
+        index += 1
+    assignments = " ".join(tokens[:index])
+    binary = " ".join(tokens[index:])
+    if not split:
+        return "%s taskset %s %s" % (
+            assignments, _Mask(placement.client_cpus +
+                               placement.server_cpus), binary)
+    # The binary starts on the client CPUs, so the client never runs on the
+    # server CPUs. The server inherits the client CPUs when it is forked
+    # and is moved as soon as it shows up, so only its start-up runs on
+    # the client CPUs. Then the affinity of both is read back; if the
+    # server never showed up or either affinity is wrong, the run fails
+    # instead of reporting a result under the wrong placement.
+    server_mask = _Mask(placement.server_cpus)
+    client_mask = _Mask(placement.client_cpus)
+    return ("%s taskset %s %s & pid=$!; i=0; children=; "
+            "while [ -z \"$children\" -a $i -lt %s ]; do "
+            "sleep 0.01; children=$(pgrep -P $pid); i=$((i + 1)); done; "
+            "pinned=0; if [ -n \"$children\" ]; then pinned=1; "
+            "for child in $children; do "
+            "taskset -ap %s $child >/dev/null; done; "
+            "taskset -p $pid | grep -q 'mask: %s$' || pinned=0; "
+            "for child in $children; do taskset -p $child | "
+            "grep -q 'mask: %s$' || pinned=0; done; fi; "
+            "wait $pid; status=$?; if [ $pinned = 0 ]; then "
+            "echo 'placement %s not applied' >&2; status=1; fi; "
+            "(exit $status)" % (
+                assignments, client_mask, binary, _FORK_POLLS, server_mask,
+                client_mask, server_mask, placement.name))
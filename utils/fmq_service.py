@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import time
+
+from vts.runners.host import const
+
+# the HIDL interface the benchmark service registers once it can serve.
+_SERVICE_INTERFACE = "android.hardware.tests.msgq@1.0::IBenchmarkMsgQ"
+
+
+class ServiceError(Exception):
+    """Raised when the benchmark service cannot be started or stopped."""
+
+
+class FmqServiceManager(object):
+    """Manages the lifecycle of mq_benchmark_service on the device.
+
+    The service is started once, probed until its HIDL interface is
+    registered, and reused by any number of client runs until Stop.
+
+    Attributes:
+        bits: integer (32 or 64), the bitness of the service binary.
+        startup_time_ms: integer, the time from the launch until the service
+                         was ready, or None if it is not started.
+        _shell: the shell terminal of the device, e.g. dut.shell.one.
+        _timeout_secs: float, the time to wait for a start or a stop.
+        _poll_interval_secs: float, the time between two probes.
+    """
+
+    def __init__(self, shell, bits, timeout_secs=10, poll_interval_secs=0.1):
+        self.bits = bits
+        self.startup_time_ms = None
+        self._shell = shell
+        self._timeout_secs = timeout_secs
+        self._poll_interval_secs = poll_interval_secs
+
+    @property
+    def binary(self):
+        """The path of the service binary on the device."""
+        return "/data/local/tmp/%s/mq_benchmark_service%s" % (self.bits,
+                                                              self.bits)
+
+    def _Execute(self, command):
+        """Runs a shell command and returns (stdout, exit code)."""
+        results = self._shell.Execute(command)
+        return results[const.STDOUT][0], results[const.EXIT_CODE][0]
+
+    def _WaitUntil(self, condition):
+        """Polls condition until it holds or the timeout expires.
+
+        Returns:
+            True if the condition holds, False on timeout.
+        """
+        deadline = time.time() + self._timeout_secs
+        while True:
+            if condition():
+                return True
+            if time.time() >= deadline:
+                return False
+            time.sleep(self._poll_interval_secs)
+
+    def IsRunning(self):
+        """Returns whether the service process is alive."""
+        stdout, _ = self._Execute("pidof mq_benchmark_service%s" % self.bits)
+        return bool(stdout.strip())
+
+    def IsReady(self):
+        """Returns whether the service has registered its interface."""
+        _, exit_code = self._Execute(
+            "lshal --neat 2>/dev/null | grep -q '%s'" % _SERVICE_INTERFACE)
+        return exit_code == 0 and self.IsRunning()
+
+    def Start(self):
+        """Starts the service and waits until it is ready.
+
+        Does nothing if the service is already ready.
+
+        Returns:
+            True if the service was launched, False if it was already ready.
+
+        Raises:
+            ServiceError if the service is not ready within the timeout.
+        """
+        if self.IsReady():
+            return False
+        logging.info("Start the benchmark service(%s bit mode)", self.bits)
+        start_time = time.time()
+        results = self._shell.Execute([
+            "chmod 755 %s" % self.binary,
+            "LD_LIBRARY_PATH=/data/local/tmp/%s:$LD_LIBRARY_PATH %s&" %
+            (self.bits, self.binary)
+        ])
+        if any(results[const.EXIT_CODE]):
+            raise ServiceError("Failed to launch %s." % self.binary)
+        if not self._WaitUntil(self.IsReady):
+            self.Stop()
+            raise ServiceError("%s is not ready after %s seconds." %
+                               (self.binary, self._timeout_secs))
+        self.startup_time_ms = int((time.time() - start_time) * 1000)
+        logging.info("The benchmark service is ready after %s ms",
+                     self.startup_time_ms)
+        return True
+
+    def EnsureRunning(self):
+        """Starts the service, or restarts it if it died since the last run.
+
+        Returns:
+            True if the service was launched, False if it was running.
+        """
+        if self.startup_time_ms is not None and self.IsRunning():
+            return False
+        return self.Start()
+
+    def Stop(self):
+        """Stops the service, gracefully first.
+
+        Raises:
+            ServiceError if the process is still alive after SIGKILL.
+        """
+        process = "mq_benchmark_service%s" % self.bits
+        self._Execute("kill `pidof %s` 2>/dev/null" % process)
+        if not self._WaitUntil(lambda: not self.IsRunning()):
+            logging.warning("%s ignored SIGTERM, kill it.", process)
+            self._Execute("kill -9 `pidof %s` 2>/dev/null" % process)
+            if not self._WaitUntil(lambda: not self.IsRunning()):
+                raise ServiceError("Failed to stop %s." % process)
+        self.startup_time_ms = None
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Stop()
+
+
+class FmqServicePool(object):
+    """Keeps one benchmark service per bitness.
+
+    Each client runs against the service of its own bitness, like the
+    original per-test service, so a 32-bit result never includes a 64-bit
+    server. Both services register the same HIDL interface, so starting
+    one stops the other; each one is reused by the client runs of its
+    bitness until then.
+
+    Attributes:
+        _services: dict which maps bits to a FmqServiceManager.
+    """
+
+    def __init__(self, shell, **kwargs):
+        """Initializes the pool.
+
+        Args:
+            shell: the shell terminal of the device, e.g. dut.shell.one.
+            **kwargs: the timeouts of each FmqServiceManager.
+        """
+        self._services = dict(
+            (bits, FmqServiceManager(shell, bits, **kwargs))
+            for bits in (32, 64))
+
+    def GetService(self, bits):
+        """Returns the FmqServiceManager of a bitness."""
+        return self._services[bits]
+
+    def EnsureRunning(self, bits):
+        """Starts the service of a bitness, stopping the other one first.
+
+        Returns:
+            True if the service was launched, False if it was running.
+
+        Raises:
+            ServiceError if a service cannot be stopped or started.
+        """
+        for other_bits, service in self._services.items():
+            if other_bits != bits and service.startup_time_ms is not None:
+                service.Stop()
+        return self._services[bits].EnsureRunning()
+
+    def Stop(self):
+        """Stops every service started by the pool.
+
+        Raises:
+            ServiceError if a service cannot be stopped.
+        """
+        for service in self._services.values():
+            if service.startup_time_ms is not None:
+                service.Stop()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Breakdown of binder round trips from an ftrace text trace.
+
+A synchronous round trip from client C to server S produces
+
+    t0 binder_transaction (C, reply=0)
+    t1 sched_wakeup of S
+    t2 sched_switch to S
+    t3 binder_transaction_received (S)
+    t4 binder_transaction (S, reply=1)
+    t5 sched_wakeup of C
+    t6 sched_switch to C
+    t7 binder_transaction_received (C)
+
+and its latency t7 - t0 is split into four parts which add up to it:
+
+    kernel_copy: (t1 - t0) + (t5 - t4), the driver work of the call and
+                 the reply until the peer thread is woken.
+    scheduler_delay: (t2 - t1) + (t6 - t5), the time the woken thread
+                     waits for a CPU.
+    wakeup_latency: (t3 - t2) + (t7 - t6), the time from the switch to the
+                    thread until its binder read returns.
+    user_space: t4 - t3, the handling of the call in the server.
+
+A missing wakeup or switch, e.g. when the peer thread was already running,
+counts as zero wait and the time goes to kernel_copy.
+"""
+
+import collections
+import re
+
+COMPONENTS = ("kernel_copy", "scheduler_delay", "wakeup_latency",
+              "user_space")
+
+# an example is
+# '  binder_perf-1234  [002] d..2  1234.567890: sched_wakeup: comm=x pid=12'
+_LINE_PATTERN = re.compile(
+    r"^\s*(.+)-(\d+)\s+(?:\(\s*[-\d]+\)\s+)?\[\d+\]\s+(?:\S+\s+)?"
+    r"(\d+)\.(\d+):\s+(\w+):\s*(.*)$")
+_ARG_PATTERN = re.compile(r"(\w+)=(\S+)")
+_TRANSACTION_EVENT = "binder_transaction"
+_RECEIVED_EVENT = "binder_transaction_received"
+_ALLOC_BUF_EVENT = "binder_transaction_alloc_buf"
+_WAKEUP_EVENTS = ("sched_wakeup", "sched_waking")
+_SWITCH_EVENT = "sched_switch"
+_TF_ONE_WAY = 0x01
+
+
+class RoundTripStats(object):
+    """The sum of the breakdown of a group of round trips.
+
+    Attributes:
+        count: integer, the number of round trips.
+        totals: dict which maps each of COMPONENTS and 'total' to the sum
+                in nanoseconds.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.totals = dict((component, 0) for component in
+                           COMPONENTS + ("total",))
+
+    def Add(self, breakdown):
+        """Adds a round trip, a dict with the keys of totals."""
+        self.count += 1
+        for key, value in breakdown.items():
+            self.totals[key] += value
+
+    def Merge(self, other):
+        """Adds the round trips of another RoundTripStats."""
+        self.count += other.count
+        for key, value in other.totals.items():
+            self.totals[key] += value
+
+    def GetMean(self, component):
+        """Returns the mean of a component in nanoseconds, or None."""
+        if not self.count:
+            return None
+        return self.totals[component] // self.count
+
+
+class _RoundTrip(object):
+    """The timestamps of a round trip in progress (see the module doc)."""
+
+    __slots__ = ("client", "data_size", "reply", "t0", "t1", "t2", "t3",
+                 "t4")
+
+    def __init__(self, client, t0):
+        self.client = client
+        self.data_size = None
+        self.reply = False
+        self.t0 = t0
+
+
+def _Since(events, pid, start, default):
+    """Returns the time of the last event of a pid at or after start."""
+    timestamp = events.get(pid)
+    if timestamp is None or timestamp < start:
+        return default
+    return timestamp
+
+
+class BinderTraceAnalyzer(object):
+    """A streaming parser of binder round trips in an ftrace text trace.
+
+    Only the round trips in progress and the last wakeup and switch time of
+    each thread are kept, so the memory does not grow with the trace.
+
+    Attributes:
+        stats: dict which maps the data size of the call, in bytes, to a
+               RoundTripStats.
+        _client_prefix: string, the name prefix of the client threads
+                        whose calls are analyzed, or '' for all.
+        _max_pending: integer, the maximum number of transactions in
+                      flight; the oldest ones are dropped beyond it.
+        _pending: OrderedDict which maps a transaction id to its
+                  _RoundTrip until it is received.
+        _serving: dict which maps a server pid to the _RoundTrip it
+                  handles.
+        _wakeups: dict which maps a pid to the time of its last wakeup.
+        _switches: dict which maps a pid to the time it last got a CPU.
+    """
+
+    def __init__(self, client_prefix="", max_pending=4096):
+        self.stats = {}
+        self._client_prefix = client_prefix
+        self._max_pending = max_pending
+        self._pending = collections.OrderedDict()
+        self._serving = {}
+        self._wakeups = {}
+        self._switches = {}
+
+    def _Queue(self, transaction, round_trip):
+        self._pending[transaction] = round_trip
+        if len(self._pending) > self._max_pending:
+            self._pending.popitem(last=False)
+
+    def _OnTransaction(self, comm, pid, timestamp, args):
+        flags = int(args.get("flags", "0"), 16)
+        if args.get("reply", "0") != "0":
+            round_trip = self._serving.pop(pid, None)
+            if round_trip is None:
+                return
+            round_trip.reply = True
+            round_trip.t4 = timestamp
+        elif flags & _TF_ONE_WAY or not comm.startswith(self._client_prefix):
+            return
+        else:
+            round_trip = _RoundTrip(pid, timestamp)
+        self._Queue(args.get("transaction"), round_trip)
+
+    def _OnReceived(self, pid, timestamp, args):
+        round_trip = self._pending.pop(args.get("transaction"), None)
+        if round_trip is None:
+            return
+        if not round_trip.reply:
+            round_trip.t3 = timestamp
+            round_trip.t2 = _Since(self._switches, pid, round_trip.t0,
+                                   timestamp)
+            round_trip.t1 = _Since(self._wakeups, pid, round_trip.t0,
+                                   round_trip.t2)
+            self._serving[pid] = round_trip
+            return
+        if pid != round_trip.client:
+            return
+        t6 = _Since(self._switches, pid, round_trip.t4, timestamp)
+        t5 = _Since(self._wakeups, pid, round_trip.t4, t6)
+        breakdown = {
+            "kernel_copy": (round_trip.t1 - round_trip.t0) + (
+                t5 - round_trip.t4),
+            "scheduler_delay": (round_trip.t2 - round_trip.t1) + (t6 - t5),
+            "wakeup_latency": (round_trip.t3 - round_trip.t2) + (
+                timestamp - t6),
+            "user_space": round_trip.t4 - round_trip.t3,
+            "total": timestamp - round_trip.t0,
+        }
+        if round_trip.data_size not in self.stats:
+            self.stats[round_trip.data_size] = RoundTripStats()
+        self.stats[round_trip.data_size].Add(breakdown)
+
+    def ParseLine(self, line):
+        """Consumes one line of the trace.
+
+        Args:
+            line: string, a line of the ftrace text.
+        """
+        match = _LINE_PATTERN.match(line)
+        if not match:
+            return
+        comm, pid, seconds, fraction, event, args = match.groups()
+        if not (event.startswith("binder_transaction") or
+                event.startswith("sched_w") or event == _SWITCH_EVENT):
+            return
+        pid = int(pid)
+        timestamp = int(seconds) * 1000000000 + int(fraction.ljust(9, "0"))
+        args = dict(_ARG_PATTERN.findall(args))
+        if event == _TRANSACTION_EVENT:
+            self._OnTransaction(comm.strip(), pid, timestamp, args)
+        elif event == _RECEIVED_EVENT:
+            self._OnReceived(pid, timestamp, args)
+        elif event == _ALLOC_BUF_EVENT:
+            round_trip = self._pending.get(args.get("transaction"))
+            if round_trip is not None and not round_trip.reply:
+                round_trip.data_size = int(args.get("data_size", "0"))
+        elif event in _WAKEUP_EVENTS:
+            if "pid" in args:
+                self._wakeups[int(args["pid"])] = timestamp
+        elif event == _SWITCH_EVENT:
+            if "next_pid" in args:
+                self._switches[int(args["next_pid"])] = timestamp
+
+
+def AnalyzeTrace(lines, client_prefix="", max_pending=4096):
+    """Computes the breakdown of the binder round trips of a trace.
+
+    Args:
+        lines: iterable of strings, e.g. output_parser.IterLines(trace).
+        client_prefix: string, the name prefix of the client threads, e.g.
+                       the first 15 characters of the benchmark binary.
+        max_pending: see BinderTraceAnalyzer.
+
+    Returns:
+        a dict which maps the data size of the call to a RoundTripStats.
+    """
+    analyzer = BinderTraceAnalyzer(client_prefix, max_pending)
+    for line in lines:
+        analyzer.ParseLine(line)
+    return analyzer.stats
+
+
+def GroupBySize(stats, sizes):
+    """Assigns round trips to the benchmark message sizes.
+
+    A call carries the message plus a parcel header of a fixed size, which
+    is estimated as the smallest data size minus the smallest message size.
+    Each data size then goes to the message size closest to it without the
+    header.
+
+    Args:
+        stats: dict returned by AnalyzeTrace.
+        sizes: dict which maps a label, e.g. '2k', to its size in bytes.
+
+    Returns:
+        a dict which maps each label with round trips to a RoundTripStats.
+    """
+    data_sizes = [data_size for data_size in stats if data_size is not None]
+    if not data_sizes or not sizes:
+        return {}
+    header = max(0, min(data_sizes) - min(sizes.values()))
+    groups = {}
+    for data_size in data_sizes:
+        label = min(sizes, key=lambda label: abs(
+            sizes[label] - (data_size - header)))
+        if label not in groups:
+            groups[label] = RoundTripStats()
+        groups[label].Merge(stats[data_size])
+    return groups
@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Indexed per-method statistics of HIDL API traces.
+
+The profiling HALs write one text-format VtsProfilingRecord per call event,
+for example
+
+    timestamp: 1491264381213049
+    event: SERVER_API_ENTRY
+    package: "android.hardware.sensors"
+    version: 1
+    interface: "ISensors"
+    func_msg {
+      name: "poll"
+      arg {
+        ...
+      }
+    }
+
+The raw traces are read once. Only the aggregates are kept: per package,
+interface, method and caller, the call count, a histogram of the argument
+size in bytes and a histogram of the time between successive calls in
+nanoseconds.
+"""
+
+import gzip
+import io
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+from vts.testcases.performance.utils import latency_histogram
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS methods (
+    package TEXT NOT NULL,
+    interface TEXT NOT NULL,
+    method TEXT NOT NULL,
+    caller TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    arg_sizes BLOB NOT NULL,
+    inter_call_ns BLOB NOT NULL,
+    PRIMARY KEY (package, interface, method, caller)
+);
+CREATE INDEX IF NOT EXISTS methods_calls ON methods (caller, calls);
+"""
+
+# an example is 'package: "android.hardware.sensors"' or 'timestamp: 12'
+_FIELD_PATTERN = re.compile(r'^(\w+):\s*"?(.*?)"?$')
+
+# events which start a call; a record without an event counts as a call.
+_ENTRY_EVENTS = ("SERVER_API_ENTRY", "CLIENT_API_ENTRY", "PASSTHROUGH_ENTRY")
+
+# the bytes of each field of a scalar value in an argument.
+_SCALAR_BYTES = {
+    "bool_t": 1, "int8_t": 1, "uint8_t": 1, "char": 1, "uchar": 1,
+    "int16_t": 2, "uint16_t": 2,
+    "int32_t": 4, "uint32_t": 4, "float_t": 4,
+    "int64_t": 8, "uint64_t": 8, "double_t": 8,
+    "pointer": 8, "opaque": 8, "void_pointer": 8, "char_pointer": 8,
+    "uchar_pointer": 8, "pointer_pointer": 8, "void_pointer_pointer": 8,
+}
+
+
+def _NewHistogram():
+    """Returns an empty histogram for the argument sizes or intervals."""
+    return latency_histogram.LatencyHistogram()
+
+
+def _Continue(text, lines):
+    """Yields the lines of text followed by lines.
+
+    The last line of text may be cut short, e.g. at the end of an
+    incremental pull; it is joined with the first of lines.
+    """
+    pending = ""
+    for line in text.splitlines(True):
+        if pending:
+            yield pending
+        pending = line
+    for line in lines:
+        if pending and not pending.endswith("\n"):
+            line = pending + line
+        elif pending:
+            yield pending
+        pending = ""
+        yield line
+    if pending:
+        yield pending
+
+
+def ParseTraceRecords(lines, tail=None):
+    """Parses text-format VtsProfilingRecords one at a time.
+
+    A record starts with its top-level timestamp field. Lines before the
+    first record are skipped. The last record may be incomplete, e.g. at
+    the end of an incremental pull; if tail is given, its raw lines, or a
+    last line cut short before any record, are appended to tail instead
+    of being parsed, so they can be parsed again with the next part of
+    the trace. Otherwise it is parsed if it is
+    complete so far, and skipped if it is cut short inside a block.
+
+    The argument size counts the bytes of the scalar values and the
+    characters of the strings in the arg fields, not the text format.
+
+    Args:
+        lines: iterable of strings, e.g. an open trace file.
+        tail: list, or None to parse the last record too.
+
+    Yields:
+        dicts with the keys timestamp (integer), event, package, interface,
+        method and arg_size (the bytes of the values of the arg fields of
+        func_msg).
+    """
+    record = None
+    record_lines = []
+    depth = 0
+    arg_depth = None
+    line = ""
+    for line in lines:
+        stripped = line.strip()
+        if depth == 0 and stripped.startswith("timestamp:"):
+            if record and "method" in record:
+                yield record
+            record = {"arg_size": 0}
+            record_lines = []
+        if record is None:
+            continue
+        record_lines.append(line)
+        if not stripped:
+            continue
+        if stripped.endswith("{"):
+            if depth == 1 and stripped[:-1].strip() == "arg":
+                arg_depth = depth
+            depth += 1
+            continue
+        if stripped == "}":
+            depth -= 1
+            if depth == arg_depth:
+                arg_depth = None
+            if depth < 0:
+                record, record_lines, depth = None, [], 0
+            continue
+        match = _FIELD_PATTERN.match(stripped)
+        if not match:
+            continue
+        field, value = match.groups()
+        if arg_depth is not None:
+            if field in _SCALAR_BYTES:
+                record["arg_size"] += _SCALAR_BYTES[field]
+            elif field == "message":
+                record["arg_size"] += len(value)
+        elif depth == 0 and field == "timestamp" and value.isdigit():
+            record["timestamp"] = int(value)
+        elif depth == 0 and field in ("event", "package", "interface"):
+            record[field] = value
+        elif depth == 1 and field == "name":
+            record["method"] = value
+    if tail is not None:
+        if record is not None:
+            tail.extend(record_lines)
+        elif not line.endswith("\n"):
+            # a cut line may be the start of the next record.
+            tail.append(line)
+    elif record is not None and "method" in record and depth == 0:
+        yield record
+
+
+class HidlTraceStore(object):
+    """A local SQLite index of HIDL call statistics.
+
+    Attributes:
+        _connection: sqlite3.Connection to the database file.
+        _lock: threading.Lock which serializes the ingestions.
+        _last_timestamps: dict which maps (source, package, interface,
+                          method, caller) to the timestamp of the last call,
+                          so the intervals continue across ingestions.
+        _tails: dict which maps a source to a tuple of the caller and the
+                raw text of its last record, which may continue in the next
+                part of the source.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._last_timestamps = {}
+        self._tails = {}
+
+    def Ingest(self, lines, caller, source="", final=False):
+        """Adds the calls of a trace to the index.
+
+        Unless final, the last record of the lines is kept back and parsed
+        with the next lines of the same source, since a part of a growing
+        trace may end in the middle of a record. A record which spans two
+        parts is indexed under the caller of the part it starts in.
+
+        Args:
+            lines: iterable of strings, a text-format trace or a part of it.
+            caller: string, the client which made the calls, e.g. the
+                    package of a CTS APK.
+            source: string, identifies the trace stream, e.g. the device
+                    serial and trace file name. Intervals are measured
+                    between calls of the same source.
+            final: bool, whether lines end the trace of the source.
+
+        Returns:
+            integer, the number of calls added.
+        """
+        stats = {}
+        added = 0
+        parsed = 0
+        with self._lock:
+            tail_caller, tail_text = self._tails.pop(source, (caller, ""))
+            tail = None if final else []
+            for record in ParseTraceRecords(_Continue(tail_text, lines),
+                                            tail):
+                record_caller = tail_caller if (
+                    tail_text and not parsed) else caller
+                parsed += 1
+                event = record.get("event", _ENTRY_EVENTS[0])
+                if event not in _ENTRY_EVENTS:
+                    continue
+                key = (record.get("package", ""),
+                       record.get("interface", ""), record["method"],
+                       record_caller)
+                if key not in stats:
+                    stats[key] = [0, _NewHistogram(), _NewHistogram()]
+                entry = stats[key]
+                entry[0] += 1
+                entry[1].Record(record["arg_size"])
+                timestamp = record.get("timestamp")
+                last = self._last_timestamps.get((source,) + key)
+                if timestamp is not None:
+                    if last is not None and timestamp >= last:
+                        interval = timestamp - last
+                        entry[2].Record(min(
+                            interval, (1 << entry[2].max_bits) - 1))
+                    self._last_timestamps[(source,) + key] = timestamp
+                added += 1
+            if tail:
+                self._tails[source] = (
+                    tail_caller if tail_text and not parsed else caller,
+                    "".join(tail))
+            for key, (calls, arg_sizes, inter_call_ns) in stats.items():
+                self._Merge(key, calls, arg_sizes, inter_call_ns)
+            self._connection.commit()
+        logging.info("Indexed %s HIDL calls of %s", added, caller)
+        return added
+
+    def Flush(self):
+        """Indexes the records kept back at the end of every source.
+
+        Returns:
+            integer, the number of calls added.
+        """
+        with self._lock:
+            tails = dict(self._tails)
+        return sum(self.Ingest([], caller, source, final=True)
+                   for source, (caller, _) in tails.items())
+
+    def IngestFile(self, path, caller, source=None, final=None):
+        """Adds the calls of a trace file, which may be gzipped.
+
+        Args:
+            path: string, the trace file; a .gz file is decompressed.
+            caller: string, see Ingest.
+            source: string, see Ingest; the path by default.
+            final: bool, see Ingest; by default whether no source is given,
+                   i.e. whether the file is a whole trace.
+
+        Returns:
+            integer, the number of calls added.
+        """
+        if path.endswith(".gz"):
+            trace_file = io.TextIOWrapper(gzip.open(path))
+        else:
+            trace_file = open(path)
+        if final is None:
+            final = source is None
+        with trace_file:
+            return self.Ingest(trace_file, caller,
+                               path if source is None else source, final)
+
+    def _Merge(self, key, calls, arg_sizes, inter_call_ns):
+        """Merges the statistics of one key into its row."""
+        row = self._connection.execute(
+            "SELECT calls, arg_sizes, inter_call_ns FROM methods WHERE "
+            "package = ? AND interface = ? AND method = ? AND caller = ?",
+            key).fetchone()
+        if row:
+            calls += row[0]
+            arg_sizes.Merge(
+                latency_histogram.LatencyHistogram.Decode(bytes(row[1])))
+            inter_call_ns.Merge(
+                latency_histogram.LatencyHistogram.Decode(bytes(row[2])))
+        self._connection.execute(
+            "INSERT OR REPLACE INTO methods VALUES (?, ?, ?, ?, ?, ?, ?)",
+            key + (calls, sqlite3.Binary(arg_sizes.Encode()),
+                   sqlite3.Binary(inter_call_ns.Encode())))
+
+    def GetTopMethods(self, caller=None, package=None, limit=10):
+        """Returns the methods with the most calls.
+
+        Args:
+            caller: string, or None for all callers.
+            package: string, the HAL package, or None for all packages.
+            limit: integer, the maximum number of methods returned.
+
+        Returns:
+            a list of (package, interface, method, calls, share) tuples in
+            descending order of calls, where share is the fraction of all
+            the matching calls.
+        """
+        conditions = []
+        args = []
+        if caller is not None:
+            conditions.append("caller = ?")
+            args.append(caller)
+        if package is not None:
+            conditions.append("package = ?")
+            args.append(package)
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+        rows = self._connection.execute(
+            "SELECT package, interface, method, SUM(calls) FROM methods %s "
+            "GROUP BY package, interface, method ORDER BY SUM(calls) DESC"
+            % where, args).fetchall()
+        total = float(sum(row[3] for row in rows)) or 1.0
+        return [row + (row[3] / total,) for row in rows[:limit]]
+
+    def GetMethodStats(self, package, interface, method, caller=None):
+        """Returns the statistics of one method.
+
+        Args:
+            package: string, the HAL package.
+            interface: string, the interface name.
+            method: string, the method name.
+            caller: string, or None to merge all callers.
+
+        Returns:
+            a tuple of the call count, the LatencyHistogram of the argument
+            sizes in bytes and the LatencyHistogram of the time between
+            calls in nanoseconds.
+        """
+        query = ("SELECT calls, arg_sizes, inter_call_ns FROM methods WHERE "
+                 "package = ? AND interface = ? AND method = ?")
+        args = [package, interface, method]
+        if caller is not None:
+            query += " AND caller = ?"
+            args.append(caller)
+        calls = 0
+        arg_sizes = _NewHistogram()
+        inter_call_ns = _NewHistogram()
+        for row in self._connection.execute(query, args):
+            calls += row[0]
+            arg_sizes.Merge(
+                latency_histogram.LatencyHistogram.Decode(bytes(row[1])))
+            inter_call_ns.Merge(
+                latency_histogram.LatencyHistogram.Decode(bytes(row[2])))
+        return calls, arg_sizes, inter_call_ns
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Side-by-side results of the IPC mechanisms over one message size grid.
+
+The binder and hwbinder latencies are round trips of one message. The FMQ
+latency is the write time plus the read time of one message, i.e. a
+one-way transfer through the queue. Only latencies of the same kind are
+compared with each other. Throughput is not derived from these latencies;
+the throughput modules of each mechanism measure it.
+"""
+
+from vts.testcases.performance.utils import repetition
+
+MECHANISMS = ("binder", "hwbinder_binderize", "hwbinder_passthrough", "fmq")
+
+ROUND_TRIP = "round_trip"
+ONE_WAY = "one_way"
+
+# what one latency sample of each mechanism measures.
+KINDS = {
+    "binder": ROUND_TRIP,
+    "hwbinder_binderize": ROUND_TRIP,
+    "hwbinder_passthrough": ROUND_TRIP,
+    "fmq": ONE_WAY,
+}
+
+# the message sizes in bytes which every mechanism supports.
+DEFAULT_SIZES = [64, 128, 256, 512, 1024, 2048, 4096]
+
+
+def SizeLabel(size):
+    """Returns the Google Benchmark label of a size, e.g. '2k' for 2048."""
+    if size >= 2048 and size % 1024 == 0:
+        return "%dk" % (size // 1024)
+    return str(size)
+
+
+def BenchmarkFilter(sizes):
+    """Returns the --benchmark_filter regex which selects the sizes."""
+    return "'/(%s)$'" % "|".join(SizeLabel(size) for size in sizes)
+
+
+class ComparisonTable(object):
+    """The latency samples of several mechanisms over one size grid.
+
+    Attributes:
+        sizes: list of integers, the message sizes in bytes.
+        mechanisms: list of strings, the mechanisms in report order.
+        _samples: dict which maps (mechanism, size) to the list of
+                  latencies in nanoseconds.
+    """
+
+    def __init__(self, sizes, mechanisms):
+        self.sizes = sizes
+        self.mechanisms = mechanisms
+        self._samples = {}
+
+    def Add(self, mechanism, size, latency_ns):
+        """Adds one latency sample of a mechanism and size."""
+        self._samples.setdefault((mechanism, size), []).append(latency_ns)
+
+    def AddGoogleBenchmarkSamples(self, mechanism, samples):
+        """Adds the samples of a binder or hwbinder latency binary.
+
+        Args:
+            mechanism: string, one of MECHANISMS.
+            samples: list of (label, latency) tuples, see
+                     output_parser.ParseGoogleBenchmarkSamples. Labels
+                     outside the size grid are ignored.
+        """
+        sizes = dict((SizeLabel(size), size) for size in self.sizes)
+        for label, latency in samples:
+            if label in sizes:
+                self.Add(mechanism, sizes[label], latency)
+
+    def GetLatency(self, mechanism, size):
+        """Returns the mean latency in nanoseconds, or None if unmeasured."""
+        samples = self._samples.get((mechanism, size))
+        if not samples:
+            return None
+        return repetition.LabelStats(samples).mean
+
+    def GetRatio(self, mechanism, baseline, size):
+        """Returns the latency of a mechanism divided by the baseline's.
+
+        Returns:
+            float, or None if either latency is unmeasured or the two
+            mechanisms measure different kinds of latency, see KINDS.
+        """
+        if KINDS[mechanism] != KINDS[baseline]:
+            return None
+        latency = self.GetLatency(mechanism, size)
+        baseline_latency = self.GetLatency(baseline, size)
+        if latency is None or not baseline_latency:
+            return None
+        return latency / baseline_latency
+
+    def Format(self, baseline):
+        """Formats the latency and ratio tables as text.
+
+        Args:
+            baseline: string, the mechanism the ratios are relative to.
+
+        Returns:
+            string, one table per line block with a column per mechanism
+            and a row per size; '-' marks a missing value.
+        """
+        tables = [
+            ("Latency (nanoseconds)",
+             lambda mechanism, size: self.GetLatency(mechanism, size),
+             "%d"),
+            ("Latency relative to %s" % baseline,
+             lambda mechanism, size: self.GetRatio(mechanism, baseline, size),
+             "%.3f"),
+        ]
+        width = max(len(mechanism) for mechanism in self.mechanisms) + 2
+        lines = []
+        for title, getter, value_format in tables:
+            lines.append(title)
+            lines.append("%8s" % "bytes" + "".join(
+                mechanism.rjust(width) for mechanism in self.mechanisms))
+            for size in self.sizes:
+                cells = []
+                for mechanism in self.mechanisms:
+                    value = getter(mechanism, size)
+                    cells.append(("-" if value is None else
+                                  value_format % value).rjust(width))
+                lines.append("%8s" % size + "".join(cells))
+            lines.append("")
+        return "\n".join(lines)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import array
+import struct
+
+_HEADER_FORMAT = "<4sBBQQQQ"
+_MAGIC = b"VLH1"
+_ENTRY_FORMAT = "<IQ"
+
+try:
+    array.array("Q")
+    _COUNT_TYPECODE = "Q"
+except ValueError:
+    # Python 2 has no "Q" typecode; "L" is 64 bits wide on 64-bit hosts.
+    _COUNT_TYPECODE = "L"
+
+
+class LatencyHistogram(object):
+    """A log-bucketed latency histogram in the style of HdrHistogram.
+
+    Values below 2^precision_bits get one bucket each. Above that, every
+    power of two is split into 2^(precision_bits - 1) equal buckets, so the
+    relative error of any percentile is below 2^(1 - precision_bits). The
+    counts live in a single array so millions of samples take a few KB.
+
+    Attributes:
+        precision_bits: integer, the number of significant bits kept.
+        max_bits: integer, values up to 2^max_bits - 1 can be recorded.
+        total_count: integer, the number of recorded samples.
+        total_sum: integer, the sum of the recorded samples.
+        min_value: integer, the smallest recorded sample or None.
+        max_value: integer, the largest recorded sample or None.
+        _counts: array of unsigned integers, one per bucket.
+    """
+
+    def __init__(self, precision_bits=7, max_bits=40):
+        if not 1 < precision_bits < max_bits <= 63:
+            raise ValueError("Invalid histogram precision %s/%s bits." %
+                             (precision_bits, max_bits))
+        self.precision_bits = precision_bits
+        self.max_bits = max_bits
+        self.total_count = 0
+        self.total_sum = 0
+        self.min_value = None
+        self.max_value = None
+        bucket_count = (1 << precision_bits) + (
+            max_bits - precision_bits) * (1 << (precision_bits - 1))
+        self._counts = array.array(_COUNT_TYPECODE, [0]) * bucket_count
+
+    def _Index(self, value):
+        """Returns the bucket index of a non-negative integer value."""
+        if value < (1 << self.precision_bits):
+            return value
+        shift = value.bit_length() - self.precision_bits
+        half = 1 << (self.precision_bits - 1)
+        mantissa = value >> shift
+        return (1 << self.precision_bits) + (shift - 1) * half + (
+            mantissa - half)
+
+    def _Bounds(self, index):
+        """Returns the (lowest, highest) value of a bucket."""
+        if index < (1 << self.precision_bits):
+            return index, index
+        half = 1 << (self.precision_bits - 1)
+        offset = index - (1 << self.precision_bits)
+        shift = offset // half + 1
+        mantissa = offset % half + half
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def Record(self, value, count=1):
+        """Records a sample.
+
+        Args:
+            value: non-negative integer, e.g. a latency in nanoseconds.
+            count: positive integer, the number of identical samples.
+
+        Raises:
+            ValueError if the value is out of the histogram range.
+        """
+        value = int(value)
+        if value < 0 or value >= (1 << self.max_bits):
+            raise ValueError("%s is out of the histogram range." % value)
+        self._counts[self._Index(value)] += count
+        self.total_count += count
+        self.total_sum += value * count
+        if self.min_value is None or value < self.min_value:
+            self.min_value = value
+        if self.max_value is None or value > self.max_value:
+            self.max_value = value
+
+    def Merge(self, other):
+        """Adds the samples of another histogram with the same layout.
+
+        Args:
+            other: LatencyHistogram, e.g. from another thread or device.
+        """
+        if (other.precision_bits, other.max_bits) != (self.precision_bits,
+                                                      self.max_bits):
+            raise ValueError("Cannot merge histograms of different layout.")
+        for index, count in enumerate(other._counts):
+            if count:
+                self._counts[index] += count
+        self.total_count += other.total_count
+        self.total_sum += other.total_sum
+        for value in (other.min_value, other.max_value):
+            if value is not None:
+                self.min_value = (value if self.min_value is None else
+                                  min(self.min_value, value))
+                self.max_value = (value if self.max_value is None else
+                                  max(self.max_value, value))
+
+    def GetMean(self):
+        """Returns the mean of the samples, or None if there is none."""
+        if not self.total_count:
+            return None
+        return self.total_sum // self.total_count
+
+    def GetPercentile(self, percentile):
+        """Returns the value at a percentile.
+
+        Args:
+            percentile: number in [0, 100], e.g. 99.9.
+
+        Returns:
+            integer, the middle of the bucket which holds the percentile, or
+            None if the histogram is empty.
+        """
+        if not self.total_count:
+            return None
+        if percentile >= 100:
+            return self.max_value
+        rank = max(1, int(self.total_count * percentile / 100.0 + 0.5))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                low, high = self._Bounds(index)
+                return min(max((low + high) // 2, self.min_value),
+                           self.max_value)
+        return self.max_value
+
+    def Encode(self):
+        """Serializes the non-empty buckets into a compact byte string."""
+        entries = [struct.pack(_ENTRY_FORMAT, index, count)
+                   for index, count in enumerate(self._counts) if count]
+        header = struct.pack(
+            _HEADER_FORMAT, _MAGIC, self.precision_bits, self.max_bits,
+            self.total_count, self.total_sum,
+            self.min_value or 0, self.max_value or 0)
+        return header + b"".join(entries)
+
+    @classmethod
+    def Decode(cls, data):
+        """Deserializes a byte string produced by Encode.
+
+        Args:
+            data: bytes, the encoded histogram.
+
+        Returns:
+            a LatencyHistogram.
+        """
+        header_size = struct.calcsize(_HEADER_FORMAT)
+        (magic, precision_bits, max_bits, total_count, total_sum, min_value,
+         max_value) = struct.unpack(_HEADER_FORMAT, data[:header_size])
+        if magic != _MAGIC:
+            raise ValueError("Not an encoded latency histogram.")
+        histogram = cls(precision_bits, max_bits)
+        histogram.total_count = total_count
+        histogram.total_sum = total_sum
+        if total_count:
+            histogram.min_value = min_value
+            histogram.max_value = max_value
+        entry_size = struct.calcsize(_ENTRY_FORMAT)
+        for offset in range(header_size, len(data), entry_size):
+            index, count = struct.unpack(
+                _ENTRY_FORMAT, data[offset:offset + entry_size])
+            histogram._counts[index] = count
+        return histogram
@@ -0,0 +1,640 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Runs a Google Benchmark round-trip latency binary in every test mode.
+
+The binder and hwbinder latency tests only differ in their binaries,
+thresholds, vector names and axis labels, so a LatencyRunner holds the
+modes, the report and the threshold checks they share.
+"""
+
+import logging
+import time
+
+from vts.proto import VtsReportMessage_pb2 as ReportMsg
+from vts.runners.host import asserts
+from vts.runners.host import const
+from vts.testcases.performance.utils import background_load
+from vts.testcases.performance.utils import cpu_cost
+from vts.testcases.performance.utils import cpu_placement
+from vts.testcases.performance.utils import ftrace_analyzer
+from vts.testcases.performance.utils import noise_probe
+from vts.testcases.performance.utils import output_parser
+from vts.testcases.performance.utils import repetition
+from vts.testcases.performance.utils import steady_state
+from vts.testcases.performance.utils import thermal_pacer
+from vts.testcases.performance.utils import threshold_profile
+from vts.testcases.performance.utils import trace_capture
+
+
+class LatencyRunner(object):
+    """Runs and reports a latency binary for one test class.
+
+    Attributes:
+        _test: BaseTestClass instance which owns the runner. Its user
+               params configure the modes, and the vectors are uploaded
+               through its current web feature.
+        _dut: the AndroidDevice to run on.
+        _name: string, the prefix of the vector names, e.g. 'binder'.
+        _rpc_name: string, the IPC name in the axis labels, e.g. 'Binder'.
+        _command_func: function which takes bits, the Google Benchmark
+                       repetitions and extra arguments, and returns a tuple
+                       of the binary path and the shell command line.
+        _load_command_func: function which takes bits, a worker count and
+                            extra arguments, and returns a tuple of the
+                            binary path and the shell command line of the
+                            throughput binary which loads the device.
+        _thresholds: ThresholdTable of the latency limits.
+        _repetition_mode: bool, whether to repeat the benchmark until the
+                          confidence interval of each label is clearly
+                          below or above its threshold.
+        _repetition_max_runs: integer, the maximum number of binary runs in
+                              repetition mode.
+        _repetition_batch: integer, the Google Benchmark repetitions per
+                           binary run in repetition mode.
+        _steady_state_mode: bool, whether to drop the warm-up repetitions
+                            of each label before computing its statistics.
+        _steady_state_intervals: integer, the Google Benchmark repetitions
+                                 per binary run in steady-state mode.
+        _steady_state_max_cv: float, the maximum coefficient of variation
+                              of the steady-state repetitions.
+        _combined_trace_mode: bool, whether to run a short untraced and a
+                              short traced window after the clean run and
+                              report the tracing overhead.
+        _trace_window_args: string, the extra benchmark arguments of both
+                            windows.
+        _trace_categories: string, the atrace categories of the traced run.
+        _trace_output_dir: string, the host directory of the traces, or ''
+                           to not save them.
+        _placements: list of cpu_placement.Placement to run the benchmark
+                     with in placement matrix mode, or None.
+        _pacer: ThermalPacer which waits for the device to cool down before
+                each binary run in thermal pacing mode, or None.
+        _thermal_readings: list of ThermalReading, one per binary run since
+                           the start of the current Run.
+        _noise: NoiseProbe which probes the background noise around each
+                binary run in noise probe mode, or None.
+        _noise_scores: list of integers, the noise score of each binary run
+                       since the start of the current Run.
+        _transport: FileResultTransport which moves the benchmark output
+                    through a device file, or None to read it from stdout.
+        _cpu_costs: list of (CpuCost, iterations) tuples, one per binary run
+                    in CPU cost mode since the start of the current Run.
+        _load_workers: list of integers, the worker counts of the
+                       background throughput binary in latency-under-load
+                       mode, where 0 is no load; empty to disable the mode.
+        _load_args: string, extra command line arguments of the throughput
+                    binary.
+        _load_repetitions: integer, the Google Benchmark repetitions per
+                           load level, whose means give the percentiles.
+        _load_latency_args: string, extra command line arguments of the
+                            latency binary under load.
+        _load_warmup_secs: float, the time the load runs before the latency
+                           is measured.
+    """
+
+    def __init__(self, test, dut, cpu_freq, transport, name, rpc_name,
+                 command_func, thresholds, load_command_func):
+        """Reads the mode user params of the test.
+
+        Args:
+            test: BaseTestClass instance which owns the runner.
+            dut: the AndroidDevice to run on, whose shell.one terminal must
+                 exist.
+            cpu_freq: CpuFrequencyScalingController of dut.
+            transport: FileResultTransport of dut, or None.
+            name: string, the prefix of the vector names.
+            rpc_name: string, the IPC name in the axis labels.
+            command_func: see the _command_func attribute.
+            thresholds: ThresholdTable of the latency limits.
+            load_command_func: see the _load_command_func attribute.
+        """
+        self._test = test
+        self._dut = dut
+        self._name = name
+        self._rpc_name = rpc_name
+        self._command_func = command_func
+        self._load_command_func = load_command_func
+        self._thresholds = thresholds
+        self._transport = transport
+        self._cpu_costs = []
+        self._repetition_mode = test.getUserParam(
+            "repetition_mode", default_value=False)
+        self._repetition_max_runs = int(test.getUserParam(
+            "repetition_max_runs", default_value=5))
+        self._repetition_batch = int(test.getUserParam(
+            "repetition_batch", default_value=3))
+        self._steady_state_mode = test.getUserParam(
+            "steady_state_mode", default_value=False)
+        self._steady_state_intervals = int(test.getUserParam(
+            "steady_state_intervals", default_value=10))
+        self._steady_state_max_cv = float(test.getUserParam(
+            "steady_state_max_cv", default_value=0.1))
+        self._combined_trace_mode = test.getUserParam(
+            "combined_trace_mode", default_value=False)
+        self._trace_window_args = test.getUserParam(
+            "trace_window_args", default_value="--benchmark_min_time=0.05")
+        self._trace_categories = test.getUserParam(
+            "trace_categories",
+            default_value=trace_capture.DEFAULT_CATEGORIES)
+        self._trace_output_dir = test.getUserParam(
+            "trace_output_dir", default_value="")
+        self._placements = None
+        if test.getUserParam("placement_matrix_mode", default_value=False):
+            self._placements = cpu_placement.PlanPlacements(
+                cpu_placement.ReadTopology(dut.shell.one))
+        self._pacer = thermal_pacer.CreatePacer(test, dut, cpu_freq)
+        self._thermal_readings = []
+        self._noise = noise_probe.CreateProbe(test, dut)
+        self._noise_scores = []
+        self._load_workers = [int(workers) for workers in test.getUserParam(
+            "load_workers", default_value=[])]
+        self._load_args = test.getUserParam("load_args", default_value="")
+        self._load_repetitions = int(test.getUserParam(
+            "load_repetitions", default_value=20))
+        self._load_latency_args = test.getUserParam(
+            "load_latency_args", default_value="--benchmark_min_time=0.05")
+        self._load_warmup_secs = float(test.getUserParam(
+            "load_warmup_secs", default_value=1))
+
+    @property
+    def pacing(self):
+        """Whether thermal pacing replaces the thermal throttling skip."""
+        return self._pacer is not None
+
+    def _AddVector(self, name, labels, values,
+                   x_axis_label="Message Size (Bytes)", **kwargs):
+        """Uploads a vector named <prefix>_vector_roundtrip_<name>."""
+        self._test.web.AddProfilingDataLabeledVector(
+            "%s_vector_roundtrip_%s" % (self._name, name), labels, values,
+            x_axis_label=x_axis_label, **kwargs)
+
+    def Run(self, bits):
+        """Runs the native binary and uploads its result.
+
+        In repetition mode the binary runs until every label with a
+        threshold has a clear verdict, and the mean and standard deviation
+        of the repetitions are uploaded. In steady-state mode the leading
+        warm-up repetitions of each label are dropped, and the warm-up
+        length and whether a steady state was reached are uploaded. In
+        combined trace mode, the tracing overhead of a short traced run is
+        also uploaded. In placement matrix mode the benchmark also runs once
+        per client and server CPU placement. In thermal pacing mode each
+        binary run waits until the device is cool enough, and the hottest
+        temperature and slowest CPU frequency seen after the runs are
+        uploaded per label. In CPU cost mode the CPU time, context switches
+        and binder buffer usage of all the runs are uploaded per
+        transaction. In noise probe mode the highest noise score of the
+        runs is uploaded per label. In latency-under-load mode the latency
+        is also measured while the throughput binary loads binder, see
+        RunUnderLoad.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+
+        Returns:
+            a tuple of the list of labels, the list of their LabelStats and
+            the highest noise score of the runs, or None.
+        """
+        self._thermal_readings = []
+        self._noise_scores = []
+        self._cpu_costs = []
+        label_result = []
+        samples = {}
+        durations = None
+        if self._repetition_mode:
+            engine = repetition.RepetitionEngine(
+                lambda: self.RunBinary(bits, self._repetition_batch),
+                lambda label: self._thresholds.GetThreshold(bits, label),
+                self._repetition_max_runs,
+                self._repetition_batch)
+            label_result, samples = engine.Run()
+        elif self._steady_state_mode:
+            durations = {}
+            for label, value, iterations in self.RunBinary(
+                    bits, self._steady_state_intervals, with_iterations=True):
+                if label not in samples:
+                    label_result.append(label)
+                    samples[label] = []
+                    durations[label] = []
+                samples[label].append(value)
+                durations[label].append(value * iterations)
+        else:
+            for label, value in self.RunBinary(bits):
+                label_result.append(label)
+                samples[label] = [value]
+        if self._steady_state_mode:
+            warmups = steady_state.TrimWarmup(
+                label_result, samples, durations, self._steady_state_max_cv)
+        stats = [repetition.LabelStats(samples[label])
+                 for label in label_result]
+        value_result = [int(label_stats.mean) for label_stats in stats]
+        readings = list(self._thermal_readings)
+        noise_scores = list(self._noise_scores)
+        costs = list(self._cpu_costs)
+
+        # To upload to the web DB.
+        self._AddVector(
+            "latency_benchmark_%sbits" % bits,
+            label_result,
+            value_result,
+            y_axis_label="Roundtrip %s RPC Latency (nanoseconds)" %
+                         self._rpc_name)
+        if self._repetition_mode:
+            self._AddVector(
+                "latency_stddev_%sbits" % bits,
+                label_result,
+                [int(label_stats.stddev) for label_stats in stats],
+                y_axis_label="Roundtrip %s RPC Latency - "
+                             "Standard Deviation (nanoseconds)" %
+                             self._rpc_name)
+        if self._steady_state_mode:
+            self._AddVector(
+                "latency_warmup_intervals_%sbits" % bits,
+                label_result,
+                [warmup.warmup_intervals for warmup in warmups],
+                y_axis_label="Warm-up Repetitions")
+            if durations:
+                self._AddVector(
+                    "latency_warmup_time_ns_%sbits" % bits,
+                    label_result,
+                    [int(warmup.warmup_duration) for warmup in warmups],
+                    y_axis_label="Warm-up Time (nanoseconds)")
+            self._AddVector(
+                "latency_steady_state_%sbits" % bits,
+                label_result,
+                [int(warmup.steady) for warmup in warmups],
+                y_axis_label="Steady State Reached")
+        if readings:
+            self._AddVector(
+                "latency_temperature_mc_%sbits" % bits,
+                label_result,
+                [max(r.temperature_mc for r in readings)] * len(label_result),
+                y_axis_label="Hottest Thermal Zone (millidegrees Celsius)")
+            self._AddVector(
+                "latency_cpu_freq_khz_%sbits" % bits,
+                label_result,
+                [min(r.cpu_freq_khz for r in readings)] * len(label_result),
+                y_axis_label="Slowest CPU Frequency (kHz)")
+        if noise_scores:
+            self._AddVector(
+                "latency_noise_score_%sbits" % bits,
+                label_result,
+                [max(noise_scores)] * len(label_result),
+                y_axis_label="Background Noise Score (percent of the limit)")
+        if costs:
+            self.ReportCpuCost(bits, costs)
+        if self._combined_trace_mode:
+            self.RunTracedWindow(bits, label_result)
+        if self._placements:
+            self.RunPlacementMatrix(bits)
+        if self._load_workers:
+            self.RunUnderLoad(bits)
+        return (label_result, stats,
+                max(noise_scores) if noise_scores else None)
+
+    def CheckThresholds(self, bits, labels, stats, noise_score=None):
+        """Checks the latency of each label against its threshold.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            labels: list of strings, the message size labels.
+            stats: list of LabelStats, one per label.
+            noise_score: integer, the highest noise score of the runs, or
+                         None. With noise_exclude_noisy a noisy result is
+                         not checked.
+        """
+        if (self._noise and self._noise.exclude_noisy and
+                noise_probe.IsNoisy(noise_score)):
+            logging.warning("Measured under noise score %s; thresholds not "
+                            "checked.", noise_score)
+            return
+        for label, label_stats in zip(labels, stats):
+            threshold = self._thresholds.GetThreshold(bits, label)
+            if threshold is not None:
+                asserts.assertTrue(
+                    label_stats.IsBelowThreshold(threshold),
+                    "%s ns for %s is longer than the threshold %s ns" % (
+                        label_stats, label, threshold))
+
+    def ReportCpuCost(self, bits, costs):
+        """Uploads the CPU cost per transaction of several binary runs.
+
+        One binary run covers all the message sizes, so the cost cannot be
+        split per size; each vector has a single "all_sizes" label.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            costs: list of (CpuCost, iterations) tuples of the runs.
+        """
+        total = cpu_cost.CpuCost(transactions=0)
+        for cost, _ in costs:
+            total.Merge(cost)
+        # Without debugfs, each iteration is taken as one transaction.
+        values = total.ToDict(sum(iterations for _, iterations in costs))
+        for key, y_axis_label in cpu_cost.VECTORS:
+            if key not in values:
+                continue
+            self._AddVector(
+                "latency_%s_%sbits" % (key, bits),
+                ["all_sizes"],
+                [values[key]],
+                x_axis_label="Message Sizes",
+                y_axis_label="%s RPC %s" % (self._rpc_name, y_axis_label))
+
+    def RunUnderLoad(self, bits):
+        """Measures the latency while the throughput binary loads binder.
+
+        For every load level the throughput binary runs with that many
+        workers in the background, and the latency binary runs
+        load_repetitions times. The mean and the percentiles of the
+        repetition means are uploaded per load level, and the mean in
+        percent of the mean at the lowest load, which makes latency-vs-load
+        curves. The binary only reports one mean per repetition, so the
+        percentiles describe the spread between repetitions, not the tail
+        latency of single calls.
+
+        The load is intentional noise, so the runs are not probed in noise
+        probe mode.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+        """
+        curve = background_load.LoadCurve(self._load_workers)
+        for workers in self._load_workers:
+            load = None
+            if workers:
+                load = self.CreateLoad(bits, workers)
+                load.Start()
+                time.sleep(self._load_warmup_secs)
+            try:
+                curve.Add(workers, self.RunBinaryOnce(
+                    bits, self._load_repetitions,
+                    extra_args=self._load_latency_args))
+            finally:
+                if load:
+                    load.Stop()
+        logging.info("Latency under load (%s bits):\n%s", bits,
+                     curve.Format())
+
+        for workers in self._load_workers:
+            labels = [label for label in curve.labels
+                      if curve.GetMean(workers, label) is not None]
+            name = "latency_load_%sworkers" % workers
+            self._AddVector(
+                "%s_%sbits" % (name, bits),
+                labels,
+                [int(curve.GetMean(workers, label)) for label in labels],
+                y_axis_label="Roundtrip %s RPC Latency Under Load "
+                             "(nanoseconds)" % self._rpc_name,
+                regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+            for percentile in background_load.PERCENTILES:
+                self._AddVector(
+                    "%s_repetition_mean_p%s_%sbits" % (name, percentile,
+                                                       bits),
+                    labels,
+                    [curve.GetPercentile(workers, label, percentile)
+                     for label in labels],
+                    y_axis_label="Roundtrip %s RPC Latency Under Load - "
+                                 "%s Percentile of the Repetition Means "
+                                 "(nanoseconds)" % (self._rpc_name,
+                                                    percentile),
+                    regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+            if workers == min(self._load_workers):
+                continue
+            labels = [label for label in labels
+                      if curve.GetSlowdown(workers, label) is not None]
+            self._AddVector(
+                "%s_slowdown_percent_%sbits" % (name, bits),
+                labels,
+                [int(curve.GetSlowdown(workers, label)) for label in labels],
+                y_axis_label="Latency Relative to %s Workers (percent)" %
+                             min(self._load_workers),
+                regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+
+    def CreateLoad(self, bits, workers):
+        """Returns the BackgroundLoad of the throughput binary.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            workers: positive integer, the number of workers to run.
+        """
+        binary, command = self._load_command_func(bits, workers,
+                                                  self._load_args)
+        self._dut.shell.one.Execute("chmod 755 %s" % binary)
+        return background_load.BackgroundLoad(
+            self._dut.shell.one, command, binary.rsplit("/", 1)[-1])
+
+    def RunPlacementMatrix(self, bits):
+        """Runs the benchmark with each CPU placement and reports them.
+
+        In the PASSTHROUGH HIDL mode the client and the server share one
+        process, so the placements do not apply and none runs.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+        """
+        if getattr(self._test, "hidl_hal_mode", None) == "PASSTHROUGH":
+            logging.info("Skip the placement matrix: PASSTHROUGH has no "
+                         "server process.")
+            return
+        for placement in self._placements:
+            logging.info("Run with placement %s: client on %s, server on %s",
+                         placement.name, placement.client_cpus,
+                         placement.server_cpus)
+            results = self.RunBinary(bits, placement=placement)
+            self._AddVector(
+                "latency_%s_%sbits" % (placement.name, bits),
+                [label for label, _ in results],
+                [value for _, value in results],
+                y_axis_label="Roundtrip %s RPC Latency - %s "
+                             "(nanoseconds)" % (
+                                 self._rpc_name,
+                                 placement.name.replace("_", " ").capitalize()))
+
+    def RunTracedWindow(self, bits, labels):
+        """Runs the benchmark briefly under atrace and reports the overhead.
+
+        An untraced window with the same arguments runs right before the
+        traced one, so the overhead only differs in tracing.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            labels: list of strings, the labels of the clean run.
+
+        Returns:
+            string, the captured trace, or None if tracing failed.
+        """
+        untraced = dict(self.RunBinary(
+            bits, extra_args=self._trace_window_args))
+        capture = trace_capture.TraceCapture(
+            self._dut.shell.one, self._trace_categories)
+        try:
+            capture.Start()
+            try:
+                traced = dict(self.RunBinary(
+                    bits, extra_args=self._trace_window_args))
+            finally:
+                trace = capture.Stop()
+        except trace_capture.TraceError as e:
+            logging.error("Failed to trace the benchmark: %s", e)
+            return None
+
+        overhead_labels = [label for label in labels
+                           if label in traced and label in untraced]
+        self._AddVector(
+            "latency_trace_overhead_%sbits" % bits,
+            overhead_labels,
+            [traced[label] - untraced[label] for label in overhead_labels],
+            y_axis_label="Traced - Untraced Latency (nanoseconds)")
+        self.ReportTraceBreakdown(bits, labels, trace)
+        if self._trace_output_dir:
+            trace_capture.SaveTrace(trace, self._trace_output_dir,
+                                    "%s_latency_%sbits" % (self._name, bits))
+        return trace
+
+    def ReportTraceBreakdown(self, bits, labels, trace):
+        """Uploads where the time of the traced round trips went.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            labels: list of strings, the message size labels.
+            trace: string, the ftrace text of the traced run.
+        """
+        binary, _ = self._command_func(bits, 1, "")
+        stats = ftrace_analyzer.AnalyzeTrace(
+            output_parser.IterLines(trace),
+            # The kernel truncates thread names to 15 characters.
+            binary.rsplit("/", 1)[-1][:15])
+        groups = ftrace_analyzer.GroupBySize(
+            stats, dict((label, threshold_profile.ParseSize(label))
+                        for label in labels
+                        if threshold_profile.ParseSize(label) is not None))
+        breakdown_labels = [label for label in labels if label in groups]
+        if not breakdown_labels:
+            logging.warning("No binder round trip found in the trace.")
+            return
+        for component in ftrace_analyzer.COMPONENTS:
+            self._AddVector(
+                "%s_ns_%sbits" % (component, bits),
+                breakdown_labels,
+                [groups[label].GetMean(component)
+                 for label in breakdown_labels],
+                y_axis_label="Roundtrip %s RPC Latency - %s "
+                             "(nanoseconds)" % (
+                                 self._rpc_name,
+                                 component.replace("_", " ").capitalize()))
+
+    def RunBinary(self, bits, repetitions=1, with_iterations=False,
+                  extra_args="", placement=None):
+        """Runs the native binary, between two noise probes if enabled.
+
+        Takes the arguments and returns the samples of RunBinaryOnce. In
+        noise probe mode a run measured under noise runs again, and the
+        noise score of the kept run is added to self._noise_scores.
+        """
+        if not self._noise:
+            return self.RunBinaryOnce(bits, repetitions, with_iterations,
+                                      extra_args, placement)
+        samples, score = self._noise.Run(
+            lambda: self.RunBinaryOnce(bits, repetitions, with_iterations,
+                                       extra_args, placement))
+        self._noise_scores.append(score)
+        return samples
+
+    def RunBinaryOnce(self, bits, repetitions=1, with_iterations=False,
+                      extra_args="", placement=None):
+        """Runs the native binary and parses its result.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            repetitions: integer, the Google Benchmark repetitions to run.
+            with_iterations: bool, whether to add the iteration count of
+                             each repetition to the tuples.
+            extra_args: string, extra command line arguments of the binary.
+            placement: cpu_placement.Placement to pin the client and the
+                       server with, or None to let the scheduler place them.
+
+        Returns:
+            a list of (label, latency in nanoseconds) tuples, or of
+            (label, latency in nanoseconds, iterations) tuples if
+            with_iterations is set, one per benchmark and repetition.
+        """
+        # Runs the benchmark.
+        logging.info("Start to run the benchmark (%s bit mode)", bits)
+        binary, command = self._command_func(bits, repetitions, extra_args)
+        if placement:
+            command = cpu_placement.PinCommand(command, placement)
+        if self._pacer:
+            self._pacer.Pace()
+        failure = "%s failed" % self._test.__class__.__name__
+        sampler = cpu_cost.CreateSampler(self._test, self._dut, binary)
+        cost = None
+
+        if self._transport:
+            self._dut.shell.one.Execute("chmod 755 %s" % binary)
+            if sampler:
+                sampler.Start()
+            name = "%s_latency_%sbits.json" % (self._name, bits)
+            stop = sampler.Stop if sampler else None
+            with self._transport.Run(command, name, stop) as result_file:
+                if sampler:
+                    cost = sampler.cost
+                logging.info("summary: %s", result_file.summary)
+                exit_code = result_file.exit_code
+                stdout = result_file.Read()
+        elif sampler:
+            self._dut.shell.one.Execute("chmod 755 %s" % binary)
+            sampler.Start()
+            results = self._dut.shell.one.Execute(command)
+            cost = sampler.Stop()
+            logging.info("stderr: %s", results[const.STDERR][0])
+            logging.info("stdout: %s", results[const.STDOUT][0])
+            exit_code = results[const.EXIT_CODE][0]
+            stdout = results[const.STDOUT][0]
+        else:
+            results = self._dut.shell.one.Execute(["chmod 755 %s" % binary,
+                                                   command])
+            asserts.assertEqual(len(results[const.STDOUT]), 2)
+            logging.info("stderr: %s", results[const.STDERR][1])
+            logging.info("stdout: %s", results[const.STDOUT][1])
+            exit_code = any(results[const.EXIT_CODE])
+            stdout = results[const.STDOUT][1]
+
+        # Parses the result.
+        asserts.assertFalse(exit_code, "%s." % failure)
+        if self._pacer:
+            self._thermal_readings.append(self._pacer.Read())
+        try:
+            samples = output_parser.ParseGoogleBenchmarkSamples(
+                stdout, with_iterations or sampler is not None)
+        except output_parser.ParseError as e:
+            asserts.fail("%s: %s" % (failure, e))
+        if sampler:
+            self._cpu_costs.append((cost or cpu_cost.CpuCost(),
+                                    sum(sample[2] for sample in samples)))
+            if not with_iterations:
+                samples = [sample[:2] for sample in samples]
+        return samples
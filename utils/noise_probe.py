@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Background noise of a device around the benchmark data points.
+
+One probe is a single shell command on the device which takes a snapshot
+of /proc/uptime and the 'intr' and 'procs_running' lines of /proc/stat,
+runs a timer loop which prints a nanosecond timestamp and sleeps for a
+fixed interval, and takes a second snapshot. Like cyclictest, the loop
+measures how late the wakeups are: the jitter is the latest interval
+minus the median one, so the constant cost of the loop itself cancels.
+
+The noise score of a probe is its worst metric in percent of that
+metric's limit; a score of NOISY_SCORE or more means a noisy device.
+"""
+
+import collections
+import logging
+import time
+
+# the noise score at which a device is too noisy to measure.
+NOISY_SCORE = 100
+
+_SNAPSHOT_MARKER = "@@snapshot"
+
+# prints a snapshot, the timer loop and another snapshot.
+_PROBE_COMMAND = (
+    "s() { echo %(marker)s; cat /proc/uptime; "
+    "grep -E '^(intr|procs_running) ' /proc/stat; }; "
+    "s; i=0; while [ $i -lt %(samples)s ]; do date +%%s%%N; "
+    "sleep %(interval)s; i=$((i+1)); done; date +%%s%%N; s; true")
+
+NoiseReading = collections.namedtuple(
+    "NoiseReading", ["jitter_us", "irq_per_second", "run_queue"])
+
+
+def IsNoisy(score):
+    """Returns whether a noise score is too high to trust a data point."""
+    return score is not None and score >= NOISY_SCORE
+
+
+def ParseProbeOutput(text):
+    """Parses the output of one probe.
+
+    Args:
+        text: string, the output of the probe command.
+
+    Returns:
+        NoiseReading where a metric the device does not expose is None,
+        e.g. the jitter if date does not print nanoseconds.
+    """
+    snapshots = []
+    timestamps = []
+    for line in text.splitlines():
+        tokens = line.split()
+        if not tokens:
+            continue
+        if tokens[0] == _SNAPSHOT_MARKER:
+            snapshots.append({})
+        elif len(tokens) == 1 and tokens[0].isdigit() and len(tokens[0]) > 12:
+            timestamps.append(int(tokens[0]))
+        elif not snapshots:
+            continue
+        elif tokens[0] == "intr" and len(tokens) > 1:
+            snapshots[-1]["intr"] = int(tokens[1])
+        elif tokens[0] == "procs_running" and len(tokens) == 2:
+            snapshots[-1]["procs_running"] = int(tokens[1])
+        elif ("uptime" not in snapshots[-1] and
+              tokens[0].replace(".", "", 1).isdigit()):
+            snapshots[-1]["uptime"] = float(tokens[0])
+
+    jitter_us = None
+    elapsed_secs = 0
+    if len(timestamps) > 2:
+        intervals = sorted(later - earlier for earlier, later in
+                           zip(timestamps, timestamps[1:]))
+        jitter_us = (intervals[-1] - intervals[len(intervals) // 2]) // 1000
+        elapsed_secs = (timestamps[-1] - timestamps[0]) / 1e9
+    irq_per_second = None
+    run_queue = None
+    if len(snapshots) >= 2:
+        first, last = snapshots[0], snapshots[-1]
+        if not elapsed_secs and "uptime" in first and "uptime" in last:
+            elapsed_secs = last["uptime"] - first["uptime"]
+        if elapsed_secs > 0 and "intr" in first and "intr" in last:
+            irq_per_second = int((last["intr"] - first["intr"]) /
+                                 elapsed_secs)
+        running = [snapshot["procs_running"] for snapshot in snapshots
+                   if "procs_running" in snapshot]
+        if running:
+            # The probe itself is always running.
+            run_queue = max(0, max(running) - 1)
+    return NoiseReading(jitter_us, irq_per_second, run_queue)
+
+
+class NoiseProbe(object):
+    """Probes the background noise before and after each data point.
+
+    Attributes:
+        exclude_noisy: bool, whether the data points measured under noise
+                       are left out of the threshold checks.
+        _dut: the AndroidDevice to probe.
+        _limits: NoiseReading of the highest quiet value of each metric,
+                 where 0 or None does not limit the metric.
+        _samples: integer, the number of wakeups of the timer loop.
+        _interval_secs: float, the sleep of the timer loop.
+        _max_retries: integer, the waits and reruns allowed per data point.
+        _retry_delay_secs: float, the wait for a noisy device to settle.
+    """
+
+    def __init__(self, dut, limits, samples=100, interval_secs=0.001,
+                 max_retries=2, retry_delay_secs=5, exclude_noisy=False):
+        self.exclude_noisy = exclude_noisy
+        self._dut = dut
+        self._limits = limits
+        self._samples = samples
+        self._interval_secs = interval_secs
+        self._max_retries = max_retries
+        self._retry_delay_secs = retry_delay_secs
+
+    def Read(self):
+        """Probes the device once.
+
+        Returns:
+            NoiseReading.
+        """
+        reading = ParseProbeOutput(self._dut.adb.shell(_PROBE_COMMAND % {
+            "marker": _SNAPSHOT_MARKER,
+            "samples": self._samples,
+            "interval": self._interval_secs}))
+        logging.debug("Noise: %s", reading)
+        return reading
+
+    def Score(self, reading):
+        """Returns the noise score of a reading.
+
+        Args:
+            reading: NoiseReading.
+
+        Returns:
+            integer, the highest metric in percent of its limit.
+        """
+        ratios = [float(value) / limit
+                  for value, limit in zip(reading, self._limits)
+                  if value is not None and limit]
+        return int(100 * max(ratios)) if ratios else 0
+
+    def Run(self, function):
+        """Runs one data point between two probes.
+
+        Before the data point, a noisy device is given time to settle. A
+        data point whose probe after the run is noisy runs again. Both
+        share the max_retries budget.
+
+        Args:
+            function: the callable which measures the data point.
+
+        Returns:
+            a tuple of the result of function and the noise score of the
+            kept run, the higher score of the probes before and after it.
+        """
+        retries = self._max_retries
+        before = self.Score(self.Read())
+        while True:
+            while IsNoisy(before) and retries:
+                logging.info("Noise score %s; waiting %s seconds.", before,
+                             self._retry_delay_secs)
+                time.sleep(self._retry_delay_secs)
+                retries -= 1
+                before = self.Score(self.Read())
+            result = function()
+            after = self.Score(self.Read())
+            score = max(before, after)
+            if not IsNoisy(score) or not retries:
+                break
+            logging.info("Noise score %s during the data point; running it "
+                         "again.", score)
+            retries -= 1
+            before = after
+        if IsNoisy(score):
+            logging.warning("Data point measured under noise score %s.",
+                            score)
+        return result, score
+
+
+def CreateProbe(test, dut):
+    """Returns a NoiseProbe if the noise_probe_mode user param is set.
+
+    Args:
+        test: BaseTestClass instance, used to read the user params.
+        dut: the AndroidDevice to probe.
+
+    Returns:
+        NoiseProbe, or None if noise probing is disabled.
+    """
+    if not test.getUserParam("noise_probe_mode", default_value=False):
+        return None
+    limits = NoiseReading(
+        int(test.getUserParam("noise_max_jitter_us", default_value=1000)),
+        int(test.getUserParam("noise_max_irq_per_second",
+                              default_value=10000)),
+        int(test.getUserParam("noise_max_run_queue", default_value=2)))
+    return NoiseProbe(
+        dut, limits,
+        int(test.getUserParam("noise_samples", default_value=100)),
+        float(test.getUserParam("noise_interval_secs", default_value=0.001)),
+        int(test.getUserParam("noise_max_retries", default_value=2)),
+        float(test.getUserParam("noise_retry_delay_secs", default_value=5)),
+        test.getUserParam("noise_exclude_noisy", default_value=False))
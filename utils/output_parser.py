@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+import re
+
+# an example is 'iterations per sec: 34868.7'
+_ITERATIONS_PATTERN = re.compile(
+    r"iterations per sec:\s*([-+.eE0-9]+)")
+# an example is 'average:0.0542985ms worst:0.314584ms best:0.02651ms'
+_STATS_PATTERN = re.compile(r"(average|worst|best):\s*([-+.eE0-9]+)ms")
+# an example is '50%: 0.05 90%: 0.07 95%: 0.08 99%: 0.15'
+_PERCENTILE_PATTERN = re.compile(r"(\d+)%:\s*([-+.eE0-9]+)")
+# Google Benchmark appends this to the names of repeated benchmarks.
+_REPEATS_PATTERN = re.compile(r"/repeats:\d+$")
+# a raw latency sample line holds nothing but numbers, e.g. '51234 49870'
+# and is only taken as such between the sample block markers below.
+_SAMPLE_LINE_PATTERN = re.compile(r"^\s*[.0-9]+(\s+[.0-9]+)*\s*$")
+# an example is 'Average time to read 64bytes: 124ns'
+_FMQ_LATENCY_PATTERN = re.compile(
+    r"^Average time to (read|write)\s*(\d+)\s*bytes:\s*(\d+)\s*ns")
+
+_PERCENTILES = (50, 90, 95, 99)
+_NS_PER_MS = 1000000
+
+# the default lines which enclose the raw latency samples.
+SAMPLE_BLOCK_BEGIN = "latency samples begin"
+SAMPLE_BLOCK_END = "latency samples end"
+
+
+class ParseError(Exception):
+    """Raised when a benchmark output is truncated or malformed."""
+
+
+def IterLines(text):
+    """Yields the lines of a string without copying it into a list.
+
+    Args:
+        text: string, the whole output of a command.
+
+    Yields:
+        each line without its trailing newline.
+    """
+    start = 0
+    while True:
+        end = text.find("\n", start)
+        if end < 0:
+            if start < len(text):
+                yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+def _MsToNs(value):
+    """Converts a millisecond string to integer nanoseconds."""
+    return int(float(value) * _NS_PER_MS)
+
+
+class ThroughputResult(object):
+    """The result of one binderThroughputTest or hwbinderThroughputTest run.
+
+    Attributes:
+        iterations_per_second: integer, the RPC iterations per second.
+        time_average: integer, the average RPC time in nanoseconds.
+        time_worst: integer, the worst RPC time in nanoseconds.
+        time_best: integer, the best RPC time in nanoseconds.
+        time_percentile: dict which maps 50, 90, 95 and 99 to the RPC time
+                         percentiles in nanoseconds.
+        iterations: integer, the RPC iterations whose latency samples the
+                    binary printed, or None if the samples were not read.
+    """
+
+    def __init__(self, iterations_per_second, time_average, time_worst,
+                 time_best, time_percentile, iterations=None):
+        self.iterations_per_second = iterations_per_second
+        self.time_average = time_average
+        self.time_worst = time_worst
+        self.time_best = time_best
+        self.time_percentile = time_percentile
+        self.iterations = iterations
+
+    def ToDict(self):
+        """Returns the result as a dict keyed by the attribute names."""
+        return {
+            "iterations_per_second": self.iterations_per_second,
+            "time_average": self.time_average,
+            "time_worst": self.time_worst,
+            "time_best": self.time_best,
+            "time_percentile": dict(self.time_percentile),
+        }
+
+
+class ThroughputOutputParser(object):
+    """Single-pass parser for the throughput benchmark output.
+
+    Lines are fed one at a time so the output never has to be buffered. Only
+    the first occurrence of each statistic is used. If a sample sink is
+    given, the per-transaction latency samples printed by the binary are
+    recorded into it as they stream by. Samples are only read between a
+    sample_begin and a sample_end line, so numbers printed elsewhere are
+    never taken for samples.
+
+    Attributes:
+        _iterations_per_second: integer or None if not seen yet.
+        _stats: dict which maps 'average', 'worst' and 'best' to nanoseconds.
+        _percentiles: dict which maps a percentile to nanoseconds.
+        _sample_histogram: object with a Record(value) method, such as a
+                           LatencyHistogram or a steady_state
+                           IntervalRecorder, which receives the raw
+                           samples, or None to ignore them.
+        _sample_unit_ns: number, the nanoseconds per unit of a raw sample.
+        _sample_begin: string, the line which opens a sample block.
+        _sample_end: string, the line which closes a sample block.
+        _in_samples: bool, whether the last line was inside a sample block.
+        _sample_count: integer, the samples recorded so far, or None if no
+                       sample block was read.
+    """
+
+    def __init__(self, sample_histogram=None, sample_unit_ns=1,
+                 sample_begin=SAMPLE_BLOCK_BEGIN,
+                 sample_end=SAMPLE_BLOCK_END):
+        self._iterations_per_second = None
+        self._stats = {}
+        self._percentiles = {}
+        self._sample_histogram = sample_histogram
+        self._sample_unit_ns = sample_unit_ns
+        self._sample_begin = sample_begin
+        self._sample_end = sample_end
+        self._in_samples = False
+        self._sample_count = None
+
+    def ParseLine(self, line):
+        """Consumes one line of the output.
+
+        Args:
+            line: string, a line of the benchmark stdout.
+
+        Raises:
+            ParseError if a line of a sample block is not a sample line.
+        """
+        if self._in_samples:
+            if line.strip() == self._sample_end:
+                self._in_samples = False
+            elif line.strip() and self._sample_histogram is not None:
+                if not _SAMPLE_LINE_PATTERN.match(line):
+                    raise ParseError("Malformed latency sample line: %r" %
+                                     line)
+                for sample in line.split():
+                    self._sample_histogram.Record(
+                        float(sample) * self._sample_unit_ns)
+                    self._sample_count += 1
+            return
+        if line.strip() == self._sample_begin:
+            self._in_samples = True
+            if self._sample_count is None:
+                self._sample_count = 0
+            return
+        if self._iterations_per_second is None:
+            match = _ITERATIONS_PATTERN.search(line)
+            if match:
+                self._iterations_per_second = int(float(match.group(1)))
+                return
+        if not self._stats:
+            stats = dict((name, _MsToNs(value)) for name, value in
+                         _STATS_PATTERN.findall(line))
+            if stats:
+                self._stats = stats
+                return
+        if not self._percentiles:
+            self._percentiles = dict(
+                (int(percentile), _MsToNs(value)) for percentile, value in
+                _PERCENTILE_PATTERN.findall(line))
+
+    def Finish(self):
+        """Returns the parsed result.
+
+        Returns:
+            a ThroughputResult.
+
+        Raises:
+            ParseError if any statistic is missing from the output.
+        """
+        missing = []
+        if self._in_samples:
+            missing.append(self._sample_end)
+        if self._iterations_per_second is None:
+            missing.append("iterations per sec")
+        missing.extend(name for name in ("average", "worst", "best")
+                       if name not in self._stats)
+        missing.extend("%s%%" % percentile for percentile in _PERCENTILES
+                       if percentile not in self._percentiles)
+        if missing:
+            raise ParseError("Truncated throughput benchmark output, "
+                             "missing: %s" % ", ".join(missing))
+        return ThroughputResult(
+            self._iterations_per_second, self._stats["average"],
+            self._stats["worst"], self._stats["best"],
+            dict((percentile, self._percentiles[percentile])
+                 for percentile in _PERCENTILES),
+            self._sample_count if self._sample_histogram is not None
+            else None)
+
+
+def ParseThroughputOutput(lines, sample_histogram=None, sample_unit_ns=1,
+                          sample_begin=SAMPLE_BLOCK_BEGIN,
+                          sample_end=SAMPLE_BLOCK_END):
+    """Parses the output of a throughput benchmark.
+
+    Args:
+        lines: iterable of strings, e.g. IterLines(stdout) or a pipe.
+        sample_histogram: see ThroughputOutputParser.
+        sample_unit_ns: see ThroughputOutputParser.
+        sample_begin: see ThroughputOutputParser.
+        sample_end: see ThroughputOutputParser.
+
+    Returns:
+        a ThroughputResult.
+
+    Raises:
+        ParseError if the output is truncated or a sample block is
+        malformed.
+    """
+    parser = ThroughputOutputParser(sample_histogram, sample_unit_ns,
+                                    sample_begin, sample_end)
+    for line in lines:
+        parser.ParseLine(line)
+    return parser.Finish()
+
+
+class FmqLatencyResult(object):
+    """The average read and write latencies reported by mq_benchmark_client.
+
+    Attributes:
+        read_labels: list of strings, the message sizes in bytes.
+        read_latencies: list of integers, the read latencies in nanoseconds.
+        write_labels: list of strings, the message sizes in bytes.
+        write_latencies: list of integers, the write latencies in
+                         nanoseconds.
+    """
+
+    def __init__(self):
+        self.read_labels = []
+        self.read_latencies = []
+        self.write_labels = []
+        self.write_latencies = []
+
+
+def ParseFmqOutput(lines):
+    """Parses the 'Average time to read/write' lines of the FMQ client.
+
+    Args:
+        lines: iterable of strings, e.g. IterLines(stdout) or a pipe.
+
+    Returns:
+        a FmqLatencyResult.
+
+    Raises:
+        ParseError if the output contains no latency at all.
+    """
+    result = FmqLatencyResult()
+    for line in lines:
+        match = _FMQ_LATENCY_PATTERN.match(line.strip())
+        if not match:
+            continue
+        operation, size, latency = match.groups()
+        if operation == "read":
+            result.read_labels.append(size)
+            result.read_latencies.append(int(latency))
+        else:
+            result.write_labels.append(size)
+            result.write_latencies.append(int(latency))
+    if not result.read_labels and not result.write_labels:
+        raise ParseError("No FMQ latency found in the benchmark output.")
+    return result
+
+
+def ParseGoogleBenchmarkSamples(json_string, with_iterations=False):
+    """Parses the real time of every run in a Google Benchmark JSON output.
+
+    Aggregates such as '_mean' and '_stddev', which Google Benchmark adds
+    when repetitions are enabled, are skipped so each repetition yields its
+    own sample.
+
+    Args:
+        json_string: string, the --benchmark_format=json output.
+        with_iterations: bool, whether to add the iteration count of each
+                         run to the tuples.
+
+    Returns:
+        a list of (label, real_time) tuples where label is the benchmark
+        argument, e.g. '2k', and real_time is an integer, or of
+        (label, real_time, iterations) tuples if with_iterations is set.
+
+    Raises:
+        ParseError if the output is not a Google Benchmark JSON document.
+    """
+    try:
+        benchmarks = json.loads(json_string)["benchmarks"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ParseError("Invalid Google Benchmark output: %s" % e)
+    samples = []
+    for benchmark in benchmarks:
+        name = _REPEATS_PATTERN.sub("", benchmark["name"])
+        if benchmark.get("run_type") == "aggregate" or name.endswith(
+                ("_mean", "_median", "_stddev", "_cv")):
+            continue
+        tokens = name.split("/", 1)
+        label = str(tokens[1]) if len(tokens) >= 2 else ""
+        if with_iterations:
+            samples.append((label, int(benchmark["real_time"]),
+                            int(benchmark["iterations"])))
+        else:
+            samples.append((label, int(benchmark["real_time"])))
+    if not samples:
+        raise ParseError("No benchmark found in the Google Benchmark output.")
+    return samples
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""A stopped-framework window shared by consecutive performance modules.
+
+Every module runs in its own host process, so the reference count of a
+session lives in a lease file on the device, one line of:
+
+    <session id> <boot id> <modules left> <expiry, device epoch seconds>
+
+The first module of a session stops the framework and writes the lease
+with the number of modules in the session. Each later module joins the
+window instead of stopping the framework again, and each module leaves it
+in tearDownClass. The last module restarts the framework. A failed module
+restarts it at once, and the next module of the session stops it again.
+A lease of another session or of an older boot is stale and ignored.
+
+The module count is only configuration, so a module which never runs
+would leave the framework stopped. Every Join and Leave therefore renews
+the lease for quiesce_session_lease_secs, and a watchdog on the device
+removes an expired lease and restarts the framework. Whether the
+framework is stopped is read from sys.boot_completed, not from the lease.
+"""
+
+import logging
+
+# the device file of the lease.
+DEFAULT_LEASE_PATH = "/data/local/tmp/vts_quiesce_lease"
+
+# seconds after the last Join or Leave until the watchdog closes a session.
+DEFAULT_LEASE_SECS = 2 * 60 * 60
+
+# seconds between two lease checks of the watchdog.
+_WATCHDOG_PERIOD_SECS = 30
+
+_BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+
+
+class QuiesceSession(object):
+    """Stops the Android framework for one or more modules.
+
+    Attributes:
+        _dut: the AndroidDevice to quiesce.
+        _session_id: string, the id shared by the modules of the session,
+                     or empty if the module does not share its window.
+        _modules: integer, the number of modules in the session.
+        _lease_path: string, the device file of the lease.
+        _lease_secs: integer, the seconds a Join or Leave renews the lease
+                     for.
+        _boot_id: string, the boot id of the device when it was joined.
+        _joined: bool, whether this module holds a reference.
+    """
+
+    def __init__(self, dut, session_id="", modules=1,
+                 lease_path=DEFAULT_LEASE_PATH, lease_secs=DEFAULT_LEASE_SECS):
+        self._dut = dut
+        self._session_id = session_id
+        self._modules = modules
+        self._lease_path = lease_path
+        self._lease_secs = lease_secs
+        self._boot_id = None
+        self._joined = False
+
+    def _Shell(self, command):
+        """Runs an adb shell command and returns its stripped stdout."""
+        return self._dut.adb.shell(command).strip()
+
+    def _ReadLease(self):
+        """Returns the number of modules left in this session, or None.
+
+        None means there is no lease of this session on the device, e.g.
+        because the watchdog closed it.
+        """
+        tokens = self._Shell("cat %s 2>/dev/null; true" %
+                             self._lease_path).split()
+        if (len(tokens) != 4 or tokens[0] != self._session_id or
+                tokens[1] != self._boot_id or not tokens[2].isdigit()):
+            return None
+        return int(tokens[2])
+
+    def _WriteLease(self, modules_left):
+        """Writes the lease of this session, which expires in lease_secs."""
+        self._Shell("echo \"%s %s %s $(($(date +%%s) + %s))\" > %s" % (
+            self._session_id, self._boot_id, modules_left, self._lease_secs,
+            self._lease_path))
+
+    def _StartWatchdog(self):
+        """Starts a device process which closes the session once expired.
+
+        The process exits when the lease is removed or replaced by the
+        lease of another session.
+        """
+        self._Shell(
+            "nohup sh -c 'while sleep %s; do "
+            "set -- $(cat %s 2>/dev/null); "
+            "[ \"$1 $2\" = \"%s %s\" ] || exit 0; "
+            "if [ $(date +%%s) -ge \"$4\" ]; then "
+            "rm -f %s; start; exit 0; fi; done' >/dev/null 2>&1 &" % (
+                _WATCHDOG_PERIOD_SECS, self._lease_path, self._session_id,
+                self._boot_id, self._lease_path))
+
+    def _IsStopped(self):
+        """Returns whether the framework is stopped, see _Stop."""
+        return self._Shell("getprop sys.boot_completed") != "1"
+
+    def _Stop(self):
+        """Stops the framework."""
+        self._Shell("stop")
+        self._Shell("setprop sys.boot_completed 0")
+
+    def _Start(self):
+        """Starts the framework and waits until it booted."""
+        self._Shell("start")
+        self._dut.waitForBootCompletion()
+
+    def Join(self, reboot=False):
+        """Stops the framework unless it is already stopped for the session.
+
+        Args:
+            reboot: bool, whether to reboot the device without restarting
+                    the VTS services before a new window is opened.
+        """
+        self._joined = True
+        if not self._session_id:
+            if reboot:
+                self._dut.reboot(False)
+            self._Stop()
+            return
+        self._boot_id = self._Shell("cat %s" % _BOOT_ID_PATH)
+        modules_left = self._ReadLease()
+        if modules_left is None:
+            if reboot:
+                self._dut.reboot(False)
+                self._boot_id = self._Shell("cat %s" % _BOOT_ID_PATH)
+            modules_left = self._modules
+            logging.info("Opening quiesce session %s of %s modules.",
+                         self._session_id, self._modules)
+            self._WriteLease(modules_left)
+            self._StartWatchdog()
+        else:
+            logging.info("Joining quiesce session %s, %s modules left.",
+                         self._session_id, modules_left)
+            self._WriteLease(modules_left)
+        if not self._IsStopped():
+            self._Stop()
+
+    def Leave(self, failed=False):
+        """Drops the reference of this module.
+
+        The framework is restarted if this is the last module of the
+        session, the module does not share its window, it failed, or the
+        lease expired.
+
+        Args:
+            failed: bool, whether a test of the module failed.
+        """
+        if not self._joined:
+            return
+        self._joined = False
+        if not self._session_id:
+            self._Start()
+            return
+        modules_left = self._ReadLease()
+        if modules_left is None:
+            logging.warning("Lost the lease of quiesce session %s; "
+                            "restarting the framework.", self._session_id)
+            self._Start()
+            return
+        modules_left -= 1
+        if modules_left <= 0:
+            logging.info("Closing quiesce session %s.", self._session_id)
+            self._Shell("rm -f %s" % self._lease_path)
+            self._Start()
+            return
+        if failed:
+            logging.info("Restarting the framework of quiesce session %s "
+                         "after a failure.", self._session_id)
+            self._Start()
+        self._WriteLease(modules_left)
+
+
+def CreateSession(test, dut):
+    """Returns the QuiesceSession configured by the user params.
+
+    The modules of a session share the quiesce_session_id user param and
+    set quiesce_session_modules to the number of modules in the session.
+    quiesce_session_lease_secs must exceed the longest module plus the gap
+    between two modules. Without quiesce_session_id, the module stops and
+    restarts the framework on its own.
+
+    Args:
+        test: BaseTestClass instance, used to read the user params.
+        dut: the AndroidDevice to quiesce.
+
+    Returns:
+        QuiesceSession.
+    """
+    return QuiesceSession(
+        dut, str(test.getUserParam("quiesce_session_id", default_value="")),
+        int(test.getUserParam("quiesce_session_modules", default_value=1)),
+        lease_secs=int(test.getUserParam("quiesce_session_lease_secs",
+                                         default_value=DEFAULT_LEASE_SECS)))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import math
+
+# two-sided 95% Student's t quantiles indexed by the degrees of freedom.
+_T_95 = [
+    None, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262,
+    2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093,
+    2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045,
+    2.042
+]
+_Z_95 = 1.960
+
+PASS = "pass"
+FAIL = "fail"
+UNDECIDED = "undecided"
+
+
+class LabelStats(object):
+    """Statistics of the repeated measurements of one label.
+
+    Attributes:
+        count: integer, the number of samples.
+        mean: float, the sample mean.
+        stddev: float, the sample standard deviation.
+        ci_low: float, the lower bound of the 95% confidence interval.
+        ci_high: float, the upper bound of the 95% confidence interval.
+    """
+
+    def __init__(self, samples):
+        self.count = len(samples)
+        self.mean = float(sum(samples)) / self.count
+        if self.count > 1:
+            variance = sum((sample - self.mean) ** 2
+                           for sample in samples) / (self.count - 1)
+            self.stddev = math.sqrt(variance)
+            df = self.count - 1
+            t = _T_95[df] if df < len(_T_95) else _Z_95
+            half_width = t * self.stddev / math.sqrt(self.count)
+        else:
+            # A single sample is taken at face value.
+            self.stddev = 0.0
+            half_width = 0.0
+        self.ci_low = self.mean - half_width
+        self.ci_high = self.mean + half_width
+
+    def GetVerdict(self, threshold):
+        """Compares the confidence interval with an upper limit.
+
+        Args:
+            threshold: number, the value the measurement must stay below.
+
+        Returns:
+            PASS if the whole interval is below the threshold, FAIL if the
+            whole interval is at or above it, UNDECIDED otherwise.
+        """
+        if self.ci_high < threshold:
+            return PASS
+        if self.ci_low >= threshold:
+            return FAIL
+        return UNDECIDED
+
+    def IsBelowThreshold(self, threshold):
+        """Returns whether the measurement passes an upper limit.
+
+        The verdict is taken from the confidence interval. If the interval
+        still straddles the threshold, the mean decides.
+
+        Args:
+            threshold: number, the value the measurement must stay below.
+        """
+        verdict = self.GetVerdict(threshold)
+        if verdict == UNDECIDED:
+            logging.warning("%s is not clearly below or above %s.", self,
+                            threshold)
+            return self.mean < threshold
+        return verdict == PASS
+
+    def __str__(self):
+        if self.count == 1:
+            return "%d" % self.mean
+        return "%.1f +/- %.1f (95%% CI [%.1f, %.1f], n=%s)" % (
+            self.mean, self.stddev, self.ci_low, self.ci_high, self.count)
+
+
+class RepetitionEngine(object):
+    """Repeats a benchmark until every threshold verdict is clear.
+
+    Attributes:
+        _measure_func: function which runs the benchmark once and returns a
+                       list of (label, value) tuples. A label may appear
+                       several times, e.g. with Google Benchmark repetitions.
+        _threshold_func: function which takes a label and returns its
+                         threshold, or None if the label is not checked.
+        _min_samples: integer, the samples per label needed for a verdict.
+        _max_runs: integer, the maximum number of calls to _measure_func.
+    """
+
+    def __init__(self, measure_func, threshold_func, max_runs, min_samples=3):
+        if max_runs < 1:
+            raise ValueError("max_runs must be positive, got %s." % max_runs)
+        self._measure_func = measure_func
+        self._threshold_func = threshold_func
+        self._min_samples = max(2, min_samples)
+        self._max_runs = max_runs
+
+    def Run(self):
+        """Runs the benchmark repeatedly.
+
+        Returns:
+            a tuple of the ordered label list and a dict which maps each
+            label to the list of its samples.
+        """
+        labels = []
+        samples = {}
+        for run in range(1, self._max_runs + 1):
+            for label, value in self._measure_func():
+                if label not in samples:
+                    labels.append(label)
+                    samples[label] = []
+                samples[label].append(value)
+
+            undecided = []
+            for label in labels:
+                threshold = self._threshold_func(label)
+                if len(samples[label]) < self._min_samples or (
+                        threshold is not None and
+                        LabelStats(samples[label]).GetVerdict(threshold) ==
+                        UNDECIDED):
+                    undecided.append(label)
+            logging.info("Run %s: undecided labels %s", run, undecided)
+            if not undecided:
+                break
+        return labels, samples
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+_BITS_PATTERN = re.compile(r"_(32|64)bits$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    timestamp REAL NOT NULL,
+    build_fingerprint TEXT NOT NULL,
+    device TEXT NOT NULL,
+    product TEXT NOT NULL,
+    bits INTEGER,
+    hal_mode TEXT NOT NULL,
+    name TEXT NOT NULL,
+    label TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_series ON results (
+    name, label, product, bits, hal_mode, timestamp);
+"""
+
+
+class ResultStore(object):
+    """A local SQLite store of labeled profiling vectors.
+
+    The store needs no network, so every run on a lab host can be kept and
+    analyzed offline, e.g. by change_point.FindRegressions.
+
+    Attributes:
+        _connection: sqlite3.Connection to the database file.
+        _lock: threading.Lock which serializes the writes.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def AddLabeledVector(self, name, labels, values, build_fingerprint,
+                         device, product, hal_mode=""):
+        """Stores a labeled vector.
+
+        Args:
+            name: string, the profiling data name, e.g.
+                  'binder_vector_roundtrip_latency_benchmark_64bits'.
+            labels: list of strings.
+            values: list of numbers, one per label.
+            build_fingerprint: string, ro.build.fingerprint of the device.
+            device: string, the device serial number.
+            product: string, ro.product.name of the device.
+            hal_mode: string, the HIDL HAL mode or '' if not applicable.
+        """
+        match = _BITS_PATTERN.search(name)
+        bits = int(match.group(1)) if match else None
+        now = time.time()
+        rows = [(now, build_fingerprint, device, product, bits, hal_mode,
+                 name, str(label), float(value))
+                for label, value in zip(labels, values)]
+        with self._lock:
+            self._connection.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._connection.commit()
+
+    def GetSeriesKeys(self):
+        """Returns every (name, label, product, bits, hal_mode) stored."""
+        return self._connection.execute(
+            "SELECT DISTINCT name, label, product, bits, hal_mode "
+            "FROM results ORDER BY name, label, product, bits, hal_mode"
+        ).fetchall()
+
+    def GetSeries(self, name, label, product, bits, hal_mode):
+        """Returns the history of one label, one point per build.
+
+        Args:
+            name: string, the profiling data name.
+            label: string, the label in the vector.
+            product: string, ro.product.name of the devices.
+            bits: integer or None.
+            hal_mode: string.
+
+        Returns:
+            a list of (build fingerprint, mean value) tuples ordered by the
+            time each build was first measured.
+        """
+        return self._connection.execute(
+            "SELECT build_fingerprint, AVG(value) FROM results "
+            "WHERE name = ? AND label = ? AND product = ? AND bits IS ? "
+            "AND hal_mode = ? GROUP BY build_fingerprint "
+            "ORDER BY MIN(timestamp)",
+            (name, label, product, bits, hal_mode)).fetchall()
+
+
+class RecordingWebFeature(object):
+    """Forwards the web feature calls and stores the labeled vectors.
+
+    Attributes:
+        _web: the wrapped WebFeature of the test class.
+        _store: ResultStore which receives a copy of each labeled vector.
+        _build_fingerprint: string, ro.build.fingerprint of the device.
+        _device: string, the device serial number.
+        _product: string, ro.product.name of the device.
+        _hal_mode: string, the HIDL HAL mode or ''.
+    """
+
+    def __init__(self, web, store, dut, hal_mode=""):
+        self._web = web
+        self._store = store
+        self._build_fingerprint = dut.adb.shell(
+            "getprop ro.build.fingerprint").strip()
+        self._device = dut.serial
+        self._product = dut.adb.shell("getprop ro.product.name").strip()
+        self._hal_mode = hal_mode
+
+    def AddProfilingDataLabeledVector(self, name, labels, values, **kwargs):
+        """Uploads a labeled vector and stores it locally.
+
+        Args:
+            name: string, the profiling data name.
+            labels: list of strings.
+            values: list of numbers.
+            **kwargs: the options of WebFeature.AddProfilingDataLabeledVector.
+        """
+        try:
+            self._store.AddLabeledVector(
+                name, labels, values, self._build_fingerprint, self._device,
+                self._product, self._hal_mode)
+        except sqlite3.Error as e:
+            logging.error("Failed to store %s: %s", name, e)
+        return self._web.AddProfilingDataLabeledVector(
+            name, labels, values, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._web, name)
+
+
+class HalModeWebFeature(object):
+    """Forwards the web feature calls with the HAL mode in each name.
+
+    When one module runs several HIDL modes, the mode is inserted before
+    the bitness suffix, e.g. 'hwbinder_throughput_time_best_ns_64bits'
+    becomes 'hwbinder_throughput_time_best_ns_passthrough_64bits', so the
+    vectors of the modes stay apart.
+
+    Attributes:
+        _web: the wrapped WebFeature of the test class.
+        _tag: string, the lower case HAL mode.
+    """
+
+    def __init__(self, web, hal_mode):
+        self._web = web
+        self._tag = hal_mode.lower()
+
+    def AddProfilingDataLabeledVector(self, name, labels, values, **kwargs):
+        """Uploads a labeled vector under the name tagged with the mode."""
+        match = _BITS_PATTERN.search(name)
+        if match:
+            name = "%s_%s%s" % (name[:match.start()], self._tag,
+                                match.group(0))
+        else:
+            name = "%s_%s" % (name, self._tag)
+        return self._web.AddProfilingDataLabeledVector(
+            name, labels, values, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._web, name)
+
+
+def WrapWebFeature(test, dut, hal_mode="", tag_hal_mode=False):
+    """Returns the web feature of a test, recording into the result store.
+
+    Args:
+        test: BaseTestClass instance whose web attribute is wrapped.
+        dut: the AndroidDevice the test runs on.
+        hal_mode: string, the HIDL HAL mode or ''.
+        tag_hal_mode: bool, whether to add hal_mode to the uploaded names,
+                      see HalModeWebFeature. The result store keeps the
+                      plain names since it has a column for the mode.
+
+    Returns:
+        RecordingWebFeature if the result_store_path user param is set,
+        test.web otherwise, wrapped by HalModeWebFeature if tag_hal_mode
+        is set.
+    """
+    web = test.web
+    if tag_hal_mode:
+        web = HalModeWebFeature(web, hal_mode)
+    path = test.getUserParam("result_store_path", default_value="")
+    if not path:
+        return web
+    logging.info("Storing the results in %s", path)
+    return RecordingWebFeature(web, ResultStore(path), dut, hal_mode)
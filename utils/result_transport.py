@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import contextlib
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+
+from vts.runners.host import const
+
+# the device directory of the result files.
+DEFAULT_REMOTE_DIR = "/data/local/tmp/vts_results"
+
+
+def IterMappedLines(path):
+    """Yields the lines of a file through a read-only memory map.
+
+    Only one line at a time is copied out of the map, so a file of
+    millions of samples is parsed without reading it into memory.
+
+    Args:
+        path: string, the local file.
+
+    Yields:
+        each line as a string without its trailing newline.
+    """
+    with open(path, "rb") as result_file:
+        if not os.fstat(result_file.fileno()).st_size:
+            return
+        mapped = mmap.mmap(result_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start = 0
+            size = mapped.size()
+            while start < size:
+                end = mapped.find(b"\n", start)
+                if end < 0:
+                    end = size
+                yield mapped[start:end].decode("utf-8", "replace")
+                start = end + 1
+        finally:
+            mapped.close()
+
+
+class ResultFile(object):
+    """The output of one command, pulled to the host.
+
+    Attributes:
+        summary: string, the last lines of the output.
+        exit_code: integer, the exit code of the command.
+        path: string, the local file of the whole output.
+    """
+
+    def __init__(self, summary, exit_code, path):
+        self.summary = summary
+        self.exit_code = exit_code
+        self.path = path
+
+    def Lines(self):
+        """Returns an iterator over the lines of the output."""
+        return IterMappedLines(self.path)
+
+    def Read(self):
+        """Returns the whole output as a string."""
+        with open(self.path, "rb") as result_file:
+            return result_file.read().decode("utf-8", "replace")
+
+
+class FileResultTransport(object):
+    """Moves the output of benchmark runs through files instead of stdout.
+
+    The command writes its output to a file on the device, the shell
+    channel only carries the last summary_lines lines, and the file is
+    pulled with adb in one bulk transfer.
+
+    Attributes:
+        _dut: the AndroidDevice to run on.
+        _remote_dir: string, the device directory of the result files.
+        _summary_lines: integer, the number of lines sent over the shell.
+        _local_dir: string, the host directory of the pulled files.
+    """
+
+    def __init__(self, dut, remote_dir=DEFAULT_REMOTE_DIR, summary_lines=20):
+        self._dut = dut
+        self._remote_dir = remote_dir
+        self._summary_lines = summary_lines
+        self._local_dir = tempfile.mkdtemp(prefix="vts_results_")
+        self._dut.shell.one.Execute("mkdir -p %s" % remote_dir)
+
+    def _Execute(self, command, remote_path):
+        """Runs a command with its output in remote_path.
+
+        Returns:
+            a tuple of the summary and the exit code.
+        """
+        results = self._dut.shell.one.Execute(
+            "{ %s; } > %s; code=$?; tail -n %s %s; [ $code -eq 0 ]" % (
+                command, remote_path, self._summary_lines, remote_path))
+        return results[const.STDOUT][0], results[const.EXIT_CODE][0]
+
+    def _Fetch(self, remote_path, local_path):
+        """Pulls a result file and removes it from the device."""
+        self._dut.adb.pull("%s %s" % (remote_path, local_path))
+        self._dut.shell.one.Execute("rm -f %s" % remote_path)
+
+    @contextlib.contextmanager
+    def Run(self, command, name, before_fetch=None):
+        """Runs a command and pulls its output.
+
+        Args:
+            command: string, the shell command line.
+            name: string, a file name unique within the transport.
+            before_fetch: function called without arguments once the command
+                          exited and before its output is pulled, e.g. to
+                          stop a sampler so the pull is not measured.
+
+        Yields:
+            ResultFile, whose local file is removed when the context exits.
+        """
+        remote_path = "%s/%s" % (self._remote_dir, name)
+        local_path = os.path.join(self._local_dir, name)
+        summary, exit_code = self._Execute(command, remote_path)
+        if before_fetch:
+            before_fetch()
+        try:
+            self._Fetch(remote_path, local_path)
+            logging.info("Pulled %s bytes of %s", os.path.getsize(local_path),
+                         name)
+            yield ResultFile(summary, exit_code, local_path)
+        finally:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+
+    def Close(self):
+        """Removes the host directory of the pulled files."""
+        shutil.rmtree(self._local_dir, ignore_errors=True)
+
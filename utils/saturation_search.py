@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+
+
+class SaturationSearchResult(object):
+    """The outcome of a saturation search.
+
+    Attributes:
+        results: dict which maps a thread count to its benchmark result.
+        knee_threads: integer, the smallest thread count whose throughput is
+                      within the tolerance of the peak.
+        peak_threads: integer, the thread count with the highest throughput.
+        peak_value: number, the highest throughput measured.
+        saturated: bool, whether the throughput stopped increasing within
+                   the measured thread counts. If not, the knee is only a
+                   lower bound of the saturation point.
+        budget_exhausted: bool, whether the run budget ran out before the
+                          throughput saturated or the largest thread
+                          count was measured.
+    """
+
+    def __init__(self, results, knee_threads, peak_threads, peak_value,
+                 saturated=True, budget_exhausted=False):
+        self.results = results
+        self.knee_threads = knee_threads
+        self.peak_threads = peak_threads
+        self.peak_value = peak_value
+        self.saturated = saturated
+        self.budget_exhausted = budget_exhausted
+
+
+class SaturationSearch(object):
+    """Finds the thread count where the throughput stops increasing.
+
+    The search first doubles the thread count until the throughput stops
+    improving by more than the tolerance, so the flat tail is never
+    measured. The remaining run budget is then spent bisecting the gap with
+    the steepest throughput change, which is where the knee is.
+
+    Attributes:
+        _measure_func: function which takes a thread count and returns a
+                       benchmark result dict.
+        _key: string, the key of the throughput value in a result dict.
+        _min_threads: integer, the first thread count to measure.
+        _max_threads: integer, the largest thread count to measure.
+        _max_runs: integer, the run budget of the whole search.
+        _tolerance: float, the relative gain below which the throughput is
+                    considered saturated.
+        _results: dict which maps a thread count to its result.
+    """
+
+    def __init__(self, measure_func, min_threads, max_threads, max_runs,
+                 tolerance=0.05, key="iterations_per_second"):
+        if min_threads < 1 or max_threads < min_threads:
+            raise ValueError("Invalid thread range [%s, %s]." %
+                             (min_threads, max_threads))
+        if max_runs < 2:
+            raise ValueError("max_runs must be at least 2, got %s." %
+                             max_runs)
+        self._measure_func = measure_func
+        self._key = key
+        self._min_threads = min_threads
+        self._max_threads = max_threads
+        self._max_runs = max_runs
+        self._tolerance = tolerance
+        self._results = {}
+
+    def _Measure(self, threads):
+        """Runs the benchmark once and returns its throughput."""
+        if threads not in self._results:
+            self._results[threads] = self._measure_func(threads)
+            logging.info("%s threads: %s", threads,
+                         self._results[threads][self._key])
+        return self._results[threads][self._key]
+
+    def _IsGain(self, previous, current):
+        """Returns whether current is a significant gain over previous."""
+        return current > previous * (1 + self._tolerance)
+
+    def Run(self):
+        """Runs the search.
+
+        Returns:
+            a SaturationSearchResult.
+        """
+        # Coarse phase: double the thread count until it saturates.
+        threads = self._min_threads
+        best = self._Measure(threads)
+        saturated = None
+        while threads < self._max_threads and len(
+                self._results) < self._max_runs:
+            threads = min(threads * 2, self._max_threads)
+            value = self._Measure(threads)
+            if not self._IsGain(best, value):
+                saturated = threads
+                break
+            best = value
+        budget_exhausted = (saturated is None and
+                            threads < self._max_threads)
+        if budget_exhausted:
+            logging.warning(
+                "The run budget of %s ran out at %s threads before the "
+                "throughput saturated; the knee is a lower bound.",
+                self._max_runs, threads)
+        elif saturated is None:
+            logging.warning(
+                "The throughput still increased at %s threads; the knee is "
+                "a lower bound.", self._max_threads)
+
+        # Dense phase: split the gap with the steepest throughput change
+        # until the remaining gaps are flat or the budget is spent.
+        if saturated is not None:
+            while len(self._results) < self._max_runs:
+                peak = max(result[self._key]
+                           for result in self._results.values())
+                measured = sorted(t for t in self._results if t <= saturated)
+                gaps = []
+                for low, high in zip(measured, measured[1:]):
+                    change = abs(self._results[high][self._key] -
+                                 self._results[low][self._key])
+                    if high - low > 1 and change > peak * self._tolerance:
+                        gaps.append((change, low, high))
+                if not gaps:
+                    break
+                _, low, high = max(gaps)
+                self._Measure((low + high) // 2)
+
+        peak_threads = max(self._results,
+                           key=lambda t: self._results[t][self._key])
+        peak_value = self._results[peak_threads][self._key]
+        knee_threads = min(
+            t for t in self._results
+            if self._results[t][self._key] * (1 + self._tolerance) >=
+            peak_value)
+        logging.info("Saturation knee at %s threads, peak %s at %s threads",
+                     knee_threads, peak_value, peak_threads)
+        return SaturationSearchResult(dict(self._results), knee_threads,
+                                      peak_threads, peak_value,
+                                      saturated is not None, budget_exhausted)
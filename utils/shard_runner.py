@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import copy
+import logging
+import sys
+import threading
+
+
+class ShardedJobRunner(object):
+    """Runs independent benchmark jobs on a pool of devices.
+
+    Each device gets slots_per_device worker threads which pull the next
+    pending job, so faster devices take more jobs. A job can be replicated
+    on several distinct devices in order to measure the spread between
+    them. Jobs with the same conflict key never run at the same time on
+    one device.
+
+    Attributes:
+        _devices: list of AndroidDevice objects.
+        _replicas: integer, the number of distinct devices each job runs on.
+        _slots_per_device: integer, the number of workers per device.
+        _conflict_key: function which maps a job to a hashable key, or to
+                       None if the job conflicts with nothing.
+        _condition: threading.Condition which guards the job bookkeeping.
+        _pending: list of [job, remaining replicas, set of serials] lists.
+        _running: dict which maps a serial to the set of conflict keys of
+                  the jobs running on that device.
+        _results: dict which maps a job to a list of (serial, result).
+        _error: the first exc_info raised by a worker, or None.
+        _error_job: tuple of the job and the serial which raised _error.
+    """
+
+    def __init__(self, devices, replicas=1, slots_per_device=1,
+                 conflict_key=None):
+        if not devices:
+            raise ValueError("At least one device is required.")
+        if replicas < 1 or replicas > len(devices):
+            raise ValueError("replicas must be between 1 and %s, got %s." %
+                             (len(devices), replicas))
+        if slots_per_device < 1:
+            raise ValueError("slots_per_device must be positive.")
+        self._devices = devices
+        self._replicas = replicas
+        self._slots_per_device = slots_per_device
+        self._conflict_key = conflict_key or (lambda job: None)
+        self._condition = threading.Condition()
+        self._pending = []
+        self._running = {}
+        self._results = {}
+        self._error = None
+
+    def Run(self, jobs, run_func):
+        """Runs every job and returns the results.
+
+        Args:
+            jobs: list of hashable job descriptions, e.g. (bits, threads).
+            run_func: function which takes a device and a job, and returns
+                      the result of the job on that device.
+
+        Returns:
+            a dict which maps each job to a list of (serial, result) tuples,
+            one per replica.
+
+        Raises:
+            the first exception raised by run_func, once all workers stop.
+            Its worker traceback is logged first.
+        """
+        self._pending = [[job, self._replicas, set()] for job in jobs]
+        self._running = dict((device.serial, set())
+                             for device in self._devices)
+        self._results = dict((job, []) for job in jobs)
+        self._error = None
+        self._error_job = None
+
+        workers = [threading.Thread(target=self._Work, args=(device, run_func))
+                   for device in self._devices
+                   for _ in range(self._slots_per_device)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        if self._error:
+            # Re-raising drops the worker traceback on Python 2, so it is
+            # logged here.
+            logging.error("%s failed on %s", *self._error_job,
+                          exc_info=self._error)
+            raise self._error[1]
+        return self._results
+
+    def _NextJob(self, serial):
+        """Takes the next job which has not yet run on the given device.
+
+        Waits while the only jobs left conflict with running ones.
+
+        Args:
+            serial: string, the serial number of the requesting device.
+
+        Returns:
+            the job, or None if there is nothing left for this device.
+        """
+        with self._condition:
+            while not self._error:
+                blocked = False
+                for entry in self._pending:
+                    job, remaining, serials = entry
+                    if remaining <= 0 or serial in serials:
+                        continue
+                    key = self._conflict_key(job)
+                    if key is not None and key in self._running[serial]:
+                        blocked = True
+                        continue
+                    entry[1] -= 1
+                    serials.add(serial)
+                    if key is not None:
+                        self._running[serial].add(key)
+                    return job
+                if not blocked:
+                    return None
+                self._condition.wait()
+        return None
+
+    def _Release(self, serial, job):
+        """Marks a job as no longer running on a device."""
+        with self._condition:
+            self._running[serial].discard(self._conflict_key(job))
+            self._condition.notify_all()
+
+    def _Work(self, device, run_func):
+        """Worker thread body which runs jobs on one device.
+
+        Args:
+            device: the AndroidDevice owned by this worker.
+            run_func: see Run.
+        """
+        while True:
+            job = self._NextJob(device.serial)
+            if job is None:
+                return
+            logging.info("Run %s on %s", job, device.serial)
+            try:
+                result = run_func(device, job)
+            except Exception:
+                with self._condition:
+                    if not self._error:
+                        self._error = sys.exc_info()
+                        self._error_job = (job, device.serial)
+                    else:
+                        logging.exception("%s also failed on %s", job,
+                                          device.serial)
+                self._Release(device.serial, job)
+                return
+            with self._condition:
+                self._results[job].append((device.serial, result))
+            self._Release(device.serial, job)
+
+
+def _Median(values):
+    """Returns the median of a non-empty list of numbers."""
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return type(ordered[middle])(
+        (ordered[middle - 1] + ordered[middle]) / 2.0)
+
+
+def MergeReplicas(replica_results):
+    """Merges the results of one job measured on several devices.
+
+    Args:
+        replica_results: non-empty list of result dicts. Values are
+                         numbers, nested dicts of numbers or objects with a
+                         Merge method such as histograms.
+
+    Returns:
+        a tuple of two dicts with the same layout as the inputs, the first
+        holding the median of each value and the second holding the spread
+        (max - min) of each value between the devices. Mergeable values are
+        combined into one and have no spread. A key missing from any
+        replica, e.g. a CPU cost of unknown transactions, is left out.
+    """
+    merged = {}
+    spread = {}
+    for key, value in replica_results[0].items():
+        if any(key not in result for result in replica_results[1:]):
+            continue
+        if hasattr(value, "Merge"):
+            merged[key] = copy.deepcopy(value)
+            for result in replica_results[1:]:
+                merged[key].Merge(result[key])
+            spread[key] = None
+        elif isinstance(value, dict):
+            merged[key], spread[key] = MergeReplicas(
+                [result[key] for result in replica_results])
+        else:
+            values = [result[key] for result in replica_results]
+            merged[key] = _Median(values)
+            spread[key] = max(values) - min(values)
+    return merged, spread
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import math
+
+from vts.testcases.performance.utils import latency_histogram
+
+
+class SteadyStateResult(object):
+    """The split of a series of intervals into warm-up and steady state.
+
+    Attributes:
+        warmup_intervals: integer, the number of leading intervals dropped.
+        warmup_duration: number, the total duration of those intervals, in
+                         the unit of the given durations.
+        steady: bool, whether the remaining intervals are stable.
+        steady_indexes: list of integers, the indexes of the kept intervals.
+    """
+
+    def __init__(self, warmup_intervals, warmup_duration, steady,
+                 steady_indexes):
+        self.warmup_intervals = warmup_intervals
+        self.warmup_duration = warmup_duration
+        self.steady = steady
+        self.steady_indexes = steady_indexes
+
+
+def _Mean(values):
+    return float(sum(values)) / len(values)
+
+
+def _TruncationStatistic(values):
+    """Returns the MSER statistic of a truncated series."""
+    mean = _Mean(values)
+    return sum((value - mean) ** 2 for value in values) / len(values) ** 2
+
+
+def DetectSteadyState(values, durations=None, max_cv=0.1, min_steady=3):
+    """Drops the warm-up intervals of a series.
+
+    The truncation point is chosen by the MSER rule: drop the leading
+    intervals which minimize the squared standard error of the mean of the
+    rest, searching the first half of the series. The rest is steady if it
+    has at least min_steady intervals, its coefficient of variation is at
+    most max_cv, and its two halves have means within max_cv of each other
+    (no drift).
+
+    Args:
+        values: list of numbers, one per interval in run order, e.g. the
+                mean latency of each interval.
+        durations: list of numbers, the duration of each interval, or None
+                   to count intervals.
+        max_cv: float, the maximum relative variation of a steady state.
+        min_steady: integer, the minimum number of steady intervals.
+
+    Returns:
+        a SteadyStateResult.
+    """
+    if durations is None:
+        durations = [1] * len(values)
+    if len(values) < min_steady:
+        return SteadyStateResult(0, 0, False, list(range(len(values))))
+
+    candidates = range(0, min(len(values) // 2, len(values) - min_steady) + 1)
+    warmup = min(candidates,
+                 key=lambda index: _TruncationStatistic(values[index:]))
+    rest = values[warmup:]
+    mean = _Mean(rest)
+    stddev = math.sqrt(sum((value - mean) ** 2 for value in rest) /
+                       max(1, len(rest) - 1))
+    half = len(rest) // 2
+    drift = abs(_Mean(rest[half:]) - _Mean(rest[:half])) if half else 0
+    steady = bool(mean) and stddev / mean <= max_cv and drift / mean <= max_cv
+    if not steady:
+        logging.warning("No steady state: mean %s, stddev %s, drift %s",
+                        mean, stddev, drift)
+    return SteadyStateResult(warmup, sum(durations[:warmup]), steady,
+                             list(range(warmup, len(values))))
+
+
+def TrimWarmup(labels, samples, durations=None, max_cv=0.1, min_steady=3):
+    """Drops the warm-up samples of every label.
+
+    Args:
+        labels: list of labels.
+        samples: dict which maps each label to its samples in run order.
+                 The warm-up samples are removed in place.
+        durations: dict which maps each label to the duration of each
+                   sample, or None to count samples.
+        max_cv: see DetectSteadyState.
+        min_steady: see DetectSteadyState.
+
+    Returns:
+        a list of SteadyStateResult, one per label.
+    """
+    results = []
+    for label in labels:
+        result = DetectSteadyState(
+            samples[label], durations[label] if durations else None, max_cv,
+            min_steady)
+        if not result.steady:
+            logging.warning("%s never reached a steady state.", label)
+        samples[label] = [samples[label][index]
+                          for index in result.steady_indexes]
+        results.append(result)
+    return results
+
+
+class IntervalRecorder(object):
+    """Splits a stream of latency samples into fixed-size intervals.
+
+    Each interval is kept as its own LatencyHistogram, so the steady-state
+    intervals can be merged afterwards without buffering raw samples. It
+    can be passed as the sample sink of output_parser.
+
+    Attributes:
+        intervals: list of LatencyHistogram, one per complete interval and
+                   one for the trailing partial interval if any.
+        _samples_per_interval: integer, the number of samples per interval.
+    """
+
+    def __init__(self, samples_per_interval):
+        if samples_per_interval < 1:
+            raise ValueError("samples_per_interval must be positive.")
+        self.intervals = []
+        self._samples_per_interval = samples_per_interval
+
+    def Record(self, value, count=1):
+        """Records a sample into the current interval."""
+        if (not self.intervals or self.intervals[-1].total_count >=
+                self._samples_per_interval):
+            self.intervals.append(latency_histogram.LatencyHistogram())
+        self.intervals[-1].Record(value, count)
+
+    def Analyze(self, max_cv=0.1, min_steady=3, concurrency=1):
+        """Detects the steady state of the recorded intervals.
+
+        The samples carry no timestamps, so the wall time of an interval is
+        estimated as its summed latencies divided by the number of workers
+        which recorded samples at the same time.
+
+        Args:
+            max_cv: see DetectSteadyState.
+            min_steady: see DetectSteadyState.
+            concurrency: positive integer, the number of concurrent workers
+                         whose samples are recorded.
+
+        Returns:
+            a tuple of the SteadyStateResult, where durations are the wall
+            times of the intervals, and a LatencyHistogram merging the
+            steady intervals.
+        """
+        intervals = [interval for interval in self.intervals
+                     if interval.total_count]
+        result = DetectSteadyState(
+            [interval.GetMean() for interval in intervals],
+            [float(interval.total_sum) / concurrency
+             for interval in intervals], max_cv, min_steady)
+        merged = latency_histogram.LatencyHistogram()
+        for index in result.steady_indexes:
+            merged.Merge(intervals[index])
+        return result, merged
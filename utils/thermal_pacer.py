@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import collections
+import logging
+import time
+
+from vts.runners.host import const
+
+# prints the temperature of every thermal zone, one per line.
+_TEMPERATURE_COMMAND = "cat /sys/class/thermal/thermal_zone*/temp 2>/dev/null"
+
+# prints the current frequency of every online CPU, one per line.
+_FREQUENCY_COMMAND = (
+    "cat /sys/devices/system/cpu/cpu*/cpufreq/scaling_cur_freq 2>/dev/null")
+
+ThermalReading = collections.namedtuple(
+    "ThermalReading", ["temperature_mc", "cpu_freq_khz"])
+
+
+def _ParseIntegers(output):
+    """Returns the integers of a command output, one per line."""
+    values = []
+    for line in output.splitlines():
+        line = line.strip()
+        if line.lstrip("-").isdigit():
+            values.append(int(line))
+    return values
+
+
+class ThermalPacer(object):
+    """Waits for a hot device to cool down between data points.
+
+    Instead of skipping a whole test case when the device throttles, the
+    test calls Pace before each data point (e.g. a thread count or a
+    binary run) and Read after it to record the conditions it ran in.
+
+    Attributes:
+        _shell: the shell terminal of the device, e.g. dut.shell.one.
+        _cpu_freq: CpuFrequencyScalingController of the device.
+        _max_temperature_mc: integer, the hottest thermal zone temperature
+                             in millidegrees Celsius at which a data point
+                             may start, or 0 to only check throttling.
+        _poll_interval_secs: float, the pause between two checks.
+        _max_cooldown_secs: float, the longest wait before a data point
+                            runs anyway.
+        cooldown_secs: float, the total time spent cooling down.
+    """
+
+    def __init__(self, shell, cpu_freq, max_temperature_mc=0,
+                 poll_interval_secs=10, max_cooldown_secs=600):
+        self._shell = shell
+        self._cpu_freq = cpu_freq
+        self._max_temperature_mc = max_temperature_mc
+        self._poll_interval_secs = poll_interval_secs
+        self._max_cooldown_secs = max_cooldown_secs
+        self.cooldown_secs = 0.0
+
+    def Read(self):
+        """Reads the current thermal state.
+
+        Returns:
+            ThermalReading of the hottest thermal zone and the slowest
+            online CPU, where a value the device does not expose is 0.
+        """
+        results = self._shell.Execute([_TEMPERATURE_COMMAND,
+                                       _FREQUENCY_COMMAND])
+        temperatures = _ParseIntegers(results[const.STDOUT][0])
+        frequencies = _ParseIntegers(results[const.STDOUT][1])
+        # Some zones report degrees instead of millidegrees.
+        temperatures = [value * 1000 if 0 < value < 200 else value
+                        for value in temperatures]
+        return ThermalReading(max(temperatures) if temperatures else 0,
+                              min(frequencies) if frequencies else 0)
+
+    def _IsHot(self):
+        """Returns whether the device is throttling or too hot."""
+        if self._cpu_freq.IsUnderThermalThrottling():
+            return True
+        return bool(self._max_temperature_mc and
+                    self.Read().temperature_mc >= self._max_temperature_mc)
+
+    def Pace(self):
+        """Waits until the device is cool enough for the next data point.
+
+        Returns:
+            float, the seconds spent waiting.
+        """
+        start_time = time.time()
+        while self._IsHot():
+            waited = time.time() - start_time
+            if waited >= self._max_cooldown_secs:
+                logging.warning("The device is still hot after %s seconds; "
+                                "running anyway.", int(waited))
+                break
+            time.sleep(self._poll_interval_secs)
+        waited = time.time() - start_time
+        if waited >= self._poll_interval_secs:
+            logging.info("Cooled down for %s seconds.", int(waited))
+        self.cooldown_secs += waited
+        return waited
+
+
+def CreatePacer(test, dut, cpu_freq):
+    """Returns a ThermalPacer if the thermal_pacing_mode user param is set.
+
+    Args:
+        test: BaseTestClass instance, used to read the user params.
+        dut: the AndroidDevice, whose shell.one terminal must exist.
+        cpu_freq: CpuFrequencyScalingController of the device.
+
+    Returns:
+        ThermalPacer, or None if thermal pacing is disabled.
+    """
+    if not test.getUserParam("thermal_pacing_mode", default_value=False):
+        return None
+    return ThermalPacer(
+        dut.shell.one, cpu_freq,
+        int(test.getUserParam("thermal_max_temperature_mc",
+                              default_value=0)),
+        float(test.getUserParam("thermal_poll_interval_secs",
+                                default_value=10)),
+        float(test.getUserParam("thermal_max_cooldown_secs",
+                                default_value=600)))
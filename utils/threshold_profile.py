@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Per-device performance thresholds.
+
+A threshold profile is a JSON file of the form
+
+    {
+        "reference_cpu_freq_khz": 1900800,
+        "thresholds": {
+            "binder_latency": {
+                "32": {"4": 120000, "2k": 150000, "64k": 800000},
+                "64": {"4": 120000, "2k": 150000, "64k": 800000}
+            }
+        }
+    }
+
+Profiles are looked up in the threshold_profile_dir directory, if that
+user param is set, as soc/<ro.board.platform>.json and
+device_class/<class>.json, and override the built-in thresholds
+of a test label by label. reference_cpu_freq_khz is optional; if present,
+every limit of the profile is scaled by the reference frequency divided by
+the measured CPU frequency.
+"""
+
+import bisect
+import json
+import logging
+import math
+import numbers
+import os
+import re
+
+_SIZE_PATTERN = re.compile(r"^\s*(\d+)\s*([kKmM]?)\s*$")
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 * 1024}
+
+# no profile directory, i.e. only the built-in thresholds apply.
+DEFAULT_PROFILE_DIR = ""
+
+
+def _IsPositive(value):
+    """Returns whether a JSON value is a positive number."""
+    return (isinstance(value, numbers.Real) and
+            not isinstance(value, bool) and value > 0)
+
+
+def ParseSize(label):
+    """Converts a message size label to bytes.
+
+    Args:
+        label: string such as '64', '2k' or '1m'.
+
+    Returns:
+        integer, the size in bytes, or None if label is not a size.
+    """
+    match = _SIZE_PATTERN.match(str(label))
+    if not match:
+        return None
+    return int(match.group(1)) * _SIZE_UNITS[match.group(2).lower()]
+
+
+class ThresholdTable(object):
+    """The latency limits of one benchmark, indexed by bits and size.
+
+    Attributes:
+        _limits: dict which maps bits to a sorted list of (size, limit).
+        _scale: float, the factor applied to every limit.
+        _unlimited: set of (bits, label) tuples out of the listed range,
+                    which have already been logged.
+    """
+
+    def __init__(self, thresholds, scale=1.0):
+        """Initializes the table.
+
+        Args:
+            thresholds: dict which maps bits to a dict of {label: limit}.
+            scale: float, the factor applied to every limit.
+        """
+        self._limits = {}
+        self._scale = scale
+        self._unlimited = set()
+        self.Update(thresholds)
+
+    def Update(self, thresholds, scale=None):
+        """Overrides limits label by label.
+
+        Args:
+            thresholds: dict which maps bits (integer or string) to a dict of
+                        {label: limit}.
+            scale: float, the factor applied to the new limits, or None to
+                   use the table scale.
+
+        Raises:
+            ValueError if a limit is not a positive number, since limits
+            are interpolated in log space.
+        """
+        if scale is None:
+            scale = self._scale
+        for bits, limits in thresholds.items():
+            table = dict(self._limits.get(int(bits), []))
+            for label, limit in limits.items():
+                size = ParseSize(label)
+                if size is None:
+                    logging.warning("Ignore threshold of non-size label %s",
+                                    label)
+                    continue
+                if not _IsPositive(limit):
+                    raise ValueError("Threshold of %s-bit %s is not a "
+                                     "positive number: %r" %
+                                     (bits, label, limit))
+                table[size] = limit * scale
+            self._limits[int(bits)] = sorted(table.items())
+
+    def GetThreshold(self, bits, label):
+        """Returns the limit of a message size.
+
+        Sizes between two listed sizes are interpolated linearly in log-log
+        space, which fits latency curves dominated by a fixed cost at small
+        sizes and by copying at large sizes.
+
+        Args:
+            bits: integer, 32 or 64.
+            label: string, the message size label, e.g. '2k' or '2048'.
+
+        Returns:
+            integer, the limit, or None if the size is out of the listed
+            range or the label is not a size. A size out of the listed
+            range is logged, since it is not checked.
+        """
+        size = ParseSize(label)
+        limits = self._limits.get(bits)
+        if size is None or not limits:
+            return None
+        sizes = [entry[0] for entry in limits]
+        index = bisect.bisect_left(sizes, size)
+        if index < len(sizes) and sizes[index] == size:
+            return int(limits[index][1])
+        if index == 0 or index == len(sizes):
+            if (bits, label) not in self._unlimited:
+                self._unlimited.add((bits, label))
+                logging.warning(
+                    "No %s-bit threshold for %s: out of the listed sizes "
+                    "%s to %s bytes.", bits, label, sizes[0], sizes[-1])
+            return None
+        (low_size, low_limit), (high_size, high_limit) = (limits[index - 1],
+                                                          limits[index])
+        ratio = (math.log(size) - math.log(low_size)) / (
+            math.log(high_size) - math.log(low_size))
+        return int(math.exp(math.log(low_limit) + ratio * (
+            math.log(high_limit) - math.log(low_limit))))
+
+
+def _ReadProp(dut, name):
+    """Returns a system property of the device."""
+    return dut.adb.shell("getprop %s" % name).strip()
+
+
+def _ReadCpuFrequency(dut):
+    """Returns the highest current CPU frequency in kHz, or None."""
+    output = dut.adb.shell(
+        "cat /sys/devices/system/cpu/cpu*/cpufreq/scaling_cur_freq")
+    frequencies = [int(token) for token in output.split() if token.isdigit()]
+    return max(frequencies) if frequencies else None
+
+
+def LoadThresholds(test, dut, benchmark, thresholds):
+    """Builds the threshold table of a benchmark for a device.
+
+    Args:
+        test: BaseTestClass instance, used to read the
+              threshold_profile_dir and threshold_device_class user params.
+        dut: the AndroidDevice under test.
+        benchmark: string, the benchmark key in the profiles, e.g.
+                   'binder_latency'.
+        thresholds: dict, the built-in thresholds of the test class which
+                    maps bits to a dict of {label: limit}.
+
+    Returns:
+        a ThresholdTable.
+
+    Raises:
+        ValueError if a profile is not a valid JSON object or has a limit
+        which is not a positive number.
+    """
+    table = ThresholdTable(thresholds)
+    profile_dir = test.getUserParam(
+        "threshold_profile_dir", default_value=DEFAULT_PROFILE_DIR)
+    device_class = test.getUserParam(
+        "threshold_device_class", default_value="")
+    if not profile_dir:
+        return table
+    paths = [os.path.join(profile_dir, "soc",
+                          "%s.json" % _ReadProp(dut, "ro.board.platform"))]
+    if device_class:
+        paths.append(os.path.join(profile_dir, "device_class",
+                                  "%s.json" % device_class))
+
+    cpu_freq = None
+    for path in paths:
+        if not os.path.isfile(path):
+            continue
+        with open(path) as profile_file:
+            try:
+                profile = json.load(profile_file)
+            except ValueError as e:
+                raise ValueError("Malformed threshold profile %s: %s" %
+                                 (path, e))
+        if not isinstance(profile, dict):
+            raise ValueError("Malformed threshold profile %s: not a JSON "
+                             "object." % path)
+        limits = profile.get("thresholds", {}).get(benchmark)
+        if not limits:
+            continue
+        scale = 1.0
+        reference = profile.get("reference_cpu_freq_khz")
+        if reference is not None and not _IsPositive(reference):
+            raise ValueError("Malformed threshold profile %s: "
+                             "reference_cpu_freq_khz is not a positive "
+                             "number." % path)
+        if reference:
+            if cpu_freq is None:
+                cpu_freq = _ReadCpuFrequency(dut)
+            if cpu_freq:
+                scale = float(reference) / cpu_freq
+        logging.info("Apply %s thresholds of %s scaled by %s", benchmark,
+                     path, scale)
+        try:
+            table.Update(limits, scale)
+        except ValueError as e:
+            raise ValueError("Malformed threshold profile %s: %s" %
+                             (path, e))
+    return table
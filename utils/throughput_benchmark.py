@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Runs a throughput binary with one thread count and parses its result."""
+
+import logging
+
+from vts.runners.host import asserts
+from vts.runners.host import const
+from vts.testcases.performance.utils import batch_executor
+from vts.testcases.performance.utils import cpu_cost
+from vts.testcases.performance.utils import cpu_placement
+from vts.testcases.performance.utils import latency_histogram
+from vts.testcases.performance.utils import noise_probe
+from vts.testcases.performance.utils import output_parser
+from vts.testcases.performance.utils import result_transport
+from vts.testcases.performance.utils import steady_state
+from vts.testcases.performance.utils import thermal_pacer
+from vts.utils.python.cpu import cpu_frequency_scaling
+
+# percentiles reported by the binary, recomputed in steady-state mode.
+_PERCENTILES = [50, 90, 95, 99]
+
+
+class ThroughputBenchmark(object):
+    """Runs a throughput binary on one of the devices under test.
+
+    Attributes:
+        duts: list of the AndroidDevices to run on.
+        _test: BaseTestClass instance whose user params configure the CPU
+               cost samplers.
+        _command_func: function which takes bits, a thread count and extra
+                       arguments, and returns a tuple of the binary path and
+                       the shell command line.
+        _cpu_freqs: list of CpuFrequencyScalingController, one per device.
+        _pacers: dict which maps a serial to the ThermalPacer of the device
+                 in thermal pacing mode; empty otherwise.
+        _noise_probes: dict which maps a serial to the NoiseProbe of the
+                       device in noise probe mode; empty otherwise.
+        _transports: dict which maps a serial to the FileResultTransport of
+                     the device with file_result_transport; empty otherwise.
+        _latency_samples_flag: string, the binary flag which dumps every
+                               latency sample, or '' to not record them.
+        _latency_samples_unit_ns: float, the nanoseconds per unit of the
+                                  latency samples.
+        _latency_samples_begin: string, the output line which opens the
+                                block of latency samples.
+        _latency_samples_end: string, the output line which closes the
+                              block of latency samples.
+        _steady_state_mode: bool, whether to drop the warm-up intervals of
+                            the latency samples of each run.
+        _steady_state_interval_samples: integer, the latency samples per
+                                        interval in steady-state mode.
+        _steady_state_max_cv: float, the maximum coefficient of variation
+                              of the steady-state intervals.
+        _cpu_cost_mode: bool, whether to sample the CPU cost of each run.
+    """
+
+    def __init__(self, test, duts, command_func):
+        """Reads the user params of the test and sets up the devices.
+
+        Opens the shell terminals and disables the CPU scaling.
+
+        Args:
+            test: BaseTestClass instance whose user params configure the
+                  runs.
+            duts: list of the AndroidDevices to run on.
+            command_func: see the _command_func attribute.
+        """
+        self.duts = duts
+        self._test = test
+        self._command_func = command_func
+        self._latency_samples_flag = test.getUserParam(
+            "latency_samples_flag", default_value="")
+        self._latency_samples_unit_ns = float(test.getUserParam(
+            "latency_samples_unit_ns", default_value=1))
+        self._latency_samples_begin = test.getUserParam(
+            "latency_samples_begin",
+            default_value=output_parser.SAMPLE_BLOCK_BEGIN)
+        self._latency_samples_end = test.getUserParam(
+            "latency_samples_end",
+            default_value=output_parser.SAMPLE_BLOCK_END)
+        self._steady_state_mode = test.getUserParam(
+            "steady_state_mode", default_value=False)
+        self._steady_state_interval_samples = int(test.getUserParam(
+            "steady_state_interval_samples", default_value=1000))
+        self._steady_state_max_cv = float(test.getUserParam(
+            "steady_state_max_cv", default_value=0.1))
+        self._cpu_cost_mode = test.getUserParam(
+            "cpu_cost_mode", default_value=False)
+        file_result_transport = test.getUserParam(
+            "file_result_transport", default_value=False)
+        if self._steady_state_mode and not self._latency_samples_flag:
+            logging.warning("steady_state_mode needs latency_samples_flag; "
+                            "disabled.")
+            self._steady_state_mode = False
+        self._cpu_freqs = []
+        self._pacers = {}
+        self._noise_probes = {}
+        self._transports = {}
+        for dut in duts:
+            dut.shell.InvokeTerminal("one")
+            cpu_freq = cpu_frequency_scaling.CpuFrequencyScalingController(dut)
+            cpu_freq.DisableCpuScaling()
+            self._cpu_freqs.append(cpu_freq)
+            pacer = thermal_pacer.CreatePacer(test, dut, cpu_freq)
+            if pacer:
+                self._pacers[dut.serial] = pacer
+            probe = noise_probe.CreateProbe(test, dut)
+            if probe:
+                self._noise_probes[dut.serial] = probe
+            if file_result_transport:
+                self._transports[dut.serial] = (
+                    result_transport.FileResultTransport(dut))
+
+    @property
+    def pacing(self):
+        """Whether each run waits for its device to cool down."""
+        return bool(self._pacers)
+
+    @property
+    def probing(self):
+        """Whether each run is between two noise probes."""
+        return bool(self._noise_probes)
+
+    @property
+    def sampling(self):
+        """Whether the CPU cost of each run is sampled."""
+        return self._cpu_cost_mode
+
+    def SkipIfThermalThrottling(self, **kwargs):
+        """Skips the test case if a device throttles, unless pacing.
+
+        Args:
+            **kwargs: the arguments of
+                      CpuFrequencyScalingController.SkipIfThermalThrottling.
+        """
+        if self._pacers:
+            return
+        for cpu_freq in self._cpu_freqs:
+            cpu_freq.SkipIfThermalThrottling(**kwargs)
+
+    def Close(self):
+        """Restores the CPU scaling and removes the pulled result files."""
+        for cpu_freq in self._cpu_freqs:
+            cpu_freq.EnableCpuScaling()
+        for transport in self._transports.values():
+            transport.Close()
+
+    def Run(self, bits, threads, dut=None, extra_args="", placement=None):
+        """Runs the native binary, between two noise probes if enabled.
+
+        Takes the arguments and returns the result dict of RunOnce. In
+        noise probe mode a run measured under noise runs again, and the
+        dict also has the 'noise_score' of the kept run.
+        """
+        if dut is None:
+            dut = self.duts[0]
+        probe = self._noise_probes.get(dut.serial)
+        if not probe:
+            return self.RunOnce(bits, threads, dut, extra_args, placement)
+        summary, score = probe.Run(
+            lambda: self.RunOnce(bits, threads, dut, extra_args, placement))
+        summary["noise_score"] = score
+        return summary
+
+    def RunOnce(self, bits, threads, dut=None, extra_args="",
+                placement=None):
+        """Runs the native binary and parses its result.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            threads: positive integer, the number of threads to use.
+            dut: the AndroidDevice to run on. The first device if not
+                 specified.
+            extra_args: string, extra command line arguments of the binary.
+            placement: cpu_placement.Placement whose CPUs the workers are
+                       pinned to, or None to let the scheduler place them.
+
+        Returns:
+            a dict which contains the benchmarking result where the keys are:
+                'iterations_per_second', 'time_average', 'time_worst',
+                'time_best', 'time_percentile', and 'latency_histogram' if
+                latency_samples_flag is set. In steady-state mode the
+                latencies only cover the steady-state intervals, and the
+                dict also has 'warmup_intervals', 'warmup_wall_time_ns',
+                the wall time of the warm-up with threads workers, and
+                'steady_state'. In thermal pacing mode the run waits until
+                the device is cool enough, and the dict also has
+                'temperature_mc' and 'cpu_freq_khz' read after the run.
+                In CPU cost mode the dict also has the keys of
+                cpu_cost.CpuCost.ToDict sampled during the run.
+                With file_result_transport the output is pulled from a
+                device file instead of the shell channel.
+        """
+        # Runs the benchmark.
+        logging.info("Start to run the benchmark (%s bit mode)", bits)
+        binary, command = self._Command(bits, threads, extra_args)
+        if placement:
+            command = cpu_placement.PinCommand(command, placement,
+                                               split=False)
+
+        if dut is None:
+            dut = self.duts[0]
+        pacer = self._pacers.get(dut.serial)
+        if pacer:
+            pacer.Pace()
+        transport = self._transports.get(dut.serial)
+        sampler = cpu_cost.CreateSampler(self._test, dut, binary)
+        cost = None
+        if transport or sampler:
+            dut.shell.one.Execute("chmod 755 %s" % binary)
+        if sampler:
+            sampler.Start()
+        if transport:
+            name = "throughput_%sbits_%s_threads.out" % (bits, threads)
+            stop = sampler.Stop if sampler else None
+            with transport.Run(command, name, stop) as result_file:
+                if sampler:
+                    cost = sampler.cost
+                logging.info("summary: %s", result_file.summary)
+                asserts.assertFalse(
+                    result_file.exit_code,
+                    "testRunBenchmark%sBit(%s thread) failed." % (bits,
+                                                                 threads))
+                return self._ParseOutput(
+                    bits, threads, binary, result_file.Lines(), pacer, cost)
+        if sampler:
+            results = dut.shell.one.Execute(command)
+            cost = sampler.Stop()
+        else:
+            results = dut.shell.one.Execute(["chmod 755 %s" % binary,
+                                             command])
+
+        # Parses the result, which is the output of the last command.
+        asserts.assertEqual(len(results[const.STDOUT]), 1 if sampler else 2)
+        logging.info("stderr: %s", results[const.STDERR][-1])
+        logging.info("stdout: %s", results[const.STDOUT][-1])
+
+        asserts.assertFalse(
+            any(results[const.EXIT_CODE]),
+            "testRunBenchmark%sBit(%s thread) failed." % (bits, threads))
+
+        return self._ParseOutput(
+            bits, threads, binary,
+            output_parser.IterLines(results[const.STDOUT][-1]), pacer, cost)
+
+    def RunBatch(self, bits, threads_list):
+        """Runs the binary for several thread counts in one batch.
+
+        All the thread counts run in one script on the first device.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            threads_list: list of positive integers, the thread counts.
+
+        Returns:
+            a list of result dicts (see Run), one per thread count.
+        """
+        steps = []
+        for threads in threads_list:
+            binary, command = self._Command(bits, threads)
+            steps.append(batch_executor.BatchStep(
+                "%s_thread" % threads, command))
+        try:
+            executor = batch_executor.BatchExecutor(self.duts[0].shell.one)
+            step_results = executor.Run(steps, ["chmod 755 %s" % binary])
+        except batch_executor.BatchError as e:
+            asserts.fail("testRunBenchmark%sBit batch failed: %s" % (bits, e))
+
+        summaries = []
+        for threads, step_result in zip(threads_list, step_results):
+            logging.info("stderr: %s", step_result.stderr)
+            logging.info("stdout: %s", step_result.stdout)
+            asserts.assertFalse(
+                step_result.exit_code,
+                "testRunBenchmark%sBit(%s thread) failed." % (bits, threads))
+            summaries.append(self._ParseOutput(
+                bits, threads, binary,
+                output_parser.IterLines(step_result.stdout)))
+        return summaries
+
+    def _Command(self, bits, threads, extra_args=""):
+        """Returns the binary and the command line of one benchmark run.
+
+        The latency_samples_flag is added before extra_args.
+        """
+        return self._command_func(bits, threads, " ".join(
+            arg for arg in (self._latency_samples_flag, extra_args) if arg))
+
+    def _ParseOutput(self, bits, threads, binary, lines, pacer=None,
+                     cost=None):
+        """Parses the output of one benchmark run.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            threads: positive integer, the number of threads used.
+            binary: string, the path of the binary on the device.
+            lines: iterable of strings, the output lines of the binary.
+            pacer: ThermalPacer of the device to read the thermal state
+                   from, or None.
+            cost: cpu_cost.CpuCost sampled during the run, or None.
+
+        Returns:
+            the result dict, see Run.
+        """
+        histogram = None
+        if self._steady_state_mode:
+            histogram = steady_state.IntervalRecorder(
+                self._steady_state_interval_samples)
+        elif self._latency_samples_flag:
+            histogram = latency_histogram.LatencyHistogram()
+        try:
+            result = output_parser.ParseThroughputOutput(
+                lines, histogram, self._latency_samples_unit_ns,
+                self._latency_samples_begin, self._latency_samples_end)
+        except output_parser.ParseError as e:
+            asserts.fail("testRunBenchmark%sBit(%s thread): %s" %
+                         (bits, threads, e))
+        summary = result.ToDict()
+        if self._steady_state_mode:
+            warmup, histogram = histogram.Analyze(
+                self._steady_state_max_cv, concurrency=threads)
+            if not warmup.steady:
+                logging.warning("%s thread run never reached a steady state.",
+                                threads)
+            summary["warmup_intervals"] = warmup.warmup_intervals
+            summary["warmup_wall_time_ns"] = int(warmup.warmup_duration)
+            summary["steady_state"] = int(warmup.steady)
+        if histogram is not None:
+            asserts.assertTrue(
+                histogram.total_count,
+                "No latency sample in the output of %s" % binary)
+            summary["latency_histogram"] = histogram
+        if self._steady_state_mode:
+            summary["time_average"] = int(histogram.GetMean())
+            summary["time_best"] = histogram.min_value
+            summary["time_worst"] = histogram.max_value
+            summary["time_percentile"] = dict(
+                (percentile, histogram.GetPercentile(percentile))
+                for percentile in _PERCENTILES)
+        if pacer:
+            reading = pacer.Read()
+            summary["temperature_mc"] = reading.temperature_mc
+            summary["cpu_freq_khz"] = reading.cpu_freq_khz
+        if self._cpu_cost_mode:
+            if cost is None:
+                cost = cpu_cost.CpuCost()
+            # Without debugfs, each iteration whose latency sample the
+            # binary printed is taken as one transaction.
+            summary.update(cost.ToDict(result.iterations))
+        return summary
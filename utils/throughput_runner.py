@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Runs a throughput binary over a sweep of thread counts and reports it.
+
+The binder and hwbinder throughput tests only differ in their binaries,
+thread counts, vector names and axis labels, so a ThroughputRunner holds
+the sweep and the report they share. ThroughputBenchmark runs one thread
+count and the sweeps of throughput_sweep choose where and in which order
+the thread counts run.
+"""
+
+import logging
+
+from vts.proto import VtsReportMessage_pb2 as ReportMsg
+from vts.testcases.performance.utils import cpu_cost
+from vts.testcases.performance.utils import throughput_benchmark
+from vts.testcases.performance.utils import throughput_sweep
+from vts.testcases.performance.utils import throughput_windows
+
+# tail percentiles computed from the raw latency samples.
+_TAIL_PERCENTILES = [99.9, 99.99]
+
+# optional per thread count results of the benchmark modes, uploaded in
+# this order when present: (result key and vector name, y-axis label).
+_MODE_VECTORS = [
+    ("warmup_intervals", "Warm-up Intervals"),
+    ("warmup_wall_time_ns", "Warm-up Wall Time (nanoseconds)"),
+    ("steady_state", "Steady State Reached"),
+    ("temperature_mc", "Run - Hottest Thermal Zone (millidegrees Celsius)"),
+    ("cpu_freq_khz", "Run - Slowest CPU Frequency (kHz)"),
+    ("noise_score", "Run - Background Noise Score (percent of the limit)"),
+] + cpu_cost.VECTORS
+
+
+class ThroughputRunner(object):
+    """Runs and reports a throughput binary for one test class.
+
+    Attributes:
+        _test: BaseTestClass instance which owns the runner. The vectors are
+               uploaded through its current web feature.
+        _name: string, the prefix of the vector names, e.g. 'binder'.
+        _rpc_name: string, the IPC name in the axis labels, e.g. 'Binder'.
+        _benchmark: ThroughputBenchmark which runs one thread count.
+        _sweep: ThroughputSweep which runs the thread counts.
+        _traced_window: TracedWindow which traces one thread count after
+                        the sweep in combined trace mode, or None.
+        _placement_matrix: PlacementMatrix which runs one thread count with
+                           each CPU placement after the sweep in placement
+                           matrix mode, or None.
+    """
+
+    def __init__(self, test, duts, name, rpc_name, thread_list,
+                 command_func):
+        """Sets up the devices.
+
+        Args:
+            test: BaseTestClass instance which owns the runner.
+            duts: list of the registered AndroidDevices. Only the first one
+                  is used outside of sharded execution.
+            name: string, the prefix of the vector names.
+            rpc_name: string, the IPC name in the axis labels.
+            thread_list: list of integers, the thread counts of the sweep.
+            command_func: function which takes bits, a thread count and
+                          extra arguments, and returns a tuple of the binary
+                          path and the shell command line.
+        """
+        self._test = test
+        self._name = name
+        self._rpc_name = rpc_name
+        self._benchmark = throughput_benchmark.ThroughputBenchmark(
+            test, duts if throughput_sweep.IsSharded(test) else duts[:1],
+            command_func)
+        self._sweep = throughput_sweep.CreateSweep(
+            test, self._benchmark, thread_list)
+        self._traced_window = throughput_windows.CreateTracedWindow(
+            test, self._benchmark, name, thread_list[0])
+        self._placement_matrix = throughput_windows.CreatePlacementMatrix(
+            test, self._benchmark, thread_list[0])
+
+    def SkipIfThermalThrottling(self, **kwargs):
+        """Skips the test case if a device throttles, unless pacing.
+
+        Args:
+            **kwargs: the arguments of
+                      CpuFrequencyScalingController.SkipIfThermalThrottling.
+        """
+        self._benchmark.SkipIfThermalThrottling(**kwargs)
+
+    def Close(self):
+        """Restores the CPU scaling and removes the pulled result files."""
+        self._benchmark.Close()
+
+    def _AddVector(self, name, labels, values, y_axis_label, **kwargs):
+        """Uploads a vector named <prefix>_throughput_<name>.
+
+        The y-axis label is prefixed with the IPC name, e.g. 'Binder RPC'.
+        """
+        self._test.web.AddProfilingDataLabeledVector(
+            "%s_throughput_%s" % (self._name, name), labels, values,
+            y_axis_label="%s RPC %s" % (self._rpc_name, y_axis_label),
+            **kwargs)
+
+    def RunAndReport(self, bits):
+        """Runs the native binary and stores its result to the web DB.
+
+        With latency_samples_flag, the tail percentiles and the maximum of
+        the latency samples are also uploaded. The results of the benchmark
+        modes, e.g. the warm-up length in steady-state mode or the thermal
+        state in thermal pacing mode, the noise score in noise probe mode or
+        the CPU cost per transaction in CPU cost mode, are uploaded when
+        present. In sharded execution mode with several replicas, the
+        spread of the results between the devices is also uploaded. With an
+        adaptive sweep, the knee thread count and the peak iterations per
+        second are also uploaded. In combined trace mode, the tracing
+        overhead of a short traced run is also uploaded. In placement
+        matrix mode, one thread count also runs with each CPU placement.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+
+        Returns:
+            a tuple of the thread count labels and their average times in
+            nanoseconds.
+        """
+        labels = []
+        iterations_per_second = []
+        time_average = []
+        time_best = []
+        time_worst = []
+        time_percentile_50 = []
+        time_percentile_90 = []
+        time_percentile_95 = []
+        time_percentile_99 = []
+        iterations_per_second_spread = []
+        time_average_spread = []
+        time_tail_percentiles = dict((p, []) for p in _TAIL_PERCENTILES)
+        time_max = []
+        mode_results = dict((key, []) for key, _ in _MODE_VECTORS)
+
+        sweep, saturation = self._sweep.Run(bits)
+        for thread, result, spread in sweep:
+            labels.append("%s_thread" % thread)
+            iterations_per_second_spread.append(
+                spread["iterations_per_second"])
+            time_average_spread.append(spread["time_average"])
+            iterations_per_second.append(result["iterations_per_second"])
+            time_average.append(result["time_average"])
+            time_best.append(result["time_best"])
+            time_worst.append(result["time_worst"])
+            time_percentile_50.append(result["time_percentile"][50])
+            time_percentile_90.append(result["time_percentile"][90])
+            time_percentile_95.append(result["time_percentile"][95])
+            time_percentile_99.append(result["time_percentile"][99])
+            histogram = result.get("latency_histogram")
+            if histogram is not None:
+                for percentile in _TAIL_PERCENTILES:
+                    time_tail_percentiles[percentile].append(
+                        histogram.GetPercentile(percentile))
+                time_max.append(histogram.max_value)
+            for key, values in mode_results.items():
+                if key in result:
+                    values.append(result[key])
+
+        # To upload to the web DB.
+        self._AddVector(
+            "iterations_per_second_%sbits" % bits,
+            labels, iterations_per_second, x_axis_label="Number of Threads",
+            y_axis_label="Iterations Per Second",
+            regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+
+        self._AddVector(
+            "time_average_ns_%sbits" % bits,
+            labels, time_average, x_axis_label="Number of Threads",
+            y_axis_label="Time - Average (nanoseconds)",
+            regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+        self._AddVector(
+            "time_best_ns_%sbits" % bits,
+            labels, time_best, x_axis_label="Number of Threads",
+            y_axis_label="Time - Best Case (nanoseconds)")
+        self._AddVector(
+            "time_worst_ns_%sbits" % bits,
+            labels, time_worst, x_axis_label="Number of Threads",
+            y_axis_label="Time - Worst Case (nanoseconds)",
+            regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+
+        self._AddVector(
+            "time_50percentile_ns_%sbits" % bits,
+            labels, time_percentile_50, x_axis_label="Number of Threads",
+            y_axis_label="Time - 50 Percentile (nanoseconds)",
+            regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+        self._AddVector(
+            "time_90percentile_ns_%sbits" % bits,
+            labels, time_percentile_90, x_axis_label="Number of Threads",
+            y_axis_label="Time - 90 Percentile (nanoseconds)",
+            regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+        self._AddVector(
+            "time_95percentile_ns_%sbits" % bits,
+            labels, time_percentile_95, x_axis_label="Number of Threads",
+            y_axis_label="Time - 95 Percentile (nanoseconds)",
+            regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+        self._AddVector(
+            "time_99percentile_ns_%sbits" % bits,
+            labels, time_percentile_99, x_axis_label="Number of Threads",
+            y_axis_label="Time - 99 Percentile (nanoseconds)",
+            regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+
+        if time_max:
+            for percentile in _TAIL_PERCENTILES:
+                self._AddVector(
+                    "time_%spercentile_ns_%sbits" % (
+                        str(percentile).replace(".", "_"), bits),
+                    labels, time_tail_percentiles[percentile],
+                    x_axis_label="Number of Threads",
+                    y_axis_label="Time - %s Percentile "
+                                 "(nanoseconds)" % percentile,
+                    regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+            self._AddVector(
+                "time_max_ns_%sbits" % bits,
+                labels, time_max, x_axis_label="Number of Threads",
+                y_axis_label="Time - Max of All Samples "
+                             "(nanoseconds)",
+                regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+
+        for key, y_axis_label in _MODE_VECTORS:
+            if not mode_results[key]:
+                continue
+            if len(mode_results[key]) != len(labels):
+                logging.warning("%s is missing for some thread counts; not "
+                                "uploaded.", key)
+                continue
+            self._AddVector(
+                "%s_%sbits" % (key, bits),
+                labels, mode_results[key],
+                x_axis_label="Number of Threads",
+                y_axis_label=y_axis_label,
+                regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+
+        if saturation:
+            self._test.web.AddProfilingDataLabeledVector(
+                "%s_throughput_knee_threads_%sbits" % (self._name, bits),
+                ["knee"], [saturation.knee_threads],
+                x_axis_label="Saturation Point",
+                y_axis_label="Number of Threads",
+                regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+            # 0 marks a knee which is only a lower bound, see
+            # SaturationSearchResult.saturated.
+            self._AddVector(
+                "knee_saturated_%sbits" % bits,
+                ["knee"], [int(saturation.saturated)],
+                x_axis_label="Saturation Point",
+                y_axis_label="Throughput Saturated (1) or Not (0)",
+                regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+            self._AddVector(
+                "peak_iterations_per_second_%sbits" % bits,
+                ["%s_thread" % saturation.peak_threads],
+                [saturation.peak_value], x_axis_label="Number of Threads",
+                y_axis_label="Peak Iterations Per Second",
+                regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+
+        if self._sweep.replicas > 1:
+            self._AddVector(
+                "iterations_per_second_spread_%sbits" % bits,
+                labels, iterations_per_second_spread,
+                x_axis_label="Number of Threads",
+                y_axis_label="Iterations Per Second - "
+                             "Spread Between Devices",
+                regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+            self._AddVector(
+                "time_average_spread_ns_%sbits" % bits,
+                labels, time_average_spread,
+                x_axis_label="Number of Threads",
+                y_axis_label="Time - Average - "
+                             "Spread Between Devices (nanoseconds)",
+                regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+
+        if self._traced_window:
+            self._traced_window.Run(bits, self._AddVector)
+        if self._placement_matrix:
+            self._placement_matrix.Run(bits, self._AddVector)
+        return labels, time_average
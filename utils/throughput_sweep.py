@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Sweeps of a throughput binary over its thread counts."""
+
+import logging
+
+from vts.testcases.performance.utils import saturation_search
+from vts.testcases.performance.utils import shard_runner
+
+
+def IsSharded(test):
+    """Returns whether the sweep of the test runs on all its devices.
+
+    Args:
+        test: BaseTestClass instance whose sharded_execution user param
+              enables sharded execution.
+    """
+    return test.getUserParam("sharded_execution", default_value=False)
+
+
+def CreateSweep(test, benchmark, thread_list):
+    """Returns the sweep which the user params of the test select.
+
+    Args:
+        test: BaseTestClass instance whose user params select the sweep.
+        benchmark: ThroughputBenchmark which runs one thread count. In
+                   sharded execution mode it must run on all the devices.
+        thread_list: list of integers, the thread counts of the sweep.
+
+    Returns:
+        an AdaptiveSweep with adaptive_sweep, a ShardedSweep in sharded
+        execution mode, a BatchedSweep with batched_sweep unless the
+        benchmark paces, probes or samples its runs, otherwise a
+        ThroughputSweep. An AdaptiveSweep measures its thread counts with
+        a ShardedSweep in sharded execution mode, else a ThroughputSweep.
+    """
+    if IsSharded(test):
+        sweep = ShardedSweep(benchmark, thread_list, int(test.getUserParam(
+            "shard_replicas", default_value=1)))
+    else:
+        sweep = ThroughputSweep(benchmark, thread_list)
+    if test.getUserParam("adaptive_sweep", default_value=False):
+        return AdaptiveSweep(
+            sweep, thread_list,
+            int(test.getUserParam("adaptive_sweep_max_runs",
+                                  default_value=len(thread_list) // 2 + 1)),
+            float(test.getUserParam("adaptive_sweep_tolerance",
+                                    default_value=0.05)))
+    if (not IsSharded(test) and
+            test.getUserParam("batched_sweep", default_value=False)):
+        if benchmark.pacing:
+            logging.warning("batched_sweep cannot pace each thread count; "
+                            "disabled.")
+        elif benchmark.probing:
+            logging.warning("batched_sweep cannot probe the noise of each "
+                            "thread count; disabled.")
+        elif benchmark.sampling:
+            logging.warning("batched_sweep cannot sample each thread count; "
+                            "disabled.")
+        else:
+            return BatchedSweep(benchmark, thread_list)
+    return sweep
+
+
+class ThroughputSweep(object):
+    """Runs every thread count one after another on one device.
+
+    Attributes:
+        replicas: integer, the number of devices each thread count runs on.
+        _benchmark: ThroughputBenchmark which runs one thread count.
+        _thread_list: list of integers, the thread counts of the sweep.
+    """
+
+    def __init__(self, benchmark, thread_list):
+        self.replicas = 1
+        self._benchmark = benchmark
+        self._thread_list = thread_list
+
+    def Run(self, bits):
+        """Runs the benchmark for every thread count.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+
+        Returns:
+            a tuple of a list of (thread, result, spread) tuples ordered by
+            thread where result is the median of the replicas (see
+            ThroughputBenchmark.Run) and spread has the same keys holding
+            the max - min between devices, and the SaturationSearchResult
+            of an adaptive sweep or None.
+        """
+        jobs = [(bits, thread) for thread in self._thread_list]
+        job_results = self._RunJobs(jobs)
+        sweep = []
+        for job in jobs:
+            logging.info("%s thread results: %s", job[1], job_results[job])
+            result, spread = shard_runner.MergeReplicas(
+                [result for _, result in job_results[job]])
+            sweep.append((job[1], result, spread))
+        return sweep, None
+
+    def _RunJobs(self, jobs):
+        """Runs (bits, threads) jobs.
+
+        Returns:
+            a dict which maps each job to a list of (serial, result) tuples,
+            one per replica.
+        """
+        dut = self._benchmark.duts[0]
+        return dict((job, [(dut.serial, self._benchmark.Run(*job))])
+                    for job in jobs)
+
+
+class ShardedSweep(ThroughputSweep):
+    """Spreads the thread counts across all the devices of the benchmark.
+
+    Each thread count is measured on replicas distinct devices.
+    """
+
+    def __init__(self, benchmark, thread_list, replicas):
+        super(ShardedSweep, self).__init__(benchmark, thread_list)
+        self.replicas = replicas
+
+    def _RunJobs(self, jobs):
+        runner = shard_runner.ShardedJobRunner(
+            self._benchmark.duts, self.replicas)
+        return runner.Run(
+            jobs, lambda dut, job: self._benchmark.Run(job[0], job[1], dut))
+
+
+class BatchedSweep(ThroughputSweep):
+    """Runs all the thread counts in one script on the first device."""
+
+    def _RunJobs(self, jobs):
+        dut = self._benchmark.duts[0]
+        results = self._benchmark.RunBatch(
+            jobs[0][0], [threads for _, threads in jobs])
+        return dict((job, [(dut.serial, result)])
+                    for job, result in zip(jobs, results))
+
+
+class AdaptiveSweep(object):
+    """Searches the thread count where the throughput saturates.
+
+    Only the thread counts needed to locate the knee are measured, within
+    the max_runs budget. The search measures one thread count at a time
+    with another sweep, so in sharded execution mode each one runs on
+    replicas distinct devices at once and the search follows the median
+    of the replicas.
+
+    Attributes:
+        replicas: integer, the number of devices each thread count runs on.
+        _sweep: ThroughputSweep which measures each thread count.
+        _thread_list: list of integers, the thread counts whose range is
+                      searched.
+        _max_runs: integer, the maximum number of thread counts to measure.
+        _tolerance: float, the relative throughput gain below which the
+                    throughput is saturated.
+    """
+
+    def __init__(self, sweep, thread_list, max_runs, tolerance):
+        self.replicas = sweep.replicas
+        self._sweep = sweep
+        self._thread_list = thread_list
+        self._max_runs = max_runs
+        self._tolerance = tolerance
+
+    def Run(self, bits):
+        """Runs the search, see ThroughputSweep.Run."""
+        spreads = {}
+
+        def Measure(threads):
+            job = (bits, threads)
+            replicas = self._sweep._RunJobs([job])[job]
+            logging.info("%s thread results: %s", threads, replicas)
+            result, spreads[threads] = shard_runner.MergeReplicas(
+                [result for _, result in replicas])
+            return result
+
+        search = saturation_search.SaturationSearch(
+            Measure, min(self._thread_list), max(self._thread_list),
+            self._max_runs, self._tolerance)
+        saturation = search.Run()
+        sweep = [(thread, saturation.results[thread], spreads[thread])
+                 for thread in sorted(saturation.results)]
+        return sweep, saturation
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Extra throughput runs which follow the thread sweep of a test mode.
+
+Each window reads its own user params in its Create function, which
+returns None when its mode is off, and reports through the add_vector
+function of the runner.
+"""
+
+import logging
+
+from vts.proto import VtsReportMessage_pb2 as ReportMsg
+from vts.testcases.performance.utils import cpu_placement
+from vts.testcases.performance.utils import trace_capture
+
+
+def CreateTracedWindow(test, benchmark, name, default_threads):
+    """Returns a TracedWindow if combined_trace_mode is set, else None.
+
+    Args:
+        test: BaseTestClass instance whose user params configure the
+              window.
+        benchmark: ThroughputBenchmark which runs one thread count.
+        name: string, the prefix of the saved trace names, e.g. 'binder'.
+        default_threads: integer, the thread count of the window if
+                         trace_window_threads is not set.
+    """
+    if not test.getUserParam("combined_trace_mode", default_value=False):
+        return None
+    return TracedWindow(
+        benchmark, name,
+        int(test.getUserParam("trace_window_threads",
+                              default_value=default_threads)),
+        test.getUserParam("trace_window_args", default_value="-i 1000"),
+        test.getUserParam("trace_categories",
+                          default_value=trace_capture.DEFAULT_CATEGORIES),
+        test.getUserParam("trace_output_dir", default_value=""))
+
+
+class TracedWindow(object):
+    """Runs one thread count briefly under atrace after the sweep.
+
+    Attributes:
+        _benchmark: ThroughputBenchmark which runs one thread count.
+        _name: string, the prefix of the saved trace names.
+        _threads: integer, the thread count of the traced run.
+        _extra_args: string, the extra binary arguments of the traced run.
+        _categories: string, the atrace categories of the traced run.
+        _output_dir: string, the host directory of the traces, or '' to not
+                     save them.
+    """
+
+    def __init__(self, benchmark, name, threads, extra_args, categories,
+                 output_dir):
+        self._benchmark = benchmark
+        self._name = name
+        self._threads = threads
+        self._extra_args = extra_args
+        self._categories = categories
+        self._output_dir = output_dir
+
+    def Run(self, bits, add_vector):
+        """Runs the traced window and reports the tracing overhead.
+
+        An untraced window with the same arguments runs right before the
+        traced one, so the overhead only differs in tracing.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            add_vector: function which uploads a throughput vector, see
+                        ThroughputRunner._AddVector.
+
+        Returns:
+            string, the captured trace, or None if tracing failed.
+        """
+        threads = self._threads
+        clean = self._benchmark.Run(bits, threads,
+                                    extra_args=self._extra_args)
+        capture = trace_capture.TraceCapture(
+            self._benchmark.duts[0].shell.one, self._categories)
+        try:
+            capture.Start()
+            try:
+                traced = self._benchmark.Run(
+                    bits, threads, extra_args=self._extra_args)
+            finally:
+                trace = capture.Stop()
+        except trace_capture.TraceError as e:
+            logging.error("Failed to trace the benchmark: %s", e)
+            return None
+
+        labels = ["%s_thread" % threads]
+        add_vector(
+            "trace_overhead_iterations_per_second_%sbits" % bits, labels,
+            [traced["iterations_per_second"] - clean["iterations_per_second"]],
+            x_axis_label="Number of Threads",
+            y_axis_label="Iterations Per Second - Traced - Untraced",
+            regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+        add_vector(
+            "trace_overhead_time_average_ns_%sbits" % bits,
+            labels, [traced["time_average"] - clean["time_average"]],
+            x_axis_label="Number of Threads",
+            y_axis_label="Time - Average - Traced - Untraced "
+                         "(nanoseconds)",
+            regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+        if self._output_dir:
+            trace_capture.SaveTrace(trace, self._output_dir,
+                                    "%s_throughput_%sbits" % (self._name,
+                                                              bits))
+        return trace
+
+
+def CreatePlacementMatrix(test, benchmark, default_threads):
+    """Returns a PlacementMatrix if placement_matrix_mode is set, else None.
+
+    Args:
+        test: BaseTestClass instance whose user params configure the
+              matrix.
+        benchmark: ThroughputBenchmark which runs one thread count.
+        default_threads: integer, the thread count of the runs if
+                         placement_threads is not set.
+    """
+    if not test.getUserParam("placement_matrix_mode", default_value=False):
+        return None
+    return PlacementMatrix(
+        test, benchmark,
+        cpu_placement.PlanPlacements(
+            cpu_placement.ReadTopology(benchmark.duts[0].shell.one)),
+        int(test.getUserParam("placement_threads",
+                              default_value=default_threads)))
+
+
+class PlacementMatrix(object):
+    """Runs one thread count with each CPU placement after the sweep.
+
+    The workers of the binary are both clients and servers, so every
+    worker may run on the client and the server CPUs of a placement.
+
+    Attributes:
+        _test: BaseTestClass instance whose HIDL mode the runs use, if any.
+        _benchmark: ThroughputBenchmark which runs one thread count.
+        _placements: list of cpu_placement.Placement to run with.
+        _threads: integer, the thread count of the runs.
+    """
+
+    def __init__(self, test, benchmark, placements, threads):
+        self._test = test
+        self._benchmark = benchmark
+        self._placements = placements
+        self._threads = threads
+
+    def Run(self, bits, add_vector):
+        """Runs the thread count with each placement and reports them.
+
+        In the PASSTHROUGH HIDL mode there are no server processes, so the
+        placements do not apply and none runs.
+
+        Args:
+            bits: integer (32 or 64), the number of bits in a word chosen
+                  at the compile time (e.g., 32- vs. 64-bit library).
+            add_vector: function which uploads a throughput vector, see
+                        ThroughputRunner._AddVector.
+        """
+        if not self._placements:
+            return
+        if getattr(self._test, "hidl_hal_mode", None) == "PASSTHROUGH":
+            logging.info("Skip the placement matrix: PASSTHROUGH has no "
+                         "server process.")
+            return
+        labels = []
+        iterations_per_second = []
+        time_average = []
+        for placement in self._placements:
+            logging.info("Run with placement %s on CPUs %s and %s",
+                         placement.name, placement.client_cpus,
+                         placement.server_cpus)
+            result = self._benchmark.Run(bits, self._threads,
+                                         placement=placement)
+            labels.append(placement.name)
+            iterations_per_second.append(result["iterations_per_second"])
+            time_average.append(result["time_average"])
+        add_vector(
+            "placement_iterations_per_second_%sbits" % bits,
+            labels, iterations_per_second, x_axis_label="CPU Placement",
+            y_axis_label="Iterations Per Second - %s Threads" % self._threads,
+            regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
+        add_vector(
+            "placement_time_average_ns_%sbits" % bits,
+            labels, time_average, x_axis_label="CPU Placement",
+            y_axis_label="Time - Average - %s Threads "
+                         "(nanoseconds)" % self._threads,
+            regression_mode=ReportMsg.VTS_REGRESSION_MODE_DISABLED)
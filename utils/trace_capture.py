@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import os
+
+from vts.runners.host import const
+
+# atrace categories of a binder benchmark trace.
+DEFAULT_CATEGORIES = "sched freq binder_driver"
+
+# the line atrace prints right before the trace text.
+_TRACE_HEADER = "TRACE:"
+
+
+class TraceError(Exception):
+    """Raised when atrace fails to start or stop."""
+
+
+class TraceCapture(object):
+    """Captures an ftrace text trace with atrace around a sampling window.
+
+    Unlike the enable-systrace option of the test runner, which traces a
+    whole test module, the capture only covers the commands run between
+    Start and Stop, so the rest of the module measures clean metrics.
+
+    Attributes:
+        _shell: the shell terminal of the device, e.g. dut.shell.one.
+        _categories: string, the space-separated atrace categories.
+        _buffer_size_kb: integer, the per-CPU trace buffer size.
+        _started: bool, whether the capture is running.
+    """
+
+    def __init__(self, shell, categories=DEFAULT_CATEGORIES,
+                 buffer_size_kb=8192):
+        self._shell = shell
+        self._categories = categories
+        self._buffer_size_kb = buffer_size_kb
+        self._started = False
+
+    def _Execute(self, command):
+        """Runs a shell command and returns its stdout.
+
+        Raises:
+            TraceError if the command fails.
+        """
+        results = self._shell.Execute(command)
+        if any(results[const.EXIT_CODE]):
+            raise TraceError("%s failed: %s" % (command,
+                                                results[const.STDERR][0]))
+        return results[const.STDOUT][0]
+
+    def Start(self):
+        """Starts tracing.
+
+        Raises:
+            TraceError if atrace fails.
+        """
+        self._Execute("atrace --async_start -b %s %s" % (
+            self._buffer_size_kb, self._categories))
+        self._started = True
+
+    def Stop(self):
+        """Stops tracing and returns the trace.
+
+        Returns:
+            string, the ftrace text, or '' if the capture was not started.
+
+        Raises:
+            TraceError if atrace fails.
+        """
+        if not self._started:
+            return ""
+        self._started = False
+        output = self._Execute("atrace --async_stop")
+        header = output.find(_TRACE_HEADER)
+        if header < 0:
+            return output
+        return output[output.find("\n", header) + 1:]
+
+
+def SaveTrace(trace, directory, name):
+    """Writes a trace to a host directory.
+
+    Args:
+        trace: string, the ftrace text.
+        directory: string, the host directory, created if missing.
+        name: string, the base name of the file.
+
+    Returns:
+        string, the path of the trace file.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    path = os.path.join(directory, "%s.trace" % name)
+    with open(path, "w") as trace_file:
+        trace_file.write(trace)
+    logging.info("Saved the trace to %s", path)
+    return path
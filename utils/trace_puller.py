@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2017 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import gzip
+import logging
+import os
+import shutil
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# suffix of the HIDL trace files written by the profiling HALs.
+TRACE_SUFFIX = ".vts.trace"
+
+
+class IncrementalTracePuller(object):
+    """Pulls growing trace files from devices and gzips them on the host.
+
+    Each Pull copies only the bytes appended since the previous Pull, and
+    a background thread appends them to <output_dir>/<serial>/<name>.gz as
+    a new gzip member, so the file decompresses to the whole trace. The
+    compression overlaps with whatever the device does next. The gzip files
+    left in output_dir by a previous puller are rotated to
+    <name>.1.gz when the puller is created, so a new trace never continues
+    an old one.
+
+    Attributes:
+        output_dir: string, the host directory of the compressed traces.
+        _remote_dir: string, the device directory of the trace files.
+        _lock: threading.Lock which guards _offsets and _device_locks.
+        _device_locks: dict which maps a serial to the threading.Lock which
+                       serializes the pulls from that device.
+        _offsets: dict which maps (serial, remote path) to the number of
+                  bytes pulled so far.
+        _queue: Queue of (local delta file, gzip path) to compress, where
+                a None delta file discards the gzip file.
+        _compressor: threading.Thread which drains _queue.
+        _error: the first exception of the compressor, or None.
+    """
+
+    def __init__(self, output_dir, remote_dir="/data/local/tmp"):
+        self.output_dir = output_dir
+        self._remote_dir = remote_dir
+        self._lock = threading.Lock()
+        self._device_locks = {}
+        self._offsets = {}
+        self._queue = queue.Queue()
+        self._error = None
+        self._RotateOldTraces()
+        self._compressor = threading.Thread(target=self._Compress)
+        self._compressor.daemon = True
+        self._compressor.start()
+
+    def _RotateOldTraces(self):
+        """Renames each <serial>/<name>.gz of output_dir to <name>.1.gz.
+
+        A previously rotated file is replaced, so one old generation is
+        kept.
+        """
+        if not os.path.isdir(self.output_dir):
+            return
+        for serial in os.listdir(self.output_dir):
+            local_dir = os.path.join(self.output_dir, serial)
+            if not os.path.isdir(local_dir):
+                continue
+            for file_name in os.listdir(local_dir):
+                if not file_name.endswith(TRACE_SUFFIX + ".gz"):
+                    continue
+                gzip_path = os.path.join(local_dir, file_name)
+                rotated_path = gzip_path[:-len(".gz")] + ".1.gz"
+                logging.info("Rotate %s to %s", gzip_path, rotated_path)
+                if os.path.exists(rotated_path):
+                    os.remove(rotated_path)
+                os.rename(gzip_path, rotated_path)
+
+    def _Compress(self):
+        """Compressor thread body."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            delta_path, gzip_path = item
+            try:
+                if delta_path is None:
+                    if os.path.exists(gzip_path):
+                        os.remove(gzip_path)
+                    continue
+                with open(delta_path, "rb") as delta_file:
+                    with gzip.open(gzip_path, "ab") as gzip_file:
+                        shutil.copyfileobj(delta_file, gzip_file)
+                os.remove(delta_path)
+            except (IOError, OSError) as e:
+                logging.exception("Failed to compress %s", delta_path)
+                self._error = self._error or e
+
+    def _ListTraces(self, dut):
+        """Returns a dict which maps each remote trace file to its size."""
+        output = dut.adb.shell(
+            "stat -c '%%s %%n' %s/*%s 2>/dev/null; true" % (
+                self._remote_dir, TRACE_SUFFIX))
+        sizes = {}
+        for line in output.splitlines():
+            tokens = line.strip().split(" ", 1)
+            if len(tokens) == 2 and tokens[0].isdigit():
+                sizes[tokens[1]] = int(tokens[0])
+        return sizes
+
+    def Pull(self, dut, on_delta=None):
+        """Pulls the new bytes of every trace file of a device.
+
+        Args:
+            dut: the AndroidDevice to pull from.
+            on_delta: function called with the remote path and the local
+                      file of the new bytes before they are compressed,
+                      or None.
+
+        Returns:
+            integer, the number of bytes pulled.
+        """
+        with self._lock:
+            device_lock = self._device_locks.setdefault(dut.serial,
+                                                        threading.Lock())
+        with device_lock:
+            local_dir = os.path.join(self.output_dir, dut.serial)
+            if not os.path.isdir(local_dir):
+                os.makedirs(local_dir)
+            pulled = 0
+            for remote_path, size in sorted(self._ListTraces(dut).items()):
+                name = os.path.basename(remote_path)
+                gzip_path = os.path.join(local_dir, name + ".gz")
+                key = (dut.serial, remote_path)
+                with self._lock:
+                    offset = self._offsets.get(key, 0)
+                if size == offset:
+                    continue
+                if size < offset:
+                    logging.warning("%s was truncated, pull it again.",
+                                    remote_path)
+                    offset = 0
+                    self._queue.put((None, gzip_path))
+                delta_path = os.path.join(local_dir, "%s.%s" % (name, offset))
+                if offset:
+                    remote_delta = "%s.delta" % remote_path
+                    dut.adb.shell("tail -c +%s %s > %s" % (
+                        offset + 1, remote_path, remote_delta))
+                    dut.adb.pull("%s %s" % (remote_delta, delta_path))
+                    dut.adb.shell("rm -f %s" % remote_delta)
+                else:
+                    dut.adb.pull("%s %s" % (remote_path, delta_path))
+                # The file may have grown since it was listed.
+                delta_size = os.path.getsize(delta_path)
+                pulled += delta_size
+                with self._lock:
+                    self._offsets[key] = offset + delta_size
+                if on_delta:
+                    on_delta(remote_path, delta_path)
+                self._queue.put((delta_path, gzip_path))
+            return pulled
+
+    def Close(self):
+        """Waits until every pulled trace is compressed.
+
+        Raises:
+            IOError or OSError of the first failed compression.
+        """
+        self._queue.put(None)
+        self._compressor.join()
+        if self._error:
+            raise self._error